@@ -10,7 +10,9 @@ import scipy as sp
 import numpy as np
 import matplotlib.pyplot as plt
 from OpenPNM.Algorithms import GenericAlgorithm
+from OpenPNM.Algorithms import percolation
 from OpenPNM.Base import logging
+from OpenPNM.Base import Profiler
 logger = logging.getLogger(__name__)
 
 
@@ -87,6 +89,7 @@ class Drainage(GenericAlgorithm):
               defending_phase,
               entry_pressure='throat.capillary_pressure',
               trapping=False,
+              trapping_method='clusters',
               pore_filling=None,
               throat_filling=None,
               pore_volume='pore.volume',
@@ -116,6 +119,15 @@ class Drainage(GenericAlgorithm):
             be specified using the ``set_outlets`` method.  Otherwise it is
             assumed the defending phase has no outlets.
 
+        trapping_method : string (optional)
+            The method used to find the trapped pores and throats when
+            'trapping' is True.  The only option is 'clusters', where the
+            defending clusters are found after each applied pressure and the
+            throats inside trapped clusters are blocked for the following
+            pressures.  The 'union_find' method of ``OrdinaryPercolation`` is
+            not offered, since it finds the trapping after the invasion, so
+            the trapped clusters could not block the invasion.
+
         pore_filling and throat_filling: string (optional)
             The dictionary key on the Physics object where the late pore or
             throat filling model is located. The default is None, meaning that
@@ -139,6 +151,14 @@ class Drainage(GenericAlgorithm):
         self._inv_phase = invading_phase
         self._def_phase = defending_phase
         self._trapping = trapping
+        if trapping_method == 'union_find':
+            raise Exception('The union_find trapping method cannot be used ' +
+                            'with Drainage, since trapped clusters block ' +
+                            'the invasion, use OrdinaryPercolation instead')
+        if trapping_method != 'clusters':
+            raise Exception('Unrecognized trapping method: ' +
+                            str(trapping_method))
+        self._trapping_method = trapping_method
         self._pore_filling = pore_filling
         self._throat_filling = throat_filling
         self._throat_volume = 'throat.volume'
@@ -356,6 +376,7 @@ class Drainage(GenericAlgorithm):
         else:
             raise Exception('Unrecognized \'bc_type\' specified')
 
+    @Profiler.timed('percolation')
     def run(self, npts=25, inv_pressures=None):
         r"""
         Run the algorithm for specified number of points or at given capillary
@@ -395,14 +416,16 @@ class Drainage(GenericAlgorithm):
             if sp.sum(self['pore.outlets']) == 0:
                 raise Exception('Outlet pores have not been specified')
 
-        # Generate curve from points
-        for inv_val in self._inv_points:
-            # Apply one applied pressure and determine invaded pores
-            logger.info('Applying capillary pressure: ' + str(inv_val))
-            self._apply_percolation(inv_val)
-            if self._trapping:
+        if self._trapping:
+            # Generate curve from points
+            for inv_val in self._inv_points:
+                # Apply one applied pressure and determine invaded pores
+                logger.info('Applying capillary pressure: %s', inv_val)
+                self._apply_percolation(inv_val)
                 logger.info('Checking for trapping')
                 self._check_trapping(inv_val)
+        else:
+            self._apply_all_pressures(self._inv_points)
 
         # Find invasion sequence values (to correspond with IP algorithm)
         Pinv = self['pore.inv_Pc']
@@ -410,6 +433,7 @@ class Drainage(GenericAlgorithm):
         Tinv = self['throat.inv_Pc']
         self['throat.inv_seq'] = sp.searchsorted(sp.unique(Tinv), Tinv)
 
+    @Profiler.timed('percolation')
     def _check_trapping(self, inv_val):
         r"""
         Determine which pores and throats are trapped by invading phase.  This
@@ -443,6 +467,32 @@ class Drainage(GenericAlgorithm):
         self['throat.trapped'][tinds] = inv_val
         self['throat.entry_pressure'][tinds] = 1000000
 
+    @Profiler.timed('percolation')
+    def _apply_all_pressures(self, inv_points):
+        r"""
+        Determine which pores and throats are invaded at each of the applied
+        capillary pressures in a single pass.  This gives the same result as
+        calling ``_apply_percolation`` for each pressure in turn.
+        """
+        entry = self['throat.entry_pressure']
+        Pc = percolation.invasion_pressures(network=self._net,
+                                            entry_pressure=entry,
+                                            inlets=self['pore.inlets'],
+                                            residual=self['throat.residual'])
+        # Store the applied pressure in newly invaded pores and throats
+        pinds = self['pore.inv_Pc'] == sp.inf
+        self['pore.inv_Pc'][pinds] = percolation.discretize(Pc[0],
+                                                            inv_points)[pinds]
+        tinds = self['throat.inv_Pc'] == sp.inf
+        self['throat.inv_Pc'][tinds] = percolation.discretize(Pc[1],
+                                                              inv_points)[tinds]
+        # Set residual pores and throats, if any, to invaded
+        if sp.any(self['pore.residual']):
+            self['pore.inv_Pc'][self['pore.residual']] = 0
+        if sp.any(self['throat.residual']):
+            self['throat.inv_Pc'][self['throat.residual']] = 0
+
+    @Profiler.timed('percolation')
     def _apply_percolation(self, inv_val):
         r"""
         Determine which pores and throats are invaded at a given applied
@@ -7,11 +7,12 @@ module __GenericLinearTransport__: Class for solving linear transport processes
 """
 import scipy as sp
 import scipy.sparse as sprs
-import scipy.sparse.linalg as sprslin
 from OpenPNM.Algorithms import GenericAlgorithm
+from OpenPNM.Algorithms import solvers
 from OpenPNM.Phases import GenericPhase
 import OpenPNM.Utilities.vertexops as vo
 from OpenPNM.Base import logging
+from OpenPNM.Base import Profiler
 logger = logging.getLogger(__name__)
 
 
@@ -36,6 +37,16 @@ class GenericLinearTransport(GenericAlgorithm):
         if self._net is not phase._net:
             raise Exception(phase.name + 'and this algorithm are associated' +
                             ' with different networks.')
+        # The most recent factorization of the coefficient matrix, which is
+        # only kept between solves when requested
+        self._factorizations = {}
+        self._keep_factorization = False
+
+    def __getstate__(self):
+        # The factorizations are rebuilt when needed
+        state = super().__getstate__()
+        state['_factorizations'] = {}
+        return state
 
     def set_boundary_conditions(self, bctype='', bcvalue=None, pores=None,
                                 throats=None, mode='merge'):
@@ -224,7 +235,7 @@ class GenericLinearTransport(GenericAlgorithm):
             if bctype not in self._existing_BC:
                 self._existing_BC.append(bctype)
 
-    def setup(self, conductance, quantity, super_pore_conductance):
+    def setup(self, conductance, quantity, super_pore_conductance, **kwargs):
         r"""
         This setup provides the initial data for the solver from the provided
         properties.  It also creates the matrices A and b.
@@ -420,9 +431,9 @@ class GenericLinearTransport(GenericAlgorithm):
                         maxiter_arr = sp.ones((self.Np,), dtype=float) * sp.nan
                         self['pore.source_maxiter'] = maxiter_arr
 
+                    self._guess = x0
                     if x0 is None:
                         x0 = 0
-                    self._guess = x0
                     # Check value of maxiter
                     if maxiter is None:
                         maxiter = int(100)
@@ -516,7 +527,8 @@ class GenericLinearTransport(GenericAlgorithm):
         """
         self.solve(**kwargs)
 
-    def solve(self, A=None, b=None, iterative_solver=None, **kwargs):
+    def solve(self, A=None, b=None, iterative_solver=None,
+              keep_factorization=False, **kwargs):
         r"""
         Executes the right algorithm for the solution: regular solution of a
         linear system or iterative solution over the nonlinear source terms.
@@ -531,13 +543,36 @@ class GenericLinearTransport(GenericAlgorithm):
 
         iterative_sovler : string
             Name of solver to use.  If not solve is specified, sp.solve is used
-            which is a direct solver (SuperLU on default Scipy installation)
+            which is a direct solver (SuperLU on default Scipy installation).
+            Any solver listed by ``OpenPNM.Algorithms.solvers.available()``
+            can be used, such as 'cg', 'bicgstab', 'gmres' or 'amg' (if pyamg
+            is installed).
+
+        preconditioner : string, optional
+            The preconditioner to use with an iterative solver, either
+            'jacobi' or 'ilu'.
+
+        keep_factorization : boolean
+            If True the factorization of the coefficient matrix made by the
+            direct solver is kept on the algorithm, so later solves and
+            ``solve_batch`` calls with the same matrix reuse it.  The default
+            is False, which releases it after solving, since it can use many
+            times the memory of the matrix.
 
         kwargs : list of keyword arguments
             These arguments and values are sent to the sparse solver, so read
-            the specific documentation for the solver chosen
+            the specific documentation for the solver chosen.  When nonlinear
+            source terms are present, the ``damping``, ``line_search`` and
+            ``warm_start`` arguments of the Newton iterations can also be
+            given (see ``_do_one_outer_iteration``).
+
+        Notes
+        -----
+        A report on the convergence of the solver is stored on the algorithm
+        as ``solver_report``.
         """
         self._iterative_solver = iterative_solver
+        self._keep_factorization = keep_factorization
 
         # Executes the right algorithm
         if any('pore.source_nonlinear' in s for s in self.props()):
@@ -562,48 +597,222 @@ class GenericLinearTransport(GenericAlgorithm):
             A = self.A
         if b is None:
             b = self.b
-        if self._iterative_solver is None:
-            X = sprslin.spsolve(A, b)
-        else:
-            if self._iterative_solver not in ['cg', 'gmres']:
-                raise Exception('GenericLinearTransport does not support the' +
-                                ' requested iterative solver!')
-            params = kwargs.copy()
-            solver_params = ['x0', 'tol', 'maxiter', 'xtype', 'M', 'callback']
-            [params.pop(item, None) for item in kwargs.keys()
-             if item not in solver_params]
-            tol = kwargs.get('tol')
-            if tol is None:
-                tol = 1e-20
-            params['tol'] = tol
-            if self._iterative_solver == 'cg':
-                result = sprslin.cg(A, b, **params)
-            elif self._iterative_solver == 'gmres':
-                result = sprslin.gmres(A, b, **params)
-            X = result[0]
-            self._iterative_solver_info = result[1]
+        solver = self._iterative_solver
+        if solver is None:
+            solver = 'splu'
+            # Nonlinear source terms change A at every step, so do not cache
+            if any('pore.source_nonlinear' in s for s in self.props()):
+                solver = 'spsolve'
+        if solver not in solvers.available():
+            raise Exception('GenericLinearTransport does not support the' +
+                            ' requested iterative solver!')
+        if solver == 'splu' and kwargs.get('key') is None:
+            kwargs['key'] = self._factorization_key(A)
+            kwargs['cache'] = self._factorizations
+        X, report = solvers.solve(A, b, solver=solver, **kwargs)
+        if not self._keep_factorization:
+            self._factorizations.clear()
+        self._iterative_solver_info = report['info']
+        self.solver_report = report
         return X
 
-    def _do_one_outer_iteration(self, **kwargs):
+    def _factorization_key(self, A):
         r"""
-        One iteration of an outer iteration loop for an algorithm
-        (e.g. time or parametric study)
+        Returns the key of the coefficient matrix in the factorization cache,
+        which is based on the conductance values, the Dirichlet pores, the
+        super pore conductances, the sparsity pattern of the matrix and its
+        diagonal (which includes the source terms).
         """
-        # Checking for the necessary values in Picard algorithm
+        try:
+            Dir_pores = self.pores('Dirichlet')
+        except KeyError:
+            Dir_pores = []
+        # The super pore conductances can mix scalars and arrays
+        g_super = sp.hstack([sp.ravel(g) for g in
+                             self.super_pore_conductance] + [[]])
+        A = sprs.csr_matrix(A)
+        return solvers.fingerprint(self['throat.conductance'], Dir_pores,
+                                   A.diagonal(), g_super, A.shape, A.indptr,
+                                   A.indices)
+
+    def solve_batch(self, bcvalues, bctype='Dirichlet',
+                    keep_factorization=None):
+        r"""
+        Solves the system for several sets of boundary values at once, using
+        a single factorization of the coefficient matrix.
+
+        Parameters
+        ----------
+        bcvalues : list of scalars or array_like
+            Each item is one set of boundary values for the pores that
+            currently have the given ``bctype``.  An item can be a scalar
+            applied to all of these pores, or an array with one value per
+            pore, in the order returned by ``pores(bctype)``.
+
+        bctype : string
+            The type of boundary condition being varied, either 'Dirichlet'
+            or 'Neumann'.  The boundary conditions must already have been
+            applied using ``set_boundary_conditions``, and ``setup`` must
+            have been called so the coefficient matrix exists.
+
+        keep_factorization : boolean, optional
+            If True the factorization is kept on the algorithm for later
+            calls, otherwise it is released once the batch is solved.  The
+            default is the value given to the last ``solve``.
+
+        Returns
+        -------
+        An ND-array with one row per pore and one column per set of boundary
+        values.  The results are not written to the algorithm.
+
+        Notes
+        -----
+        The coefficient matrix only depends on the conductances and on which
+        pores have Dirichlet conditions, so changing the boundary values
+        only changes the right hand side.  All the right hand sides are
+        solved against a single factorization in one call.  A factorization
+        kept by a previous solve of the same matrix is reused.
+
+        Examples
+        --------
+        >>> import OpenPNM
+        >>> pn = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+        >>> geom = OpenPNM.Geometry.TestGeometry(network=pn, pores=pn.Ps,
+        ...                                      throats=pn.Ts)
+        >>> air = OpenPNM.Phases.Air(network=pn)
+        >>> phys = OpenPNM.Physics.Standard(network=pn, phase=air,
+        ...                                 pores=pn.Ps, throats=pn.Ts)
+        >>> alg = OpenPNM.Algorithms.FickianDiffusion(network=pn, phase=air)
+        >>> alg.set_boundary_conditions(bctype='Dirichlet', bcvalue=0,
+        ...                             pores=pn.pores('top'))
+        >>> alg.set_boundary_conditions(bctype='Dirichlet', bcvalue=1,
+        ...                             pores=pn.pores('bottom'))
+        >>> alg.setup()
+        >>> Ps = alg.pores('Dirichlet')
+        >>> vals = [alg['pore.bcval_Dirichlet'][Ps]*i for i in [1, 2, 3]]
+        >>> X = alg.solve_batch(bcvalues=vals)
+        >>> X.shape
+        (125, 3)
+        """
+        if bctype not in ['Dirichlet', 'Neumann']:
+            raise Exception('Batch solves are only supported for Dirichlet ' +
+                            'and Neumann boundary conditions')
+        if 'pore.' + bctype not in self.labels():
+            raise Exception('No ' + bctype + ' boundary conditions have ' +
+                            'been applied in ' + self.name)
+        if not hasattr(self, 'A'):
+            raise Exception('The algorithm must be setup before solving')
+        if any('pore.source_nonlinear' in s for s in self.props()):
+            raise Exception('Batch solves cannot be used with nonlinear ' +
+                            'source terms')
+        pores = self.pores(bctype)
+        b = sp.copy(sp.ravel(self.b))
+        # Keep any source terms that were added to the boundary pores
+        b[pores] = b[pores] - self['pore.bcval_' + bctype][pores]
+        B = sp.tile(b[:, None], (1, len(bcvalues)))
+        for i, vals in enumerate(bcvalues):
+            vals = sp.array(vals, ndmin=1, dtype=float)
+            if sp.size(vals) not in [1, sp.size(pores)]:
+                raise Exception('Each set of boundary values must be a ' +
+                                'scalar or have one value per ' + bctype +
+                                ' pore')
+            B[pores, i] = B[pores, i] + vals
+        if keep_factorization is not None:
+            self._keep_factorization = keep_factorization
+        A = self.A
+        lu = solvers.factorize(A, key=self._factorization_key(A),
+                               cache=self._factorizations)
+        X = lu.solve(B)
+        if not self._keep_factorization:
+            self._factorizations.clear()
+        return X[self.Ps, :]
+
+    def _do_one_outer_iteration(self, damping=1.0, line_search=True,
+                                warm_start=False, **kwargs):
+        r"""
+        Solves the nonlinear system with a damped Newton method, using the
+        linearized source terms (S1 and S2) provided by the source models.
+
+        Parameters
+        ----------
+        damping : float
+            The fraction of the full Newton step that is tried first, where
+            1 (default) gives the undamped Newton step.
+
+        line_search : boolean
+            If True (default), the step is halved until the norm of the
+            nonlinear residual decreases.
+
+        warm_start : boolean
+            If True and no initial guess was given to ``set_source_term``,
+            the iterations start from the previous solution of this
+            algorithm, if any.  The default is False, which starts from zero.
+
+        Notes
+        -----
+        Since S1 is the derivative of the source term and S2 its intercept,
+        the coefficient matrix built with the linearized source terms is the
+        Jacobian of the nonlinear system, so each solve is a Newton step.
+        The residual of the nonlinear system at a point is b - A*x, using A
+        and b linearized at that point, so every trial point of the line
+        search provides the linearization for the next step.  Each linear
+        solve computes the correction to the current values from this
+        residual.
+
+        When an iterative solver is used, the tolerance of each linear solve
+        is relative to the nonlinear residual and adapted to the progress of
+        the iterations, so the early steps are not solved more accurately
+        than needed.
+        """
+        # Checking for the necessary values in the Newton algorithm
         nan_tol = sp.isnan(self['pore.source_tol'])
         nan_max = sp.isnan(self['pore.source_maxiter'])
         self._tol_for_all = sp.amin(self['pore.source_tol'][~nan_tol])
         self._maxiter_for_all = sp.amax(self['pore.source_maxiter'][~nan_max])
         if self._guess is None:
-            self._guess = sp.zeros(self._coeff_dimension)
-        t = 1
+            if warm_start and sp.size(getattr(self, 'X', None)) == \
+                    self._coeff_dimension:
+                self._guess = sp.copy(self.X)
+            else:
+                self._guess = sp.zeros(self._coeff_dimension)
+        elif sp.size(self._guess) == 1:
+            self._guess = sp.ones(self._coeff_dimension)*self._guess
+        adaptive = self._iterative_solver is not None and \
+            solvers._get(self._iterative_solver)['iterative']
+        if adaptive:
+            min_tol = kwargs.get('tol')
+            if min_tol is None:
+                min_tol = solvers.defaults(self._iterative_solver)['tol']
+        X = sp.array(self._guess, dtype=float)
+        A, b = self._update_source_terms(guess=X)
+        F = sp.ravel(b) - A*X
+        res = sp.linalg.norm(F)
+        res_old = None
+        t = sp.inf
         step = 0
-        # The main Picard loop
+        # The main Newton loop
         while t > self._tol_for_all and step <= self._maxiter_for_all:
-            X, t, A, b = self._do_inner_iteration_stage(guess=self._guess,
-                                                        **kwargs)
-            logger.info('tol for Picard source_algorithm in step ' +
-                        str(step) + ' : ' + str(t))
+            if adaptive:
+                eta = 0.1
+                if res_old:
+                    eta = min(eta, 0.9*(res/res_old)**2)
+                kwargs['tol'] = max(eta, min_tol)
+            dX = self._do_one_inner_iteration(A=A, b=F, **kwargs)
+            alpha = damping
+            while True:
+                X_new = X + alpha*dX
+                A_new, b_new = self._update_source_terms(guess=X_new)
+                F_new = sp.ravel(b_new) - A_new*X_new
+                res_new = sp.linalg.norm(F_new)
+                if not line_search or alpha < 1e-3 or \
+                        res_new <= (1 - 1e-4*alpha)*res:
+                    break
+                alpha = alpha/2
+            t = sp.amax(sp.absolute(X_new - X))
+            logger.info('Newton step %s : step length = %s, change = %s, ' +
+                        'residual = %s', step, alpha, t, res_new)
+            X, A, b, F = X_new, A_new, b_new, F_new
+            res_old, res = res, res_new
             self._guess = X
             step += 1
         # Check for divergence
@@ -613,17 +822,17 @@ class GenericLinearTransport(GenericAlgorithm):
                             'to the maxiter: ' + str(self._maxiter_for_all) +
                             ' without achieving tol: ' +
                             str(self._tol_for_all))
-        logger.info('Picard algorithm for source term converged!')
+        logger.info('Newton algorithm for source term converged!')
         self.A = A
         self.b = b
         self._tol_reached = t
+        self._residual = res
         return X
 
-    def _do_inner_iteration_stage(self, guess, **kwargs):
+    def _update_source_terms(self, guess):
         r"""
-        This inner loop updates the source terms based on the new values of
-        the quantity, then modifies A and b matrices, solves AX = b and
-        returns the result.
+        Updates the nonlinear source terms based on the given values of the
+        quantity, and returns the A and b matrices linearized around them.
         """
         # Updating the source terms
         s1 = sp.zeros(self._coeff_dimension)
@@ -656,11 +865,7 @@ class GenericLinearTransport(GenericAlgorithm):
                                            mode='modify_diagonal')
         b = self._build_RHS_matrix(modified_RHS_pores=pores,
                                    RHS_added_data=-S2, mode='modify_RHS')
-        # Solving AX = b
-        X = self._do_one_inner_iteration(A=A, b=b, **kwargs)
-        # Calculates absolute error
-        t = sp.amax(sp.absolute(guess - X))
-        return X, t, A, b
+        return A, b
 
     def return_results(self, pores=None, throats=None, **kwargs):
         r"""
@@ -688,6 +893,7 @@ class GenericLinearTransport(GenericAlgorithm):
         logger.debug('Results of ' + self.name +
                      ' algorithm have been added to ' + self._phase.name)
 
+    @Profiler.timed('assembly')
     def _build_coefficient_matrix(self, modified_diag_pores=None,
                                   diag_added_data=None, mode='overwrite'):
         r"""
@@ -771,9 +977,11 @@ class GenericLinearTransport(GenericAlgorithm):
             except KeyError:
                 temp_data = sp.copy(data)
                 non_Dir_diag = diag
-            S_temp = sp.zeros(A_dim)
-            for i in sp.arange(0, len(row)):
-                S_temp[row[i]] = S_temp[row[i]] - temp_data[i]
+            row = row.astype(int)
+            col = col.astype(int)
+            data = sp.array(data, dtype=float)
+            # Row sums of the off-diagonal terms give the diagonal
+            S_temp = -sp.bincount(row, weights=temp_data, minlength=A_dim)
             # Store values for modifying the diagonal in mode='modify_diagonal'
             self._non_source_row = row
             self._non_source_col = col
@@ -781,6 +989,7 @@ class GenericLinearTransport(GenericAlgorithm):
             self._non_Dir_diag = non_Dir_diag
             self._diagonal_vals = S_temp
             self._coeff_dimension = A_dim
+            self._update_sparsity_pattern()
 
         if mode in ['overwrite', 'modify_diagonal']:
             diagonal_vals = sp.copy(self._diagonal_vals)
@@ -796,18 +1005,59 @@ class GenericLinearTransport(GenericAlgorithm):
                                     ' size!')
                 if mode == 'overwrite':
                     self._diagonal_vals = diagonal_vals
-            data = sp.append(self._non_source_data,
-                             diagonal_vals[self._non_Dir_diag])
-            row = sp.append(self._non_source_row, self._non_Dir_diag)
-            col = sp.append(self._non_source_col, self._non_Dir_diag)
-            # Convert the lists to the sparse matrix
-            a = sprs.coo.coo_matrix((data, (row, col)),
-                                    (self._coeff_dimension,
-                                     self._coeff_dimension))
-            A = a.tocsr()
-            A.eliminate_zeros()
+            # Only the data array changes, the sparsity pattern is reused
+            pattern = self._coeff_pattern
+            data = sp.copy(pattern['offdiag_data'])
+            data[pattern['diag_slots']] += diagonal_vals[self._non_Dir_diag]
+            A = sprs.csr_matrix((data, pattern['indices'], pattern['indptr']),
+                                shape=(self._coeff_dimension,
+                                       self._coeff_dimension),
+                                copy=False)
             return(A)
 
+    def _update_sparsity_pattern(self):
+        r"""
+        Computes the CSR sparsity pattern of the coefficient matrix, along
+        with the permutation that maps each stored (row, col, data) triplet
+        onto its location in the CSR data array.  The pattern is cached on the
+        algorithm and only recomputed if the connectivity, the Dirichlet pores
+        or the Neumann_group super pores have changed, so conductance updates
+        only need to rewrite the data array.
+        """
+        row = self._non_source_row
+        col = self._non_source_col
+        diag = self._non_Dir_diag
+        A_dim = self._coeff_dimension
+        pattern = getattr(self, '_coeff_pattern', None)
+        if (pattern is None or pattern['shape'] != (A_dim, A_dim) or
+                not sp.array_equal(pattern['row'], row) or
+                not sp.array_equal(pattern['col'], col) or
+                not sp.array_equal(pattern['diag'], diag)):
+            logger.debug('Computing sparsity pattern of coefficient matrix')
+            all_row = sp.append(row, diag)
+            all_col = sp.append(col, diag)
+            # Sort the triplets by a packed (row, col) key, merging duplicates
+            keys = all_row.astype(sp.int64)*A_dim + all_col
+            keys, nnz_map = sp.unique(keys, return_inverse=True)
+            indices = (keys % A_dim).astype(sp.int32)
+            counts = sp.bincount(keys // A_dim, minlength=A_dim)
+            indptr = sp.zeros(A_dim + 1, dtype=sp.int32)
+            indptr[1:] = sp.cumsum(counts)
+            pattern = {'shape': (A_dim, A_dim),
+                       'row': row,
+                       'col': col,
+                       'diag': diag,
+                       'indptr': indptr,
+                       'indices': indices,
+                       'nnz_map': nnz_map[:sp.size(row)],
+                       'diag_slots': nnz_map[sp.size(row):]}
+            self._coeff_pattern = pattern
+        nnz = sp.size(pattern['indices'])
+        pattern['offdiag_data'] = sp.bincount(pattern['nnz_map'],
+                                              weights=self._non_source_data,
+                                              minlength=nnz)
+
+    @Profiler.timed('assembly')
     def _build_RHS_matrix(self, modified_RHS_pores=None, RHS_added_data=None,
                           mode='overwrite'):
         r"""
@@ -9,6 +9,7 @@ import heapq as hq
 import scipy as sp
 from OpenPNM.Algorithms import GenericAlgorithm
 from OpenPNM.Base import logging
+from OpenPNM.Base import Profiler
 logger = logging.getLogger(__name__)
 
 
@@ -55,6 +56,11 @@ class InvasionPercolation(GenericAlgorithm):
         self['throat.invaded'] = -sp.ones((self._net.Nt,))
         self['pore.invaded'] = -sp.ones((self._net.Np,))
         self._tcount = 0
+        # CSR arrays listing the throats connected to each pore
+        im = self._net.create_incidence_matrix(sprsfmt='csr')
+        self._pore_throats = (im.indptr, im.indices)
+        # Throats that have been pushed onto the queue
+        self._queued = sp.zeros((self._net.Nt,), dtype=bool)
 
     def set_inlets(self, pores=None, **kwargs):
         r"""
@@ -67,12 +73,30 @@ class InvasionPercolation(GenericAlgorithm):
         if 'inlets' in kwargs.keys():
             pores = kwargs['inlets']
         self['pore.invaded'][pores] = 0
+        self._inlets = sp.array(pores, ndmin=1)
 
         # Perform initial analysis on input pores
-        Ts = self._net.find_neighbor_throats(pores=pores)
         self.queue = []
-        [hq.heappush(self.queue, T) for T in self['throat.order'][Ts]]
+        self._queued.fill(False)
+        self._push_throats(self.queue, pores)
 
+    def _push_throats(self, queue, pores):
+        r"""
+        Pushes the throats connected to the given pores onto the queue,
+        skipping those that have already been queued so each throat enters the
+        queue only once.
+        """
+        indptr, indices = self._pore_throats
+        t_order = self['throat.order']
+        queued = self._queued
+        for p in sp.array(pores, ndmin=1):
+            Ts = indices[indptr[p]:indptr[p+1]]
+            Ts = Ts[~queued[Ts]]
+            queued[Ts] = True
+            for T in t_order[Ts]:
+                hq.heappush(queue, T)
+
+    @Profiler.timed('percolation')
     def run(self, n_steps=None, **kwargs):
         r"""
         Perform the algorithm
@@ -96,9 +120,9 @@ class InvasionPercolation(GenericAlgorithm):
             logger.warn('queue is empty, this network is fully invaded')
             return
         t_sorted = self['throat.sorted']
-        t_order = self['throat.order']
         t_inv = self['throat.invaded']
         p_inv = self['pore.invaded']
+        conns = self._net['throat.conns']
 
         count = 0
         while (len(queue) > 0) and (count < n_steps):
@@ -107,24 +131,126 @@ class InvasionPercolation(GenericAlgorithm):
             # Extract actual throat number
             t_next = t_sorted[t]
             t_inv[t_next] = self._tcount
-            # If throat is duplicated
-            while len(queue) > 0 and queue[0] == t:
-                # Note: Preventing duplicate entries below might save some time here
-                t = hq.heappop(queue)
             # Find pores connected to newly invaded throat
-            Ps = self._net['throat.conns'][t_next]
+            Ps = conns[t_next]
             # Remove already invaded pores from Ps
             Ps = Ps[p_inv[Ps] < 0]
             if len(Ps) > 0:
                 p_inv[Ps] = self._tcount
-                Ts = self._net.find_neighbor_throats(pores=Ps)
-                Ts = Ts[t_inv[Ts] < 0]  # Remove already invaded throats from Ts
-                [hq.heappush(queue, T) for T in t_order[Ts]]
+                self._push_throats(queue, Ps)
             count += 1
             self._tcount += 1
         self['throat.invasion_sequence'] = t_inv
         self['pore.invasion_sequence'] = p_inv
 
+    @Profiler.timed('percolation')
+    def apply_trapping(self, outlets):
+        r"""
+        Finds the pores and throats that would be trapped by the invading
+        phase, and removes them from the invasion sequence.
+
+        Parameters
+        ----------
+        outlets : array_like
+            The list of pores through which the defending phase can escape
+
+        Notes
+        -----
+        A region of the defending phase becomes trapped when it loses its last
+        connection to the outlets, and it stays trapped for the rest of the
+        invasion.  The trapped pores and throats are found by replaying the
+        invasion backwards, adding the pores and throats to the defending
+        phase in the reverse order of their invasion.  The defending clusters
+        are tracked with a union-find structure, so any pore or throat that is
+        added to a cluster that does not reach the outlets was trapped at the
+        time it was invaded.  This needs a single pass over the network, with
+        a total cost of O(N log(N)) for sorting the invasion sequence.
+
+        The trapped pores and throats are labelled 'pore.trapped' and
+        'throat.trapped', and their invasion sequence is set to -1.  Applying
+        trapping does not change the sequence of the other pores and throats.
+
+        Examples
+        --------
+        >>> import OpenPNM
+        >>> pn = OpenPNM.Network.Cubic(shape=[10, 10, 1])
+        >>> water = OpenPNM.Phases.GenericPhase(network=pn)
+        >>> water['throat.capillary_pressure'] = sp.rand(pn.Nt)
+        >>> ip = OpenPNM.Algorithms.InvasionPercolation(network=pn)
+        >>> ip.setup(phase=water)
+        >>> ip.set_inlets(pores=pn.pores('left'))
+        >>> ip.run()
+        >>> ip.apply_trapping(outlets=pn.pores('right'))
+        >>> sp.all(ip['pore.invasion_sequence'][pn.pores('right')] >= 0)
+        True
+        """
+        Np = self._net.Np
+        Nt = self._net.Nt
+        conns = self._net['throat.conns']
+        p_seq = sp.array(self['pore.invasion_sequence'], dtype=float)
+        t_seq = sp.array(self['throat.invasion_sequence'], dtype=float)
+        # Pores and throats that were never invaded are always defending
+        p_seq[p_seq < 0] = sp.inf
+        t_seq[t_seq < 0] = sp.inf
+        # Nodes 0 to Np-1 are pores, then throats, and the last is the outlet
+        sink = Np + Nt
+        parent = sp.arange(Np + Nt + 1)
+        present = sp.zeros((Np + Nt + 1,), dtype=bool)
+        present[sink] = True
+        is_outlet = sp.zeros((Np,), dtype=bool)
+        is_outlet[outlets] = True
+        is_inlet = sp.zeros((Np,), dtype=bool)
+        is_inlet[self._inlets] = True
+        indptr, indices = self._pore_throats
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j):
+            i = find(i)
+            j = find(j)
+            if i != j:
+                # Keep the sink as the root so its clusters are easy to spot
+                if i == sink:
+                    parent[j] = i
+                else:
+                    parent[i] = j
+
+        seq = sp.concatenate((p_seq, t_seq))
+        order = sp.argsort(-seq, kind='mergesort')
+        trapped = sp.zeros((Np + Nt,), dtype=bool)
+        start = 0
+        while start < (Np + Nt):
+            # Add all pores and throats invaded at the same step together
+            stop = start + 1
+            while stop < (Np + Nt) and seq[order[stop]] == seq[order[start]]:
+                stop += 1
+            group = order[start:stop]
+            present[group] = True
+            for i in group:
+                if i < Np:
+                    if is_outlet[i]:
+                        union(i, sink)
+                    for t in indices[indptr[i]:indptr[i+1]]:
+                        if present[Np + t]:
+                            union(i, Np + t)
+                else:
+                    for p in conns[i - Np]:
+                        if present[p]:
+                            union(i, p)
+            if seq[order[start]] < sp.inf:
+                for i in group:
+                    if (i >= Np or not is_inlet[i]) and find(i) != sink:
+                        trapped[i] = True
+            start = stop
+        self['pore.trapped'] = trapped[:Np]
+        self['throat.trapped'] = trapped[Np:]
+        self['pore.invasion_sequence'][self['pore.trapped']] = -1
+        self['throat.invasion_sequence'][self['throat.trapped']] = -1
+
     def return_results(self, pores=[], throats=[]):
         r"""
         Places the results of the IP simulation into the Phase object.
@@ -10,7 +10,9 @@ import scipy as sp
 import numpy as np
 import matplotlib.pyplot as plt
 from OpenPNM.Algorithms import GenericAlgorithm
+from OpenPNM.Algorithms import percolation
 from OpenPNM.Base import logging
+from OpenPNM.Base import Profiler
 logger = logging.getLogger(__name__)
 
 
@@ -38,11 +40,18 @@ class OrdinaryPercolation(GenericAlgorithm):
               invading_phase,
               defending_phase=None,
               t_entry='throat.capillary_pressure',
+              trapping_method='clusters',
               **kwargs):
         r"""
         invading_phase : OpenPNM Phase Object
             The invading phase to be injected into the Network
 
+        trapping_method : string
+            The method used by ``evaluate_trapping``, either 'clusters'
+            (default) to find the defending clusters at each applied pressure,
+            or 'union_find' to find the trapping pressures of all pores and
+            throats in a single pass.
+
         p_inlets : array_like
             The injection points from which the invading phase accesses the
             Network.  If no inlets are specified then the algorithm assumes
@@ -65,6 +74,7 @@ class OrdinaryPercolation(GenericAlgorithm):
         self._inv_phase = invading_phase
         self._def_phase = defending_phase
         self._trapping = False
+        self._trapping_method = trapping_method
 
     def set_inlets(self, pores):
         r"""
@@ -93,7 +103,7 @@ class OrdinaryPercolation(GenericAlgorithm):
             self['pore.inlets'] = False
             self['pore.inlets'][Ps] = True
 
-    def set_outlets(self, pores, defending_phase=None):
+    def set_outlets(self, pores, defending_phase=None, trapping_method=None):
         r"""
         Specify outlet locations
 
@@ -105,9 +115,15 @@ class OrdinaryPercolation(GenericAlgorithm):
         defending_phase : OpenPNM Phase Object
             The Phase object defining the defending phase.  The defending Phase
             may be specified during the ``setup`` step, or through this method.
+
+        trapping_method : string, optional
+            The method used to find the trapped pores and throats, either
+            'clusters' or 'union_find'.  See ``evaluate_trapping``.
         """
         if defending_phase is not None:
             self._def_phase = defending_phase
+        if trapping_method is not None:
+            self._trapping_method = trapping_method
 
         self._trapping = True
 
@@ -118,6 +134,7 @@ class OrdinaryPercolation(GenericAlgorithm):
             self['pore.outlets'] = False
             self['pore.outlets'][Ps] = True
 
+    @Profiler.timed('percolation')
     def run(self, npts=25, inv_points=None, access_limited=True, **kwargs):
         r"""
         Parameters
@@ -136,7 +153,8 @@ class OrdinaryPercolation(GenericAlgorithm):
             self.set_inlets(pores=kwargs['inlets'])
         if 'outlets' in kwargs.keys():
             logger.info('Outlets recieved, passing to set_outlets')
-            self.set_outlets(pores=kwargs['outlets'])
+            self.set_outlets(pores=kwargs['outlets'],
+                             trapping_method=kwargs.get('trapping_method'))
         self._AL = access_limited
         if inv_points is None:
             logger.info('Generating list of invasion pressures')
@@ -151,11 +169,29 @@ class OrdinaryPercolation(GenericAlgorithm):
         self._do_outer_iteration_stage(inv_points)
 
     def _do_outer_iteration_stage(self, inv_points):
-        # Generate curve from points
-        for inv_val in inv_points:
-            # Apply one applied pressure and determine invaded pores
-            logger.info('Applying capillary pressure: ' + str(inv_val))
-            self._do_one_inner_iteration(inv_val)
+        # Find the exact invasion pressures in a single pass
+        inlets = None
+        if self._AL:
+            inlets = self['pore.inlets']
+        entry = self['throat.entry_pressure']
+        Pc = percolation.invasion_pressures(network=self._net,
+                                            entry_pressure=entry,
+                                            inlets=inlets)
+        # Convert them to the applied pressures, keeping existing values
+        pinds = self['pore.inv_Pc'] == sp.inf
+        tinds = self['throat.inv_Pc'] == sp.inf
+        self['pore.inv_Pc'][pinds] = percolation.discretize(Pc[0],
+                                                            inv_points)[pinds]
+        self['throat.inv_Pc'][tinds] = percolation.discretize(Pc[1],
+                                                              inv_points)[tinds]
+        sat = percolation.saturation(pore_Pc=self['pore.inv_Pc'],
+                                     throat_Pc=self['throat.inv_Pc'],
+                                     pore_volume=self._net['pore.volume'],
+                                     throat_volume=self._net['throat.volume'])
+        pinds = pinds * (self['pore.inv_Pc'] < sp.inf)
+        tinds = tinds * (self['throat.inv_Pc'] < sp.inf)
+        self['pore.inv_sat'][pinds] = sat[0][pinds]
+        self['throat.inv_sat'][tinds] = sat[1][tinds]
 
         # Find invasion sequence values (to correspond with IP algorithm)
         self['pore.inv_seq'] = sp.searchsorted(sp.unique(self['pore.inv_Pc']),
@@ -166,10 +202,12 @@ class OrdinaryPercolation(GenericAlgorithm):
         if self._trapping:
             self.evaluate_trapping(self['pore.outlets'])
 
+    @Profiler.timed('percolation')
     def _do_one_inner_iteration(self, inv_val):
         r"""
         Determine which throats are invaded at a given applied capillary
-        pressure.
+        pressure.  This is no longer called by ``run``, which finds the
+        invasion pressures for all the points at once.
 
         """
         # Generate a tlist containing boolean values for throat state
@@ -201,7 +239,8 @@ class OrdinaryPercolation(GenericAlgorithm):
         self['pore.inv_sat'][pinds] = (tsat + psat)/total
         self['throat.inv_sat'][tinds] = (tsat + psat)/total
 
-    def evaluate_trapping(self, p_outlets):
+    @Profiler.timed('percolation')
+    def evaluate_trapping(self, p_outlets, trapping_method=None):
         r"""
         Finds trapped pores and throats after a full ordinary
         percolation simulation has been run.
@@ -212,13 +251,57 @@ class OrdinaryPercolation(GenericAlgorithm):
             A list of pores that define the wetting phase outlets.
             Disconnection from these outlets results in trapping.
 
+        trapping_method : string, optional
+            Either 'clusters' to find the clusters of defending pores at each
+            applied pressure, or 'union_find' to find the pressure at which
+            each pore and throat is trapped in a single pass, using
+            ``percolation.trapping``.  If not given, the method specified in
+            ``setup`` or ``set_outlets`` is used.
+
         Returns
         -------
         It creates arrays called ``pore.trapped`` and ``throat.trapped``, but
         also adjusts the ``pore.inv_Pc`` and ``throat.inv_Pc`` arrays to set
         trapped locations to have infinite invasion pressure.
 
+        Notes
+        -----
+        The 'clusters' method labels the defending clusters once for every
+        applied pressure, so its cost grows with the number of pressures.
+        The 'union_find' method is much faster on large networks.  The two
+        methods agree except for throats whose pores are both invaded, which
+        the 'union_find' method always finds trapped, while the 'clusters'
+        method only does so at pressures where some pore is also trapped.
+
         """
+        if trapping_method is None:
+            trapping_method = getattr(self, '_trapping_method', 'clusters')
+        if trapping_method == 'clusters':
+            self._evaluate_trapping_clusters(p_outlets)
+        elif trapping_method == 'union_find':
+            self._evaluate_trapping_union_find(p_outlets)
+        else:
+            raise Exception('Unrecognized trapping method: ' +
+                            str(trapping_method))
+        self['pore.inv_Pc'][self['pore.trapped'] > 0] = sp.inf
+        self['throat.inv_Pc'][self['throat.trapped'] > 0] = sp.inf
+
+    def _evaluate_trapping_union_find(self, p_outlets):
+        if 'pore.inv_Pc' not in self.keys():
+            raise Exception('Orindary percolation has not been run!')
+        # Get points used in OP
+        inv_points = sp.unique(self['pore.inv_Pc'])[0:-1]
+        trapped = percolation.trapping(network=self._net,
+                                       pore_Pc=self['pore.inv_Pc'],
+                                       throat_Pc=self['throat.inv_Pc'],
+                                       outlets=p_outlets,
+                                       inv_points=inv_points)
+        self['pore.trapped'] = sp.zeros([self.Np, ], dtype=float)
+        self['throat.trapped'] = sp.zeros([self.Nt, ], dtype=float)
+        self['pore.trapped'][trapped[0] < sp.inf] = sp.inf
+        self['throat.trapped'][trapped[1] < sp.inf] = sp.inf
+
+    def _evaluate_trapping_clusters(self, p_outlets):
         self['pore.trapped'] = sp.zeros([self.Np, ], dtype=float)
         self['throat.trapped'] = sp.zeros([self.Nt, ], dtype=float)
         try:
@@ -255,8 +338,6 @@ class OrdinaryPercolation(GenericAlgorithm):
                 self['throat.trapped'][inds] = inv_val
         self['pore.trapped'][self['pore.trapped'] > 0] = sp.inf
         self['throat.trapped'][self['throat.trapped'] > 0] = sp.inf
-        self['pore.inv_Pc'][self['pore.trapped'] > 0] = sp.inf
-        self['throat.inv_Pc'][self['throat.trapped'] > 0] = sp.inf
 
     def evaluate_late_pore_filling(self, Pc, Swp_init=0.75, eta=3.0,
                                    wetting_phase=False):
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+===============================================================================
+module __TransientLinearTransport__: Time dependent linear transport processes
+===============================================================================
+
+"""
+import scipy as sp
+import scipy.sparse as sprs
+import scipy.sparse.linalg as sprslin
+from OpenPNM.Algorithms import GenericLinearTransport
+from OpenPNM.Algorithms import solvers
+from OpenPNM.Base import logging
+logger = logging.getLogger(__name__)
+
+
+class TransientLinearTransport(GenericLinearTransport):
+    r"""
+    A subclass of GenericLinearTransport that marches the transport equations
+    through time instead of solving for the steady state.  The accumulation
+    term of each pore is given by a pore property, such as the pore volume,
+    so the equation solved in each pore is:
+
+    .. math::
+
+        V_i \frac{dX_i}{dt} = \sum_j g_{ij} (X_j - X_i) + S_i
+
+    Examples
+    --------
+    >>> import OpenPNM
+    >>> pn = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+    >>> phase = OpenPNM.Phases.GenericPhase(network=pn)
+    >>> phys = OpenPNM.Physics.GenericPhysics(network=pn, phase=phase,
+    ...                                       pores=pn.Ps, throats=pn.Ts)
+    >>> phys['throat.cond'] = 1.0
+    >>> phys['pore.vol'] = 1.0
+    >>> alg = OpenPNM.Algorithms.TransientLinearTransport(network=pn,
+    ...                                                   phase=phase)
+    >>> alg.set_boundary_conditions(bctype='Dirichlet', bcvalue=1.0,
+    ...                             pores=pn.pores('top'))
+    >>> alg.run(conductance='throat.cond', quantity='pore.concentration',
+    ...         accumulation='pore.vol', t_final=10, dt=1, x0=0)
+    >>> alg.time
+    10.0
+    >>> round(sp.amin(alg['pore.concentration']), 3)
+    0.603
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.time = 0.0
+        logger.info('Create ' + self.__class__.__name__ + ' Object')
+
+    def setup(self, conductance, quantity, accumulation='pore.volume',
+              super_pore_conductance=None, t_final=None, dt=None, x0=None,
+              scheme='implicit', adaptive=False, max_change=None,
+              dt_max=None, output_times=None, filename=None, **kwargs):
+        r"""
+        Builds the matrices of the steady problem and stores the parameters
+        of the time stepping.
+
+        Parameters
+        ----------
+        conductance, quantity, super_pore_conductance
+            These are the same as in ``GenericLinearTransport.setup``.
+
+        accumulation : string or array_like
+            The dictionary key of the pore property that multiplies the time
+            derivative, such as 'pore.volume' (default).  It is looked up on
+            the phase first and then on the network.  An array containing one
+            value per pore can also be given.
+
+        t_final : float
+            The time at which the simulation stops.  The simulation starts
+            at the current ``time`` of the algorithm, which is 0 for a new
+            algorithm, so calling ``run`` again continues the simulation.
+
+        dt : float
+            The time step.  When ``adaptive`` is True this is the initial
+            time step.
+
+        x0 : scalar or array_like, optional
+            The initial values of the quantity.  If not given, the values of
+            the previous run are used, or the values stored on the phase, or
+            zero if neither exists.
+
+        scheme : string
+            Either 'implicit' (default) for the implicit Euler method, or
+            'cranknicolson' for the second order Crank-Nicolson method.
+
+        adaptive : boolean
+            If True the time step is halved whenever the quantity changes by
+            more than ``max_change`` in any pore during a step, and doubled
+            after steps that change it by less than a quarter of this.
+
+        max_change : float
+            The largest change of the quantity allowed in one time step when
+            ``adaptive`` is True.
+
+        dt_max : float, optional
+            The largest time step used by the adaptive stepping.  The default
+            is 1024 times the initial time step.
+
+        output_times : array_like, optional
+            The times at which the values of the quantity are written to
+            ``filename``.
+
+        filename : string, optional
+            The file to which the values at the ``output_times`` are written
+            as they are computed.  The file can be read back with
+            ``read_output``.  The data is appended if the file exists.
+        """
+        super().setup(conductance=conductance, quantity=quantity,
+                      super_pore_conductance=super_pore_conductance)
+        if any('pore.source_nonlinear' in s for s in self.props()):
+            raise Exception('Nonlinear source terms are not supported by ' +
+                            self.__class__.__name__ + ', use linear source ' +
+                            'terms (maxiter=0) instead')
+        if t_final is None or dt is None:
+            raise Exception('Both t_final and dt must be given')
+        if scheme not in ['implicit', 'cranknicolson']:
+            raise Exception('Unrecognized time stepping scheme: ' + scheme)
+        if adaptive and max_change is None:
+            raise Exception('max_change must be given for adaptive stepping')
+        # Accumulation term, the Dirichlet pores and super pores have none
+        if type(accumulation) == str:
+            prop = 'pore.' + accumulation.split('.')[-1]
+            try:
+                V = self._phase[prop]
+            except KeyError:
+                V = self._net[prop]
+        else:
+            V = accumulation
+        V = sp.ones(self.Np)*V
+        if sp.any(V <= 0):
+            raise Exception('The accumulation term must be positive')
+        self._accumulation = sp.zeros(self._coeff_dimension)
+        self._accumulation[self.Ps] = V
+        try:
+            Dir_pores = self.pores('Dirichlet')
+        except KeyError:
+            Dir_pores = []
+        self._accumulation[Dir_pores] = 0
+        # Initial values of the quantity
+        X = sp.zeros(self._coeff_dimension)
+        if x0 is not None:
+            X[self.Ps] = x0
+        elif sp.size(getattr(self, 'X', None)) == self._coeff_dimension:
+            X = sp.copy(self.X)
+        elif self._quantity in self._phase.props():
+            X[self.Ps] = self._phase[self._quantity]
+        if sp.size(Dir_pores) > 0:
+            X[Dir_pores] = self['pore.bcval_Dirichlet'][Dir_pores]
+        self.X = X
+        if output_times is None:
+            output_times = []
+        self._t_final = float(t_final)
+        self._dt = float(dt)
+        self._scheme = scheme
+        self._adaptive = adaptive
+        self._max_change = max_change
+        self._dt_max = 1024*self._dt if dt_max is None else float(dt_max)
+        self._output_times = sp.sort(sp.array(output_times, dtype=float))
+        self._filename = filename
+
+    def _do_outer_iteration_stage(self, iterative_solver=None, x0=None,
+                                  **kwargs):
+        r"""
+        Marches the solution from the current time to ``t_final``.
+
+        Notes
+        -----
+        The matrix of each step only depends on the time step, so it is
+        assembled and factorized (or preconditioned, for iterative solvers)
+        once per distinct time step and reused for all the steps that use
+        it.  The adaptive stepping only uses the initial time step multiplied
+        by powers of 2, so only a few matrices are ever needed.
+
+        Values at the output times that fall inside a step are interpolated
+        between the start and the end of the step, so the output times do not
+        constrain the time step.
+        """
+        self._iterative_solver = iterative_solver
+        self._step_matrices = {}
+        t = self.time
+        dt = self._dt
+        X = self.X
+        outputs = self._output_times[self._output_times >= t]
+        f = None
+        if self._filename is not None and sp.size(outputs) > 0:
+            f = open(self._filename, 'ab')
+        step = 0
+        try:
+            while t < self._t_final*(1 - 1e-12):
+                h = min(dt, self._t_final - t)
+                X_new = self._do_one_time_step(X, h, **kwargs)
+                change = sp.amax(sp.absolute(X_new - X))
+                if self._adaptive and change > self._max_change and \
+                        h > self._dt*1e-6:
+                    dt = dt/2
+                    continue
+                # Write the values at the output times inside this step
+                while sp.size(outputs) > 0 and outputs[0] <= t + h:
+                    w = (outputs[0] - t)/h
+                    if f is not None:
+                        self._write_output(f, outputs[0], (1 - w)*X + w*X_new)
+                    outputs = outputs[1:]
+                t = t + h
+                X = X_new
+                step += 1
+                if self._adaptive and change < self._max_change/4 and \
+                        h == dt and 2*dt <= self._dt_max:
+                    dt = 2*dt
+        finally:
+            if f is not None:
+                f.close()
+        logger.info('Reached time ' + str(t) + ' after ' + str(step) +
+                    ' steps, using ' + str(len(self._step_matrices)) +
+                    ' different time steps')
+        del self._step_matrices
+        self.time = self._t_final
+        self._steps = step
+        self.X = X
+        self._Neumann_super_X = self.X[self.Np:self._coeff_dimension]
+        self[self._quantity] = self.X[self.Ps]
+        logger.info('Writing the results to ' + '[\'' + self._quantity +
+                    '\'] in the ' + self.name + ' algorithm.')
+
+    def _do_one_time_step(self, X, h, **kwargs):
+        r"""
+        Advances the values X by one time step of size h.
+        """
+        if h not in self._step_matrices.keys():
+            self._step_matrices[h] = self._build_step_matrix(h, **kwargs)
+        M, theta, solver = self._step_matrices[h]
+        V = self._accumulation
+        b = sp.ravel(self.b)
+        rhs = b - V/h*X
+        if self._scheme == 'cranknicolson':
+            rhs = rhs - (1 - theta)*(self.A*X)
+        if self._iterative_solver is None:
+            return solver.solve(rhs)
+        X_new, report = solvers.solve(M, rhs, solver=self._iterative_solver,
+                                      x0=X, M=solver, **kwargs)
+        self._iterative_solver_info = report['info']
+        self.solver_report = report
+        return X_new
+
+    def _build_step_matrix(self, h, preconditioner=None,
+                           preconditioner_args={}, **kwargs):
+        r"""
+        Builds the matrix of the time stepping scheme for the time step h,
+        along with its factorization or preconditioner.
+
+        Notes
+        -----
+        Rows without an accumulation term (the Dirichlet pores and the super
+        pores of Neumann_group conditions) are algebraic constraints, so they
+        are always treated implicitly.
+        """
+        V = self._accumulation
+        theta = sp.ones(self._coeff_dimension)
+        if self._scheme == 'cranknicolson':
+            theta[V > 0] = 0.5
+        M = sprs.diags(theta)*self.A - sprs.diags(V/h)
+        M = M.tocsr()
+        if self._iterative_solver is None:
+            # Kept with the step matrix rather than in the shared cache
+            solver = sprslin.splu(M.tocsc())
+        elif preconditioner is None:
+            solver = None
+        else:
+            A_sym = solvers._symmetrize(M, sp.zeros(self._coeff_dimension))[0]
+            solver = solvers._build_preconditioner(A_sym, preconditioner,
+                                                   **preconditioner_args)
+        return (M, theta, solver)
+
+    def _write_output(self, f, t, X):
+        sp.save(f, sp.array(t, dtype=float))
+        sp.save(f, X[self.Ps])
+
+    @staticmethod
+    def read_output(filename):
+        r"""
+        Reads the values written at the output times of a transient run.
+
+        Parameters
+        ----------
+        filename : string
+            The file given to ``run`` or ``setup``
+
+        Returns
+        -------
+        A generator producing a tuple containing the time and the values of
+        the quantity in each pore, for every output time.  The values are
+        read from disk one output time at a time.
+        """
+        with open(filename, 'rb') as f:
+            while True:
+                try:
+                    t = float(sp.load(f))
+                except (IOError, ValueError, EOFError):
+                    return
+                yield (t, sp.load(f))
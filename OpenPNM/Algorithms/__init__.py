@@ -31,14 +31,20 @@ Classes
 .. autoclass:: FourierConduction
    :members:
 
+.. autoclass:: TransientLinearTransport
+   :members:
+
 """
 
+from . import solvers
+from . import percolation
 from .__GenericAlgorithm__ import GenericAlgorithm
 from .__GenericLinearTransport__ import GenericLinearTransport
 from .__FickianDiffusion__ import FickianDiffusion
 from .__FourierConduction__ import FourierConduction
 from .__OhmicConduction__ import OhmicConduction
 from .__StokesFlow__ import StokesFlow
+from .__TransientLinearTransport__ import TransientLinearTransport
 from .__OrdinaryPercolation__ import OrdinaryPercolation
 from .__InvasionPercolation__ import InvasionPercolation
 from .__Drainage__ import Drainage
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+===============================================================================
+Algorithms.percolation: Single pass percolation on sorted entry pressures
+===============================================================================
+
+The percolation algorithms apply a list of increasing capillary pressures and
+find the clusters of invaded throats at each one.  The functions in this
+module find the exact pressure at which each pore and throat joins a cluster
+connected to the inlets in a single pass, by sorting the throats by entry
+pressure once and merging clusters with a union-find structure as the
+pressure rises.  The results for any list of applied pressures are then
+obtained with ``discretize``.  The trapping of the defending phase is found
+in the same way by ``trapping``, processing the invasion in reverse.
+
+"""
+import scipy as _sp
+from OpenPNM.Base import logging as _logging
+from OpenPNM.Base import Profiler as _profiler
+logger = _logging.getLogger(__name__)
+
+
+@_profiler.timed('percolation')
+def invasion_pressures(network, entry_pressure, inlets=None, residual=None):
+    r"""
+    Finds the lowest applied pressure at which each pore and throat belongs
+    to a cluster of invaded throats that is connected to the inlets.
+
+    Parameters
+    ----------
+    network : OpenPNM Network Object
+        The network on which the percolation takes place
+
+    entry_pressure : array_like
+        The entry pressure of each throat
+
+    inlets : array_like, optional
+        The pores (or a boolean mask of the pores) from which the invading
+        phase enters the network.  If not given, access to the throats is not
+        limited, so every throat is invaded at its entry pressure.
+
+    residual : array_like, optional
+        The throats (or a boolean mask of the throats) that are filled with
+        invading phase from the start, so they are treated as having an entry
+        pressure of -inf.
+
+    Returns
+    -------
+    A tuple containing the invasion pressures of the pores and the throats.
+    Pores and throats that are never connected to the inlets have a value of
+    inf.
+
+    Notes
+    -----
+    As in ``find_clusters2``, a pore only belongs to a cluster once one of
+    its throats is invaded, so the inlet pores themselves are invaded at the
+    lowest entry pressure of their throats.
+
+    The throats are processed in order of increasing entry pressure.  Each
+    cluster keeps a list of its pores and throats that are not yet connected
+    to the inlets, and the smaller list is appended to the larger one when
+    two clusters merge.  As soon as a cluster is connected to an inlet all of
+    the pores and throats in its list are given the current pressure, so each
+    element is assigned exactly once.  The total cost is O(N log(N)).
+
+    Examples
+    --------
+    >>> import OpenPNM
+    >>> import OpenPNM.Algorithms.percolation as percolation
+    >>> pn = OpenPNM.Network.Cubic(shape=[3, 1, 1])
+    >>> Pc = percolation.invasion_pressures(pn, entry_pressure=[2., 1.],
+    ...                                     inlets=[0])
+    >>> Pc[0].tolist()
+    [2.0, 2.0, 2.0]
+    >>> Pc[1].tolist()
+    [2.0, 2.0]
+    """
+    Np = network.Np
+    Nt = network.Nt
+    conns = network['throat.conns']
+    entry = _sp.array(entry_pressure, dtype=float, ndmin=1)*_sp.ones(Nt)
+    if residual is not None:
+        entry[residual] = -_sp.inf
+    if inlets is None:
+        p_Pc = _sp.ones(Np)*_sp.inf
+        _sp.minimum.at(p_Pc, conns[:, 0], entry)
+        _sp.minimum.at(p_Pc, conns[:, 1], entry)
+        return (p_Pc, entry)
+    is_inlet = _sp.zeros(Np, dtype=bool)
+    is_inlet[inlets] = True
+    p_Pc = _sp.ones(Np)*_sp.inf
+    t_Pc = _sp.ones(Nt)*_sp.inf
+    parent = _sp.arange(Np)
+    size = _sp.ones(Np, dtype=int)
+    active = _sp.zeros(Np, dtype=bool)
+    connected = _sp.zeros(Np, dtype=bool)
+    pending = {}
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    order = _sp.argsort(entry, kind='mergesort')
+    start = 0
+    while start < Nt:
+        # Invade all throats with the same entry pressure together
+        Pc = entry[order[start]]
+        stop = start + 1
+        while stop < Nt and entry[order[stop]] == Pc:
+            stop += 1
+        roots = []
+        for t in order[start:stop]:
+            for p in conns[t]:
+                if not active[p]:
+                    active[p] = True
+                    connected[p] = is_inlet[p]
+                    pending[p] = ([p], [])
+            r1 = find(conns[t, 0])
+            r2 = find(conns[t, 1])
+            if r1 != r2:
+                if size[r1] < size[r2]:
+                    r1, r2 = r2, r1
+                parent[r2] = r1
+                size[r1] += size[r2]
+                connected[r1] = connected[r1] or connected[r2]
+                for a, b in zip(pending[r1], pending.pop(r2)):
+                    a.extend(b)
+            pending[r1][1].append(t)
+            roots.append(r1)
+        # Assign the pressure to everything newly connected to an inlet
+        for r in roots:
+            r = find(r)
+            if connected[r] and (len(pending[r][0]) + len(pending[r][1])):
+                p_Pc[pending[r][0]] = Pc
+                t_Pc[pending[r][1]] = Pc
+                pending[r] = ([], [])
+        start = stop
+    return (p_Pc, t_Pc)
+
+
+def discretize(values, inv_points):
+    r"""
+    Converts exact invasion pressures into the first applied pressure at
+    which each pore or throat is invaded.
+
+    Parameters
+    ----------
+    values : array_like
+        The exact invasion pressures, as returned by ``invasion_pressures``
+
+    inv_points : array_like
+        The applied pressures, in the order they are applied
+
+    Returns
+    -------
+    An array containing the first applied pressure that is greater than or
+    equal to each value, or inf if no applied pressure is high enough.
+
+    Examples
+    --------
+    >>> import OpenPNM.Algorithms.percolation as percolation
+    >>> percolation.discretize([0.5, 1.5, 4.0], inv_points=[1, 2, 3]).tolist()
+    [1.0, 2.0, inf]
+    """
+    values = _sp.array(values, dtype=float, ndmin=1)
+    points = _sp.array(inv_points, dtype=float, ndmin=1)
+    result = _sp.ones_like(values)*_sp.inf
+    if _sp.size(points) == 0:
+        return result
+    # Only the points that raise the pressure above all previous ones invade
+    # new elements, so search the running maximum of the applied pressures
+    peaks = _sp.maximum.accumulate(points)
+    ind = _sp.searchsorted(peaks, values, side='left')
+    mask = ind < _sp.size(points)
+    result[mask] = peaks[ind[mask]]
+    return result
+
+
+def saturation(pore_Pc, throat_Pc, pore_volume, throat_volume):
+    r"""
+    Finds the fraction of the total volume that is invaded when each pore
+    and throat is invaded.
+
+    Parameters
+    ----------
+    pore_Pc and throat_Pc : array_like
+        The pressure at which each pore and throat is invaded
+
+    pore_volume and throat_volume : array_like
+        The volume of each pore and throat
+
+    Returns
+    -------
+    A tuple containing the saturation at the time each pore and throat was
+    invaded, which is inf for pores and throats that are never invaded.
+    """
+    Pc = _sp.concatenate((pore_Pc, throat_Pc))
+    vol = _sp.concatenate((pore_volume, throat_volume))
+    order = _sp.argsort(Pc, kind='mergesort')
+    cum_vol = _sp.cumsum(vol[order])
+    # The saturation at a pressure includes everything invaded at or below it
+    ind = _sp.searchsorted(Pc[order], Pc, side='right') - 1
+    sat = cum_vol[ind]/_sp.sum(vol)
+    sat[Pc == _sp.inf] = _sp.inf
+    Np = _sp.size(pore_Pc)
+    return (sat[:Np], sat[Np:])
+
+
+@_profiler.timed('percolation')
+def trapping(network, pore_Pc, throat_Pc, outlets, inv_points):
+    r"""
+    Finds the applied pressure at which the defending phase in each pore and
+    throat becomes trapped, by processing the invasion in reverse.
+
+    Parameters
+    ----------
+    network : OpenPNM Network Object
+        The network on which the percolation takes place
+
+    pore_Pc and throat_Pc : array_like
+        The pressure at which each pore and throat is invaded, which is inf
+        for those that are never invaded.
+
+    outlets : array_like
+        The pores (or a boolean mask of the pores) through which the
+        defending phase can escape
+
+    inv_points : array_like
+        The applied pressures at which trapping is checked
+
+    Returns
+    -------
+    A tuple containing the lowest applied pressure at which each pore and
+    throat is trapped, which is inf for those that are never trapped.
+
+    Notes
+    -----
+    At a given pressure the defending phase occupies the pores and throats
+    that have not been invaded yet, and the throats connect defending pores
+    when all three are defending.  Going backwards from the highest pressure,
+    the defending clusters only grow and merge, so the highest pressure at
+    which each pore is still connected to an outlet is found with one pass of
+    ``invasion_pressures`` over the throats, sorted in reverse.  A defending
+    pore is trapped at every applied pressure at or above this value, and a
+    defending throat is trapped once neither of its pores connects it to an
+    outlet.  The total cost is O(N log(N)), instead of one clustering per
+    applied pressure.
+
+    Examples
+    --------
+    >>> import OpenPNM
+    >>> import OpenPNM.Algorithms.percolation as percolation
+    >>> pn = OpenPNM.Network.Cubic(shape=[3, 1, 1])
+    >>> trapped = percolation.trapping(pn, pore_Pc=[1., 3., 2.],
+    ...                                throat_Pc=[3., 3.], outlets=[2],
+    ...                                inv_points=[1., 2., 3.])
+    >>> trapped[0].tolist()
+    [inf, 2.0, inf]
+    """
+    conns = network['throat.conns']
+    p_Pc = _sp.array(pore_Pc, dtype=float, ndmin=1)
+    t_Pc = _sp.array(throat_Pc, dtype=float, ndmin=1)
+    # The pressure up to which each throat connects two defending pores
+    link = _sp.amin(_sp.vstack((t_Pc, p_Pc[conns[:, 0]], p_Pc[conns[:, 1]])),
+                    axis=0)
+    # Processing the throats from the highest pressure down, find the highest
+    # pressure at which each pore is connected to an outlet
+    p_conn = -invasion_pressures(network, entry_pressure=-link,
+                                 inlets=outlets)[0]
+    p_conn[outlets] = _sp.maximum(p_conn[outlets], p_Pc[outlets])
+    t_conn = _sp.amax(p_conn[conns], axis=1)
+    points = _sp.unique(_sp.array(inv_points, dtype=float, ndmin=1))
+
+    def first_point(conn, Pc):
+        # The first point where an element is disconnected but not invaded
+        result = _sp.ones_like(Pc)*_sp.inf
+        if _sp.size(points) == 0:
+            return result
+        ind = _sp.searchsorted(points, conn, side='left')
+        mask = ind < _sp.size(points)
+        mask[mask] = points[ind[mask]] < Pc[mask]
+        result[mask] = points[ind[mask]]
+        return result
+
+    return (first_point(p_conn, p_Pc), first_point(t_conn, t_Pc))
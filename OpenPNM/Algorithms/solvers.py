@@ -0,0 +1,448 @@
+# -*- coding: utf-8 -*-
+"""
+===============================================================================
+Algorithms.solvers: Registry of sparse linear solvers and preconditioners
+===============================================================================
+
+The linear transport algorithms look up their solver in this registry by
+name, so new backends can be added with ``register`` without touching the
+algorithms themselves.  Each entry stores the solver function along with its
+default arguments, and every solve returns a report describing how well the
+solution converged.
+
+"""
+import hashlib as _hashlib
+from collections import OrderedDict as _OrderedDict
+import scipy as _sp
+import scipy.sparse as _sprs
+import scipy.sparse.linalg as _sprslin
+from OpenPNM.Base import Tools as _tools
+from OpenPNM.Base import logging as _logging
+from OpenPNM.Base import Profiler as _profiler
+logger = _logging.getLogger(__name__)
+
+_solvers = {}
+_preconditioners = {}
+_factorizations = _OrderedDict()
+_factorization_stats = {'hits': 0, 'misses': 0, 'maxsize': 0}
+
+
+def register(name, solver, defaults={}, iterative=True, preconditioners=[]):
+    r"""
+    Add a linear solver to the registry
+
+    Parameters
+    ----------
+    name : string
+        The name used to request this solver, such as ``'cg'``
+
+    solver : function
+        A function with the signature ``solver(A, b, M=None, **kwargs)``
+        that returns a tuple containing the solution and a dictionary with
+        the ``'info'`` flag and number of ``'iterations'`` performed.
+
+    defaults : dict
+        The default values of the keyword arguments accepted by the solver.
+        Only arguments listed here (plus ``x0`` and ``callback`` for iterative
+        solvers, and ``M`` for preconditioned solvers) are passed through to
+        the solver, all others are ignored.
+
+    iterative : boolean
+        Indicates whether the solver is iterative.  Iterative solvers receive
+        a symmetrized version of the system (see Notes in ``solve``).
+
+    preconditioners : list of strings
+        The names of the preconditioners that can be used with this solver.
+        Solvers that accept a preconditioner receive it as the ``M``
+        argument.
+    """
+    _solvers[name] = {'solver': solver,
+                      'defaults': dict(defaults),
+                      'iterative': iterative,
+                      'preconditioners': list(preconditioners)}
+
+
+def register_preconditioner(name, builder, defaults={}):
+    r"""
+    Add a preconditioner to the registry
+
+    Parameters
+    ----------
+    name : string
+        The name used to request this preconditioner, such as ``'ilu'``
+
+    builder : function
+        A function with the signature ``builder(A, **kwargs)`` that returns
+        a sparse matrix or LinearOperator approximating the inverse of A.
+
+    defaults : dict
+        The default values of the keyword arguments accepted by the builder
+    """
+    _preconditioners[name] = {'builder': builder,
+                              'defaults': dict(defaults)}
+
+
+def available(kind='solvers'):
+    r"""
+    Returns a sorted list with the names of the registered solvers, or of the
+    registered preconditioners if ``kind`` is ``'preconditioners'``.
+
+    Examples
+    --------
+    >>> import OpenPNM.Algorithms.solvers as solvers
+    >>> 'spsolve' in solvers.available()
+    True
+    >>> solvers.available('preconditioners')
+    ['ilu', 'jacobi']
+    """
+    if kind == 'preconditioners':
+        return sorted(_preconditioners.keys())
+    return sorted(_solvers.keys())
+
+
+def defaults(name):
+    r"""
+    Returns a copy of the default arguments of the named solver
+    """
+    return dict(_get(name)['defaults'])
+
+
+def _get(name):
+    if name not in _solvers.keys():
+        raise Exception('The requested solver (' + str(name) + ') is not ' +
+                        'registered, available solvers are: ' +
+                        str(available()))
+    return _solvers[name]
+
+
+@_profiler.timed('solver')
+def solve(A, b, solver='spsolve', preconditioner=None,
+          preconditioner_args={}, **kwargs):
+    r"""
+    Solve the sparse linear system AX = b with the named solver
+
+    Parameters
+    ----------
+    A : sparse matrix
+        The coefficient matrix
+
+    b : array_like
+        The right hand side vector
+
+    solver : string
+        The name of a registered solver.  The default is ``'spsolve'``, the
+        direct LU solver included in Scipy.  The ``'splu'`` solver is also
+        direct but can keep the factorization in a cache (see
+        ``factorize``).
+
+    preconditioner : string, optional
+        The name of a registered preconditioner to use with an iterative
+        solver.  An Exception is raised if the solver cannot use it, for
+        instance the ILU factors are not symmetric so 'ilu' cannot be used
+        with 'cg'.  This is ignored by direct solvers.
+
+    preconditioner_args : dict, optional
+        Arguments passed to the preconditioner, overriding its defaults
+
+    kwargs : keyword arguments
+        Arguments passed to the solver, overriding its defaults.  Arguments
+        that the solver does not accept are ignored.
+
+    Returns
+    -------
+    A tuple containing the solution and a report on the convergence.
+
+    Notes
+    -----
+    The coefficient matrices produced by the linear transport algorithms
+    contain identity rows for the Dirichlet pores while the remaining rows
+    have a negative diagonal, so the matrix is neither symmetric nor
+    definite.  Before calling an iterative solver, the known values are moved
+    to the right hand side and the sign of the remaining rows is flipped,
+    which yields a symmetric positive definite system with the same solution.
+    This is what allows CG and the multigrid solver to converge.  The right
+    hand side is also normalized, so ``tol`` is always relative to its norm
+    even when the conductances are very small.
+
+    Examples
+    --------
+    >>> import scipy as sp
+    >>> import scipy.sparse as sprs
+    >>> import OpenPNM.Algorithms.solvers as solvers
+    >>> A = sprs.diags([[-1]*9, [2]*10, [-1]*9], [-1, 0, 1], format='csr')
+    >>> b = sp.ones(10)
+    >>> X, report = solvers.solve(A, b, solver='cg', preconditioner='jacobi')
+    >>> report['converged']
+    True
+    """
+    entry = _get(solver)
+    params = dict(entry['defaults'])
+    allowed = list(params.keys())
+    if entry['iterative']:
+        allowed.extend(['x0', 'callback'])
+    if entry['preconditioners']:
+        allowed.append('M')
+    params.update({k: v for k, v in kwargs.items() if k in allowed})
+    A = _sprs.csr_matrix(A)
+    b = _sp.ravel(b).astype(float)
+    if entry['iterative']:
+        if preconditioner is not None and \
+                preconditioner not in entry['preconditioners']:
+            raise Exception('The ' + solver + ' solver cannot be used with ' +
+                            'the ' + str(preconditioner) + ' preconditioner')
+        (A, b) = _symmetrize(A, b)
+        if preconditioner is not None and params.get('M') is None:
+            params['M'] = _build_preconditioner(A, preconditioner,
+                                                **preconditioner_args)
+    elif preconditioner is not None:
+        logger.debug('Preconditioners are ignored by direct solvers')
+    # Normalize the system so the tolerances do not depend on its units
+    norm_b = _sp.linalg.norm(b)
+    if norm_b == 0:
+        norm_b = 1.0
+    if params.get('x0') is not None:
+        params['x0'] = _sp.ravel(params['x0'])/norm_b
+    (X, info) = entry['solver'](A, b/norm_b, **params)
+    X = _sp.ravel(X)
+    # Assess the quality of the solution
+    residual = _sp.linalg.norm(b/norm_b - A*X)
+    X = X*norm_b
+    report = _tools.PrintableDict()
+    report['solver'] = solver
+    report['preconditioner'] = preconditioner if entry['iterative'] else None
+    report['converged'] = bool(info['info'] == 0 and _sp.isfinite(residual))
+    report['iterations'] = info['iterations']
+    report['residual'] = residual
+    report['tol'] = params.get('tol')
+    report['info'] = info['info']
+    if not report['converged']:
+        logger.warning('The ' + solver + ' solver did not converge, the ' +
+                       'relative residual is ' + str(residual))
+    return (X, report)
+
+
+def fingerprint(*arrays):
+    r"""
+    Returns a string that identifies the content of the given arrays, for use
+    as a key in the factorization cache.
+
+    Examples
+    --------
+    >>> import scipy as sp
+    >>> import OpenPNM.Algorithms.solvers as solvers
+    >>> a = solvers.fingerprint(sp.ones(3), [1, 2])
+    >>> a == solvers.fingerprint(sp.ones(3), [1, 2])
+    True
+    >>> a == solvers.fingerprint(sp.ones(3), [1, 3])
+    False
+    """
+    digest = _hashlib.sha1()
+    for item in arrays:
+        item = _sp.ascontiguousarray(item)
+        if item.dtype == object:
+            raise Exception('Only numeric arrays can be fingerprinted')
+        digest.update(str(item.dtype).encode())
+        digest.update(str(item.shape).encode())
+        digest.update(item.tobytes())
+    return digest.hexdigest()
+
+
+@_profiler.timed('solver')
+def factorize(A, key=None, cache=None):
+    r"""
+    Returns the LU factorization of A, reusing a previous factorization if
+    one is available for the given key.
+
+    Parameters
+    ----------
+    A : sparse matrix
+        The coefficient matrix to factorize
+
+    key : string, optional
+        Identifies the matrix in the cache, such as a ``fingerprint`` of the
+        data used to build it.  If not given, the fingerprint of the matrix
+        itself is used.
+
+    cache : dict, optional
+        A dictionary owned by the caller, such as an algorithm, which keeps
+        only its most recent factorization.  If not given the module level
+        cache is used.
+
+    Returns
+    -------
+    A SuperLU object whose ``solve`` method accepts a 1D right hand side
+    vector or a 2D array with one right hand side per column.
+
+    Notes
+    -----
+    The linear transport algorithms pass their own ``cache`` when asked to
+    keep their factorization, so solving the same system repeatedly (for
+    instance while sweeping over boundary values) only pays for the
+    factorization once.  The module level cache is disabled by default, and
+    is enabled with ``set_cache_size``, keeping in mind that each
+    factorization can use far more memory than the matrix itself.
+    """
+    A = _sprs.csc_matrix(A)
+    if key is None:
+        key = fingerprint(A.indptr, A.indices, A.data)
+    store = _factorizations if cache is None else cache
+    if key in store.keys():
+        _factorization_stats['hits'] += 1
+        if cache is None:
+            _factorizations.move_to_end(key)
+        return store[key]
+    _factorization_stats['misses'] += 1
+    lu = _sprslin.splu(A)
+    if cache is not None:
+        cache.clear()
+        cache[key] = lu
+    elif _factorization_stats['maxsize'] > 0:
+        _factorizations[key] = lu
+        while len(_factorizations) > _factorization_stats['maxsize']:
+            _factorizations.popitem(last=False)
+    return lu
+
+
+def set_cache_size(maxsize):
+    r"""
+    Sets the number of factorizations kept in the module level cache, where
+    0 (the default) disables the cache.
+    """
+    _factorization_stats['maxsize'] = int(maxsize)
+    while len(_factorizations) > _factorization_stats['maxsize']:
+        _factorizations.popitem(last=False)
+
+
+def clear_cache():
+    r"""
+    Removes all factorizations from the cache and resets its statistics
+    """
+    _factorizations.clear()
+    _factorization_stats['hits'] = 0
+    _factorization_stats['misses'] = 0
+
+
+def cache_info():
+    r"""
+    Returns a dictionary with the number of cache hits and misses, the size
+    of the cache and its maximum size.
+    """
+    info = _tools.PrintableDict()
+    info['hits'] = _factorization_stats['hits']
+    info['misses'] = _factorization_stats['misses']
+    info['size'] = len(_factorizations)
+    info['maxsize'] = _factorization_stats['maxsize']
+    return info
+
+
+def _symmetrize(A, b):
+    r"""
+    Moves the rows that only contain a diagonal entry (the Dirichlet pores) to
+    the right hand side and flips the sign of rows with a negative diagonal.
+    The Dirichlet rows are scaled to the size of the remaining diagonal so
+    that they do not dominate the norm used in the convergence test.
+    """
+    diag = A.diagonal()
+    fixed = (_sp.diff(A.indptr) == 1) & (diag != 0)
+    x_fixed = _sp.zeros_like(b)
+    x_fixed[fixed] = b[fixed]/diag[fixed]
+    scale = 1.0
+    if _sp.any(~fixed):
+        scale = _sp.mean(_sp.absolute(diag[~fixed]))
+    b = b - A*x_fixed
+    b[fixed] = scale*x_fixed[fixed]
+    keep = _sprs.diags((~fixed).astype(float))
+    A = keep*A*keep + _sprs.diags(scale*fixed)
+    sign = _sp.where(A.diagonal() < 0, -1.0, 1.0)
+    A = _sprs.diags(sign)*A
+    return (A.tocsr(), sign*b)
+
+
+def _build_preconditioner(A, name, **kwargs):
+    if name not in _preconditioners.keys():
+        raise Exception('The requested preconditioner (' + str(name) + ') ' +
+                        'is not registered, available preconditioners are: ' +
+                        str(available('preconditioners')))
+    entry = _preconditioners[name]
+    params = dict(entry['defaults'])
+    params.update(kwargs)
+    return entry['builder'](A, **params)
+
+
+def _jacobi(A):
+    diag = A.diagonal()
+    diag[diag == 0] = 1.0
+    return _sprs.diags(1.0/diag, format='csr')
+
+
+def _ilu(A, drop_tol=1e-3, fill_factor=5):
+    ilu = _sprslin.spilu(A.tocsc(), drop_tol=drop_tol,
+                         fill_factor=fill_factor)
+    return _sprslin.LinearOperator(A.shape, ilu.solve)
+
+
+def _spsolve(A, b, permc_spec='COLAMD'):
+    X = _sprslin.spsolve(A, b, permc_spec=permc_spec)
+    return (X, {'info': 0, 'iterations': 1})
+
+
+def _splu(A, b, key=None, cache=None):
+    X = factorize(A, key=key, cache=cache).solve(b)
+    return (X, {'info': 0, 'iterations': 1})
+
+
+def _krylov(method):
+    def solver(A, b, M=None, callback=None, **kwargs):
+        count = [0]
+
+        def _callback(*args):
+            count[0] += 1
+            if callback is not None:
+                callback(*args)
+
+        (X, info) = method(A, b, M=M, callback=_callback, **kwargs)
+        return (X, {'info': info, 'iterations': count[0]})
+    solver.__name__ = method.__name__
+    return solver
+
+
+def _amg(A, b, x0=None, callback=None, tol=1e-10, maxiter=None,
+         method='smoothed_aggregation', accel='cg'):
+    import pyamg
+    if method == 'smoothed_aggregation':
+        ml = pyamg.smoothed_aggregation_solver(A)
+    elif method == 'ruge_stuben':
+        ml = pyamg.ruge_stuben_solver(A)
+    else:
+        raise Exception('Unrecognized multigrid method: ' + method)
+    residuals = []
+    X = ml.solve(b, x0=x0, tol=tol, maxiter=maxiter, accel=accel,
+                 callback=callback, residuals=residuals)
+    info = 0 if residuals[-1] <= tol*_sp.linalg.norm(b) else len(residuals)
+    return (X, {'info': info, 'iterations': len(residuals) - 1})
+
+
+register('spsolve', _spsolve, defaults={'permc_spec': 'COLAMD'},
+         iterative=False)
+register('splu', _splu, defaults={'key': None, 'cache': None},
+         iterative=False)
+register('cg', _krylov(_sprslin.cg),
+         defaults={'tol': 1e-10, 'maxiter': None},
+         preconditioners=['jacobi'])
+register('bicgstab', _krylov(_sprslin.bicgstab),
+         defaults={'tol': 1e-10, 'maxiter': None},
+         preconditioners=['jacobi', 'ilu'])
+register('gmres', _krylov(_sprslin.gmres),
+         defaults={'tol': 1e-10, 'maxiter': None, 'restart': 50},
+         preconditioners=['jacobi', 'ilu'])
+register_preconditioner('jacobi', _jacobi)
+register_preconditioner('ilu', _ilu,
+                        defaults={'drop_tol': 1e-3, 'fill_factor': 5})
+try:
+    import pyamg as _pyamg
+    register('amg', _amg, defaults={'tol': 1e-10, 'maxiter': 100,
+                                    'method': 'smoothed_aggregation',
+                                    'accel': 'cg'})
+    del _pyamg
+except ImportError:
+    logger.debug('pyamg is not installed, the amg solver is not available')
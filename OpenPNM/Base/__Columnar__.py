@@ -0,0 +1,257 @@
+"""
+###############################################################################
+Columnar:  Binary container format for saving Workspaces and simulations
+###############################################################################
+
+The container is an uncompressed zip file holding:
+
+- 'manifest.json' : A description of the objects, their arrays, labels and
+  models, which can be read without OpenPNM.
+- 'arrays/<object>/<property>.npy' : One standard npy file for each array of
+  each object.  The start of each npy file is aligned to 64 bytes, so the
+  arrays can be memory mapped directly from the container.  The offsets,
+  data and ids of ragged arrays are stored as separate npy files, named
+  '<property>.offsets.npy' and so on.
+- 'objects.pkl' : The objects themselves, pickled with dill, where each array
+  is replaced by a reference to its npy file.
+
+Because the npy files are not compressed, loading a container only maps the
+arrays into memory, and their data is read from disk on first access.
+
+"""
+import contextlib
+import copyreg
+import os
+import tempfile
+import time
+import json
+import struct
+import zipfile
+import dill as _pickle
+import scipy as sp
+from numpy.lib import format as _npy
+import OpenPNM
+from OpenPNM.Base import logging
+from OpenPNM.Base import __Tools__ as Tools
+logger = logging.getLogger()
+
+# Alignment of the arrays in the container, the same as used by the npy format
+ALIGN = 64
+# The id of the zip extra field used to pad the headers of the npy files
+_PAD_ID = 0x4f50
+
+
+def is_columnar(filename):
+    r"""
+    Returns True if the file is a container written by ``save``.
+    """
+    if not zipfile.is_zipfile(filename):
+        return False
+    with zipfile.ZipFile(filename) as zf:
+        return 'manifest.json' in zf.namelist()
+
+
+def save(root, objects, filename):
+    r"""
+    Writes an object graph to a columnar container.
+
+    Parameters
+    ----------
+    root : object
+        The object to save, such as a Network or the Workspace
+    objects : list of OpenPNM Objects
+        The objects whose arrays are stored as separate npy files
+    filename : string
+        The name of the file to write
+
+    Notes
+    -----
+    The container is written to a temporary file which then replaces the
+    given file, so a file whose arrays are memory mapped by the objects
+    being saved can be overwritten.
+    """
+    members = {}
+    manifest = {'format': 'OpenPNM columnar',
+                'version': 1,
+                'openpnm': OpenPNM.__version__,
+                'objects': []}
+    for obj in objects:
+        arrays = {}
+        for key, value in dict.items(obj):
+            if _is_mappable(value):
+                name = 'arrays/' + obj.name + '/' + key + '.npy'
+                members.setdefault(id(value), (name, value))
+                arrays[key] = {'file': members[id(value)][0],
+                               'dtype': value.dtype.str,
+                               'shape': list(value.shape)}
+            elif isinstance(value, Tools.RaggedArray):
+                # Each part of a ragged array is stored as its own npy file
+                files = {}
+                for part in ['offsets', 'data', 'ids']:
+                    array = getattr(value, part)
+                    if _is_mappable(array):
+                        name = 'arrays/' + obj.name + '/' + key + '.' + \
+                            part + '.npy'
+                        members.setdefault(id(array), (name, array))
+                        files[part] = members[id(array)][0]
+                arrays[key] = {'ragged': files,
+                               'dtype': value.data.dtype.str,
+                               'shape': [len(value)]}
+        manifest['objects'].append({
+            'name': obj.name,
+            'class': obj.__class__.__module__ + '.' + obj.__class__.__name__,
+            'arrays': arrays,
+            'labels': [key for key in obj.keys()
+                       if getattr(dict.get(obj, key), 'dtype', None) == bool],
+            'models': {key: _describe_model(model)
+                       for key, model in obj.models.items()}})
+    with replacing(filename) as temp, \
+            zipfile.ZipFile(temp, 'w', zipfile.ZIP_STORED,
+                            allowZip64=True) as zf:
+        zf.writestr('manifest.json', json.dumps(manifest, indent=1))
+        for name, value in members.values():
+            _write_array(zf, name, value)
+        # Pickle the objects, referring to the arrays written above
+        with zf.open('objects.pkl', 'w', force_zip64=True) as f:
+            pickler = _pickle.Pickler(f, protocol=_pickle.HIGHEST_PROTOCOL)
+            table = copyreg.dispatch_table.copy()
+            for obj in objects:
+                table[type(obj)] = _reduce_core
+            pickler.dispatch_table = table
+            pickler.persistent_id = \
+                lambda obj: members[id(obj)][0] if id(obj) in members and \
+                members[id(obj)][1] is obj else None
+            pickler.dump(root)
+
+
+@contextlib.contextmanager
+def replacing(filename):
+    r"""
+    A context manager giving the name of a temporary file in the same
+    directory as ``filename``, which replaces ``filename`` when the block
+    completes, or is removed if the block raises an exception.
+
+    Notes
+    -----
+    Arrays memory mapped from the replaced file keep reading its old
+    contents, whereas writing to the file directly would truncate it under
+    them.
+    """
+    path = os.path.abspath(filename)
+    try:
+        mode = os.stat(path).st_mode & 0o777
+    except OSError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(path),
+                                prefix='.' + os.path.basename(path) + '.',
+                                suffix='.tmp')
+    os.close(fd)
+    try:
+        yield temp
+        os.chmod(temp, mode)
+        os.replace(temp, path)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+
+def load(filename):
+    r"""
+    Reads the object graph stored in a columnar container.
+
+    Returns
+    -------
+    The saved object, whose arrays are memory mapped in copy-on-write mode,
+    so they can be changed without changing the file.
+    """
+    with zipfile.ZipFile(filename) as zf:
+        manifest = json.loads(zf.read('manifest.json').decode())
+        if manifest.get('version', 0) > 1:
+            raise Exception('The file was written by a newer version of ' +
+                            'OpenPNM: ' + manifest['openpnm'])
+        with open(filename, 'rb') as fp:
+            offsets = {info.filename: _data_offset(fp, info)
+                       for info in zf.infolist()}
+        with zf.open('objects.pkl') as f:
+            unpickler = _pickle.Unpickler(f)
+            unpickler.persistent_load = \
+                lambda name: _map_array(filename, offsets[name])
+            return unpickler.load()
+
+
+def read_manifest(filename):
+    r"""
+    Returns the manifest of a columnar container, describing the objects,
+    arrays, labels and models it contains.
+    """
+    with zipfile.ZipFile(filename) as zf:
+        return json.loads(zf.read('manifest.json').decode())
+
+
+def _is_mappable(value):
+    return isinstance(value, sp.ndarray) and (value.dtype != object) and \
+        (value.size > 0)
+
+
+def _reduce_core(obj):
+    # The arrays are given with the state, so they are restored without
+    # going through __setitem__, which would copy them
+    return (copyreg.__newobj__, (type(obj), ),
+            (obj.__getstate__(), dict(obj)))
+
+
+def _describe_model(model):
+    spec = {}
+    for key, value in model.items():
+        if callable(value):
+            value = getattr(value, '__module__', '') + '.' + \
+                getattr(value, '__qualname__', repr(value))
+        elif isinstance(value, sp.ndarray):
+            value = 'array(' + value.dtype.str + ', ' + str(value.shape) + ')'
+        try:
+            json.dumps(value)
+        except TypeError:
+            value = repr(value)
+        spec[key] = value
+    return spec
+
+
+def _write_array(zf, name, value):
+    r"""
+    Writes an array as an npy file, padding the zip header so the npy file
+    starts on an aligned offset.  The array is written in chunks, without
+    making a full copy in memory.
+    """
+    fname = name.encode('utf-8')
+    # Local header, the name, the padding field and the zip64 field
+    start = zf.fp.tell() + 30 + len(fname) + 4 + 20
+    pad = (-start) % ALIGN
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[0:6])
+    info.compress_type = zipfile.ZIP_STORED
+    info.extra = struct.pack('<HH', _PAD_ID, pad) + b'\x00'*pad
+    with zf.open(info, 'w', force_zip64=True) as f:
+        _npy.write_array(f, sp.asanyarray(value), allow_pickle=False)
+
+
+def _data_offset(fp, info):
+    # The sizes of the name and extra fields of the local header may differ
+    # from the ones in the central directory, so read them from the file
+    fp.seek(info.header_offset)
+    header = fp.read(30)
+    n, m = struct.unpack('<HH', header[26:30])
+    return info.header_offset + 30 + n + m
+
+
+def _map_array(filename, offset):
+    with open(filename, 'rb') as fp:
+        fp.seek(offset)
+        version = _npy.read_magic(fp)
+        if version == (1, 0):
+            shape, fortran, dtype = _npy.read_array_header_1_0(fp)
+        else:
+            shape, fortran, dtype = _npy.read_array_header_2_0(fp)
+        offset = fp.tell()
+    return sp.memmap(filename, dtype=dtype, mode='c', shape=shape,
+                     order='F' if fortran else 'C', offset=offset)
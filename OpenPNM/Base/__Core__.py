@@ -4,6 +4,7 @@ Core:  Core Data Class
 ###############################################################################
 """
 from OpenPNM.Base import Workspace
+import copy as _copy
 import string
 import random
 import scipy as sp
@@ -18,6 +19,11 @@ class Core(dict):
     r"""
     Contains methods for working with the data in the OpenPNM dictionaries
     """
+    # Vertex data stored as object arrays by older versions of OpenPNM,
+    # which are converted to RaggedArrays when loaded
+    RAGGED_PROPS = ['pore.vert_index', 'throat.vert_index', 'pore.vertices',
+                    'throat.vertices', 'throat.offset_vertices',
+                    'pore.hull_coords', 'throat.facet_coords']
 
     def __new__(typ, *args, **kwargs):
         obj = dict.__new__(typ, *args, **kwargs)
@@ -30,6 +36,12 @@ class Core(dict):
         obj.physics = Tools.ObjectContainer()
         obj.network = Tools.ObjectContainer()
         obj._parent = None
+        # Initialize dict for caching the bitsets and indices of labels
+        obj._label_index = {}
+        # Initialize dict of tokens marking the last write of each array
+        obj._write_tokens = {}
+        # Initialize dict for caching arrays interleaved from other objects
+        obj._interleave_cache = {}
         # Initialize ordered dict for storing property models
         obj.models = ModelsDict()
         return obj
@@ -39,6 +51,42 @@ class Core(dict):
         logger.debug('Initializing Core class')
         self.name = name
 
+    def __setattr__(self, name, value):
+        # Give the ModelsDict a reference to its owner, to find it quickly
+        if (name == 'models') and isinstance(value, ModelsDict):
+            value._attach(self)
+        super().__setattr__(name, value)
+
+    def __getstate__(self):
+        # The interleaved arrays are rebuilt when needed
+        state = self.__dict__.copy()
+        state.pop('_interleave_cache', None)
+        return state
+
+    def __setstate__(self, state):
+        # Called by pickle and copy, the ModelsDict lost its owner reference
+        if type(state) == tuple:
+            # Attributes and arrays, which are restored without copying
+            state, arrays = state
+            dict.update(self, arrays)
+        self.__dict__.update(state)
+        if isinstance(state.get('models'), ModelsDict):
+            state['models']._attach(self)
+        for key in self.RAGGED_PROPS:
+            value = dict.get(self, key)
+            if getattr(value, 'dtype', None) == object:
+                dict.__setitem__(self, key, Tools.RaggedArray(list(value)))
+
+    def __deepcopy__(self, memo):
+        # Copy the arrays with the attributes instead of through __setitem__,
+        # so arrays already given in memo (such as shared views) are kept
+        obj = self.__class__.__new__(self.__class__)
+        memo[id(self)] = obj
+        arrays = {key: _copy.deepcopy(value, memo)
+                  for key, value in dict.items(self)}
+        obj.__setstate__((_copy.deepcopy(self.__getstate__(), memo), arrays))
+        return obj
+
     def __repr__(self):
         return '<%s.%s object at %s>' % (
             self.__class__.__module__,
@@ -71,6 +119,19 @@ class Core(dict):
         """
         # Enforce correct dict naming
         element = self._parse_element(key.split('.')[0], single=True)
+        # Remove any cached label index of the array being replaced
+        self._label_index.pop(key, None)
+        # Mark the array as written, for the dependency tracking of models
+        self._write_tokens[key] = object()
+        # Ragged arrays are stored as they are, one element per location
+        if isinstance(value, Tools.RaggedArray):
+            if len(value) == self._count(element) or \
+                    self._count(element) == 0:
+                super(Core, self).__setitem__(key, value.copy())
+            else:
+                logger.warning('Cannot write vector with an array of the ' +
+                               'wrong length: '+key)
+            return
         # Convert value to an ndarray
         value = sp.array(value, ndmin=1)
         # Skip checks for 'coords', 'conns'
@@ -82,21 +143,21 @@ class Core(dict):
         if key.split('.')[1] in protected_keys:
             if key in self.keys():
                 if sp.shape(self[key]) == (0,):
-                    logger.debug(key+' is being defined.')
+                    logger.debug('%s is being defined.', key)
                     super(Core, self).__setitem__(key, value)
                 else:
                     logger.warning(key+' is already defined.')
             else:
-                logger.debug(key+' is being defined.')
+                logger.debug('%s is being defined.', key)
                 super(Core, self).__setitem__(key, value)
             return
         # Write value to dictionary
         if sp.shape(value)[0] == 1:  # If value is scalar
-            logger.debug('Broadcasting scalar value into vector: '+key)
+            logger.debug('Broadcasting scalar value into vector: %s', key)
             value = sp.ones((self._count(element), ), dtype=value.dtype)*value
             super(Core, self).__setitem__(key, value)
         elif sp.shape(value)[0] == self._count(element):
-            logger.debug('Updating vector: '+key)
+            logger.debug('Updating vector: %s', key)
             super(Core, self).__setitem__(key, value)
         else:
             if self._count(element) == 0:
@@ -258,8 +319,10 @@ class Core(dict):
 
     add_model.__doc__ = ModelsDict.add.__doc__
 
-    def regenerate(self, props='', mode='inclusive'):
-        self.models.regenerate(props=props, mode=mode)
+    def regenerate(self, props='', mode='inclusive', only_dirty=False,
+                   parallel=False, max_workers=None):
+        self.models.regenerate(props=props, mode=mode, only_dirty=only_dirty,
+                               parallel=parallel, max_workers=max_workers)
 
     regenerate.__doc__ = ModelsDict.regenerate.__doc__
 
@@ -442,11 +505,9 @@ class Core(dict):
         if (sp.size(pores) == 0) and (sp.size(throats) == 0):
             element = self._parse_element(element=element)
             for item in element:
-                a = set([key for key in self.keys()
-                         if key.split('.')[0] == item])
-                b = set([key for key in self.keys()
-                         if self[key].dtype == bool])
-                labels.extend(list(a.intersection(b)))
+                labels.extend([key for key in self.keys()
+                               if key.split('.')[0] == item and
+                               self[key].dtype == bool])
         elif (sp.size(pores) > 0) and (sp.size(throats) > 0):
             raise Exception('Cannot perform label query on pores and ' +
                             'throats simultaneously')
@@ -544,34 +605,69 @@ class Core(dict):
         if element+'.all' not in self.keys():
             raise Exception('Cannot proceed without {}.all'.format(element))
 
-        # Begin computing label array
-        if mode in ['union']:
-            union = sp.zeros_like(self[element+'.all'], dtype=bool)
-            for item in labels:  # Iterate over labels and collect all indices
-                union = union + self[element+'.'+item.split('.')[-1]]
-            ind = union
+        # Single labels are returned straight from the label index
+        if (len(labels) == 1) and (mode in ['union', 'intersection']):
+            return sp.copy(self._get_label_index(labels[0])[1])
+        # Combine the packed bitsets of the labels with bitwise operations
+        N = self._count(element)
+        if mode in ['union', 'not', 'difference']:
+            bits = sp.zeros((N + 7)//8, dtype=sp.uint8)
+            for item in labels:
+                bits |= self._get_label_index(item)[0]
+            if mode in ['not', 'difference']:
+                bits = ~bits
         elif mode in ['intersection']:
-            intersect = sp.ones_like(self[element+'.all'], dtype=bool)
-            for item in labels:  # Iterate over labels and collect all indices
-                intersect = intersect*self[element+'.'+item.split('.')[-1]]
-            ind = intersect
+            bits = sp.ones((N + 7)//8, dtype=sp.uint8)*255
+            for item in labels:
+                bits &= self._get_label_index(item)[0]
         elif mode in ['not_intersection']:
-            not_intersect = sp.zeros_like(self[element+'.all'], dtype=int)
-            for item in labels:  # Iterate over labels and collect all indices
-                info = self[element+'.'+item.split('.')[-1]]
-                not_intersect = not_intersect + sp.int8(info)
-            ind = (not_intersect == 1)
-        elif mode in ['not', 'difference']:
-            none = sp.zeros_like(self[element+'.all'], dtype=int)
-            for item in labels:  # Iterate over labels and collect all indices
-                info = self[element+'.'+item.split('.')[-1]]
-                none = none - sp.int8(info)
-            ind = (none == 0)
-        # Extract indices from boolean mask
-        ind = sp.where(ind)[0]
+            once = sp.zeros((N + 7)//8, dtype=sp.uint8)
+            twice = sp.zeros((N + 7)//8, dtype=sp.uint8)
+            for item in labels:
+                info = self._get_label_index(item)[0]
+                twice |= once & info
+                once |= info
+            bits = once & ~twice
+        # Extract indices from the bitset
+        ind = sp.where(sp.unpackbits(bits)[:N].view(bool))[0]
         ind = ind.astype(dtype=int)
         return ind
 
+    def _get_label_index(self, label):
+        r"""
+        Returns the packed bitset and the indices of the locations where the
+        given label is applied.  These are cached for each label, and only
+        recomputed after the label array has been written.
+
+        Parameters
+        ----------
+        label : string
+            The full dictionary key of the label, such as 'pore.top'
+
+        Returns
+        -------
+        A tuple containing the label packed into bits with ``packbits``, the
+        indices where it is True, and the packed bits as a bytes object.
+
+        Notes
+        -----
+        Label arrays are often changed in place (i.e. ``obj['pore.top'][0] =
+        True``) which cannot be intercepted, so the cached values are checked
+        against the packed bits of the current array, which is much cheaper
+        than finding the indices again.  Replacing the array through
+        ``__setitem__`` removes its cached values immediately.
+        """
+        arr = self[label]
+        if arr.dtype != bool:
+            arr = arr != 0
+        packed = sp.packbits(arr)
+        entry = self._label_index.get(label)
+        if (entry is None) or (entry[2] != packed.tobytes()):
+            entry = (packed, sp.where(arr)[0].astype(dtype=int),
+                     packed.tobytes())
+            self._label_index[label] = entry
+        return entry
+
     def pores(self, labels='all', mode='union'):
         r"""
         Returns pore locations where given labels exist, according to the logic
@@ -839,6 +935,10 @@ class Core(dict):
         Float and boolean data is fine, but missing ints are converted to float
         when nans are inserted.
 
+        The locations of each source are cached, and found again when the
+        locations of any source change.  The values are always read from the
+        sources, so arrays changed in place are seen.
+
         Examples
         --------
         >>> import OpenPNM
@@ -887,14 +987,28 @@ class Core(dict):
             temp_sources.append(item)
         sources = temp_sources
 
+        # The locations of each source, and all of them concatenated
+        locs_key = (N, ) + tuple(self._net._write_tokens.get(element + '.' +
+                                                             item.name)
+                                 for item in sources)
+        scatter = self._interleave_cache.get(element)
+        if (scatter is None) or (scatter[0] != locs_key):
+            locs = [item._net._get_indices(element, item.name)
+                    for item in sources]
+            scatter = (locs_key, locs, sp.concatenate(locs + [[]]).astype(int))
+            self._interleave_cache[element] = scatter
+        locs = scatter[1]
+
         # Attempt to fetch the requested prop array from each object
         arrs = [item.get(prop) for item in sources]
-        locs = [item._net._get_indices(element, item.name) for item in sources]
         sizes = [sp.size(a) for a in arrs]
         if all([item is None for item in arrs]):  # prop not found anywhere
             raise KeyError(prop)
         if sp.any([i is None for i in arrs]):  # prop not found everywhere
             logger.warning('\''+prop+'\' not found on at least one object')
+        # Ragged arrays are combined into one, leaving missing elements empty
+        if any(isinstance(a, Tools.RaggedArray) for a in arrs):
+            return Tools.RaggedArray.scatter(N, zip(locs, arrs))
 
         # Check the general type of each array
         atype = []
@@ -928,12 +1042,15 @@ class Core(dict):
             temp_arr = temp_arr.astype(float)
             temp_arr.fill(sp.nan)
 
-        # Fill new array with values in the corresponding locations
-        for vals, inds in zip(arrs, locs):
-            if vals is not None:
-                temp_arr[inds] = vals
-            else:
-                temp_arr[inds] = dummy_val[atype[0]]
+        # Fill new array with values in the corresponding locations, which
+        # were already filled with the dummy value where the prop is missing
+        if all([item is not None for item in arrs]):
+            inds = scatter[2]
+        else:
+            inds = sp.concatenate([inds for vals, inds in zip(arrs, locs)
+                                   if vals is not None])
+        temp_arr[inds] = sp.concatenate([vals for vals in arrs
+                                         if vals is not None])
         return temp_arr
 
     def num_pores(self, labels='all', mode='union'):
@@ -1546,6 +1663,99 @@ class Core(dict):
                 health[item] = 'Does not exist'
         return health
 
+    def memory_usage(self, deep=True):
+        r"""
+        Returns the number of bytes used by each array on the object.
+
+        Parameters
+        ----------
+        deep : boolean
+            If True (default) the memory used by the elements of object
+            arrays (such as 'pore.vert_index') is included, as well as the
+            memory used by the private caches of the object, such as the
+            adjacency and incidence matrices of a Network, which are listed
+            under their attribute names (i.e. '_adjacency_matrix').
+
+        Returns
+        -------
+        A PrintableDict with the property names as keys and the number of
+        bytes as values.
+
+        See Also
+        --------
+        check_memory
+
+        Examples
+        --------
+        >>> import OpenPNM
+        >>> pn = OpenPNM.Network.TestNet()
+        >>> usage = pn.memory_usage()
+        >>> usage['pore.coords'] == pn.Np*3*8
+        True
+        """
+        usage = Tools.PrintableDict(header='bytes')
+        for key in sorted(self.keys()):
+            usage[key] = Tools._sizeof(dict.get(self, key), deep=deep)
+        if deep:
+            caches = ['_adjacency_matrix', '_incidence_matrix',
+                      '_neighbor_index', '_label_index', '_interleave_cache']
+            for attr in caches:
+                if getattr(self, attr, None):
+                    usage[attr] = Tools._sizeof(getattr(self, attr))
+            model_caches = {id(model.cache): model.cache
+                            for model in self.models.values()
+                            if model.cache is not None}
+            if model_caches:
+                usage['_model_cache'] = sum(cache.nbytes for cache in
+                                            model_caches.values())
+        return usage
+
+    def check_memory(self):
+        r"""
+        Finds the arrays on the object that could be stored using less
+        memory.
+
+        Returns
+        -------
+        A PrintableDict with the names of the compressible arrays as keys,
+        and a description of the possible saving as values.  The following
+        cases are detected:
+
+        - Float or integer arrays containing only 0 and 1, such as labels,
+          which could be boolean
+        - 64 bit integer arrays whose values fit in 32 bits, such as
+          'throat.conns' on most Networks
+        - Object arrays, which store a Python object per element
+
+        Examples
+        --------
+        >>> import OpenPNM
+        >>> pn = OpenPNM.Network.TestNet()
+        >>> pn['pore.flag'] = 1.0
+        >>> pn.check_memory()['pore.flag']
+        'float64 with only 0 and 1, could be bool'
+        """
+        notes = Tools.PrintableDict(header='note')
+        i32 = sp.iinfo(sp.int32)
+        for key in sorted(self.keys()):
+            value = dict.get(self, key)
+            if (not isinstance(value, sp.ndarray)) or (value.size == 0):
+                continue
+            kind = value.dtype.kind
+            if kind in 'fiu' and value.dtype.itemsize > 1:
+                ones = value == 1
+                if sp.any(ones) and sp.all(ones | (value == 0)):
+                    notes[key] = value.dtype.name + ' with only 0 and 1, ' + \
+                        'could be bool'
+                    continue
+            if kind in 'iu' and value.dtype.itemsize == 8:
+                if (sp.amin(value) >= i32.min) and (sp.amax(value) <= i32.max):
+                    notes[key] = value.dtype.name + ' could be int32'
+            elif kind == 'O':
+                notes[key] = 'object array, could be stored as flat ' + \
+                    'numeric arrays'
+        return notes
+
     def __str__(self):
         horizonal_rule = '-' * 60
         lines = [horizonal_rule]
@@ -1562,7 +1772,13 @@ class Core(dict):
             required = self._count(item.split('.')[0])
             if len(prop) > 35:  # Trim overly long prop names
                 prop = prop[0:32] + '...'
-            if self[item].dtype == object:  # Print objects differently
+            if isinstance(self[item], Tools.RaggedArray):
+                defined = sp.sum(self[item].lengths > 0)
+                lines.append("{0:<5d} {1:<35s} {2:>5d} / {3:<5d}".format(i + 1,
+                                                                         prop,
+                                                                         defined,
+                                                                         required))
+            elif self[item].dtype == object:  # Print objects differently
                 invalid = [i for i in self[item] if i is None]
                 defined = sp.size(self[item]) - len(invalid)
                 lines.append("{0:<5d} {1:<35s} {2:>5d} / {3:<5d}".format(i + 1,
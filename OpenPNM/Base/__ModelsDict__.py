@@ -3,10 +3,20 @@
 ModelsDict:  Abstract Class for Containing Models
 ###############################################################################
 """
+import hashlib
+import heapq
 import inspect
+import sys
+import threading
+import weakref
+import scipy as sp
 from collections import OrderedDict
+from concurrent import futures
 from OpenPNM.Base import logging, Workspace
+from OpenPNM.Base import __Profiler__ as Profiler
 logger = logging.getLogger()
+# Guards the ModelCaches, which can be used by models run on threads
+_cache_lock = threading.RLock()
 
 
 class ModelWrapper(dict):
@@ -18,10 +28,23 @@ class ModelWrapper(dict):
     """
 
     COMPONENTS = ['model', 'network', 'geometry', 'phase', 'physics', 'propname']
+    # The inputs of the model the last time it was run by its ModelsDict
+    _signature = None
+    # Weak reference to the ModelsDict holding the model
+    _models = None
+    # Optional ModelCache storing the results of the model
+    cache = None
 
     def __init__(self, **kwargs):
         self.update(**kwargs)
 
+    def __getstate__(self):
+        # Weak references cannot be pickled, the ModelsDict sets it again
+        state = self.__dict__.copy()
+        state.pop('_models', None)
+        state.pop('cache', None)
+        return state
+
     def __call__(self):
         return self['model'](**self)
 
@@ -60,6 +83,99 @@ class ModelWrapper(dict):
     def run(self):
         r"""
         Regenerate the model
+
+        Notes
+        -----
+        If a ModelCache has been assigned to the ``cache`` attribute of the
+        model, the result is looked up in the cache first, and stored in it
+        after running the model.  See ``ModelsDict.enable_cache``.
+        """
+        with Profiler.measure('model', self.get('propname')):
+            kwargs = self._arguments()
+            key = None
+            if self.cache is not None:
+                key = self._cache_key(kwargs)
+            if key is None:
+                return self['model'](**kwargs)
+            try:
+                return self.cache.get(key)
+            except KeyError:
+                value = self['model'](**kwargs)
+                self.cache.put(key, value)
+                return value
+
+    def _submit(self, pool):
+        r"""
+        Starts running the model on a pool of threads or processes, and
+        returns a function that waits for the result.
+
+        Notes
+        -----
+        On a pool of processes only the model function is sent to the
+        worker, so the cache is used and the model is timed in this process,
+        as in ``run``.
+        """
+        if not isinstance(pool, futures.ProcessPoolExecutor):
+            return pool.submit(self.run).result
+        timer = Profiler.measure('model', self.get('propname')).start()
+        kwargs = self._arguments()
+        key = None
+        if self.cache is not None:
+            key = self._cache_key(kwargs)
+        if key is not None:
+            try:
+                value = self.cache.get(key)
+                timer.stop()
+                return lambda: value
+            except KeyError:
+                pass
+        job = pool.submit(_call_model, self['model'], kwargs)
+
+        def result():
+            try:
+                value = job.result()
+            finally:
+                timer.stop()
+            if key is not None:
+                self.cache.put(key, value)
+            return value
+        return result
+
+    def _cache_key(self, kwargs):
+        r"""
+        Returns a key identifying the result of the model, made of the model
+        function, its arguments, the object it belongs to along with its
+        size and locations, and the write tokens of its input properties, or
+        None if the result cannot be cached.
+        """
+        models = self._models() if self._models is not None else None
+        if models is None:
+            return None
+        # Models producing random values must be run every time
+        if ('seed' in kwargs.keys()) and (kwargs['seed'] is None):
+            return None
+        key = [self['model']]
+        for name in sorted(self.keys()):
+            if name in ['model', 'propname', 'regen_mode']:
+                continue
+            value = _fingerprint(self[name])
+            if value is None:
+                return None
+            key.append((name, value))
+        master = self._find_master()
+        # Models of different objects, or of a resized object, give
+        # results of different lengths
+        net = master._net
+        key.append((master.name, master.Np, master.Nt, net.Np, net.Nt,
+                    net._write_tokens.get('pore.' + master.name),
+                    net._write_tokens.get('throat.' + master.name)))
+        key.append(tuple(models._tokens(master, self._inputs())))
+        return tuple(key)
+
+    def _arguments(self):
+        r"""
+        Returns the arguments of the model, including the objects associated
+        with its master object.
         """
         master = self._find_master()
         # Determine object type, and assign associated objects
@@ -78,9 +194,30 @@ class ModelWrapper(dict):
         else:
             kwargs['network'] = master
         kwargs.update(self)
-        return self['model'](**kwargs)
+        return kwargs
+
+    def _inputs(self):
+        r"""
+        Returns the names of the pore and throat properties that the model
+        reads, inferred from its string arguments such as
+        ``pore_diameter='pore.diameter'``.
+        """
+        inputs = []
+        for key, value in self.items():
+            if key == 'propname':
+                continue
+            values = value if type(value) in [list, tuple] else [value]
+            for item in values:
+                if type(item) == str and \
+                        item.split('.')[0] in ['pore', 'throat']:
+                    inputs.append(item)
+        return inputs
 
     def _find_master(self):
+        models = self._models() if self._models is not None else None
+        if (models is not None) and (dict.get(models, self['propname']) is self):
+            return models._find_master()
+        # The model is not attached to a ModelsDict, so scan all objects
         mgr = Workspace()
         master = []
         for item in list(mgr.keys()):
@@ -96,6 +233,107 @@ class ModelWrapper(dict):
         return master[0]
 
 
+def _call_model(model, kwargs):
+    # Module level function so it can be sent to a process pool
+    return model(**kwargs)
+
+
+def _fingerprint(value):
+    r"""
+    Returns a hashable fingerprint of a model argument, which is a hash of
+    the contents for arrays, or None if the argument is not hashable.
+    """
+    if isinstance(value, sp.ndarray):
+        value = sp.ascontiguousarray(value)
+        digest = hashlib.sha1(value.view(sp.uint8)).hexdigest()
+        return ('ndarray', value.dtype.str, value.shape, digest)
+    if type(value) in [list, tuple]:
+        items = tuple(_fingerprint(item) for item in value)
+        if any(item is None for item in items):
+            return None
+        return (type(value).__name__, items)
+    try:
+        hash(value)
+    except TypeError:
+        return None
+    # Compare numbers by value and type, so 1 and 1.0 are different keys
+    return (type(value).__name__, value)
+
+
+def _nbytes(value):
+    if isinstance(value, sp.ndarray):
+        return value.nbytes
+    if type(value) in [list, tuple]:
+        return sum(_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class ModelCache(OrderedDict):
+    r"""
+    A least recently used cache of model results, limited by the total size
+    of the stored results.
+
+    Parameters
+    ----------
+    max_bytes : int
+        The largest total size of the results kept in the cache.  The least
+        recently used results are removed when it is exceeded.
+
+    Notes
+    -----
+    The number of results found in the cache and of results that had to be
+    calculated are counted in the ``hits`` and ``misses`` attributes.
+    Arrays are copied when they are returned from the cache, so changing
+    them does not change the cached result.
+    """
+
+    def __init__(self, max_bytes=2**28):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        r"""
+        Returns the cached result for the given key, or raises a KeyError.
+        """
+        with _cache_lock:
+            try:
+                value = super().__getitem__(key)
+            except KeyError:
+                self.misses += 1
+                raise
+            self.move_to_end(key)
+            self.hits += 1
+        if isinstance(value, sp.ndarray):
+            value = sp.copy(value)
+        return value
+
+    def put(self, key, value):
+        r"""
+        Stores a result in the cache, removing the least recently used
+        results if the cache becomes too large.
+        """
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return
+        if isinstance(value, sp.ndarray):
+            value = sp.copy(value)
+        with _cache_lock:
+            if key in self.keys():
+                self.nbytes -= _nbytes(self.pop(key))
+            super().__setitem__(key, value)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                self.nbytes -= _nbytes(self.popitem(last=False)[1])
+
+    def clear(self):
+        with _cache_lock:
+            super().clear()
+            self.nbytes = 0
+
+
 class GenericModel(ModelWrapper):
     r"""
     This class was deprecated, and replaced by ModelWrapper.  Unfortunately,
@@ -143,12 +381,24 @@ class ModelsDict(OrderedDict):
     >>> boun.models is geom.models
     False
     """
+    # Weak reference to the object owning the dictionary
+    _master = None
 
     def __setitem__(self, propname, model):
         temp = ModelWrapper(propname=propname, model=None)
         temp.update(**model)
+        temp._models = weakref.ref(self)
         super().__setitem__(propname, temp)
 
+    def __reduce__(self):
+        # Weak references cannot be pickled, the owner sets it again
+        state = super().__reduce__()
+        if state[2] is not None:
+            attrs = state[2].copy()
+            attrs.pop('_master', None)
+            state = state[0:2] + (attrs or None,) + state[3:]
+        return state
+
     def __str__(self):
         horizontal_rule = '-' * 60
         lines = [horizontal_rule]
@@ -165,7 +415,8 @@ class ModelsDict(OrderedDict):
     def keys(self):
         return list(super().keys())
 
-    def regenerate(self, props='', mode='inclusive'):
+    def regenerate(self, props='', mode='inclusive', only_dirty=False,
+                   parallel=False, max_workers=None):
         r"""
         This updates properties using any models on the object that were
         assigned using ``add_model``
@@ -180,6 +431,49 @@ class ModelsDict(OrderedDict):
             * 'inclusive': (default) This regenerates all given properties
             * 'exclude': This generates all given properties EXCEPT the given ones
 
+        only_dirty : boolean
+            If False (default) every selected model is run.  If True a model
+            is only run when it has never been run, when one of its arguments
+            or input properties has been written since it was last run, or
+            when it has no input properties (such as random seeds).  Models
+            requested by name in 'inclusive' mode are always run.
+
+        parallel : boolean or string
+            If False (default) the models are run one at a time.  If True or
+            'thread' the models that do not depend on each other are run
+            together on a pool of threads, which is useful for models that
+            spend their time in NumPy functions.  If 'process' they are run
+            on a pool of processes instead, which is useful for models that
+            loop in Python, but the objects used by each model are pickled
+            and sent to its process.
+
+        max_workers : int, optional
+            The number of threads or processes used when ``parallel`` is
+            given.  The default is chosen by ``concurrent.futures``.
+
+        Notes
+        -----
+        The input properties of each model are inferred from its string
+        arguments, such as ``pore_diameter='pore.diameter'``, and are looked
+        up on the object, its Network and Geometries, and its Phase and the
+        Physics of the Phase.  The models are run in an
+        order where each model comes after the models that produce its inputs,
+        otherwise in the order they were added, so with ``only_dirty=True``
+        changing a property only recomputes the models downstream of it.
+
+        Writes are detected when arrays are set on an object (i.e.
+        ``geom['pore.diameter'] = 2``).  Arrays that are changed in place
+        (i.e. ``geom['pore.diameter'][0] = 2``) are not detected, nor are
+        properties that a model reads without receiving their name as an
+        argument, so ``only_dirty`` should only be used when neither happens.
+
+        When running in parallel, the models are grouped in levels where
+        each model only depends on models of the previous levels.  All the
+        models of a level are run before any results are written, and the
+        results are written to the object in the same order as when running
+        one model at a time, so the outcome does not depend on ``parallel``.
+        Models run in parallel must not change the objects they receive.
+
         Examples
         --------
         >>> import OpenPNM
@@ -201,6 +495,11 @@ class ModelsDict(OrderedDict):
         """
 
         master = self._find_master()
+        timer = Profiler.measure('regenerate', master.name).start()
+        if parallel not in [False, True, 'thread', 'process']:
+            raise Exception('Unrecognized parallel mode: ' + str(parallel))
+        # Models requested by name are always run
+        force = (not only_dirty) or (props != '' and mode != 'exclude')
         # If empty, assume all models are to be regenerated
         if props == '':
             props = list(self.keys())
@@ -218,15 +517,164 @@ class ModelsDict(OrderedDict):
         for item in list(self.keys()):
             if self[item]['regen_mode'] == 'constant' and item in props:
                 props.remove(item)
+        # Sort the models so each comes after the models producing its inputs
+        order = self._dependency_order()
+        props = [item for item in order if item in props] + \
+                [item for item in props if item not in order]
+        for item in props:
+            if item not in list(self.keys()):
+                logger.warning('Requested proptery is not a dynamic model: ' +
+                               item)
+        props = [item for item in props if item in list(self.keys())]
+        if parallel:
+            levels = [[item for item in level if item in props]
+                      for level in self._dependency_levels()]
+        else:
+            levels = [[item] for item in props]
         logger.info('Models are being recalculated in the following order: ')
+        pool = None
+        if parallel == 'process':
+            pool = futures.ProcessPoolExecutor(max_workers=max_workers)
+        elif parallel:
+            pool = futures.ThreadPoolExecutor(max_workers=max_workers)
         count = 0
-        for item in props:
-            if item in list(self.keys()):
-                master[item] = self[item].run()
-                logger.info(str(count) + ' : ' + item)
-                count += 1
-            else:
-                logger.warning('Requested proptery is not a dynamic model: ' + item)
+        try:
+            for level in levels:
+                # Models in a level do not read each other's results
+                todo = []
+                for item in level:
+                    signature = self._signature(master, item)
+                    if force or self._changed(self[item]._signature,
+                                              signature):
+                        todo.append(item)
+                    else:
+                        logger.debug('Inputs of %s are unchanged', item)
+                if (pool is None) or (len(todo) < 2):
+                    results = [self[item].run() for item in todo]
+                else:
+                    jobs = [self[item]._submit(pool) for item in todo]
+                    results = [job() for job in jobs]
+                # Write the results in order, once the level is finished
+                for item, result in zip(todo, results):
+                    master[item] = result
+                    self[item]._signature = self._signature(master, item)
+                    logger.info('%d : %s', count, item)
+                    count += 1
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            timer.stop()
+
+    def _dependency_order(self):
+        r"""
+        Returns the names of the models in an order where each model comes
+        after the models that produce its input properties.  Models that do
+        not depend on each other keep the order in which they were added.
+        """
+        keys = self.keys()
+        index = {item: i for i, item in enumerate(keys)}
+        children = {item: [] for item in keys}
+        num_parents = {item: 0 for item in keys}
+        for item in keys:
+            for prop in set(self[item]._inputs()):
+                if (prop in index) and (prop != item):
+                    children[prop].append(item)
+                    num_parents[item] += 1
+        heap = [index[item] for item in keys if num_parents[item] == 0]
+        heapq.heapify(heap)
+        order = []
+        while heap:
+            item = keys[heapq.heappop(heap)]
+            order.append(item)
+            for child in children[item]:
+                num_parents[child] -= 1
+                if num_parents[child] == 0:
+                    heapq.heappush(heap, index[child])
+        # Models in dependency cycles are left in the order they were added
+        order.extend([item for item in keys if item not in order])
+        return order
+
+    def _dependency_levels(self):
+        r"""
+        Groups the names of the models into levels, where each model only
+        depends on the models of previous levels, so the models of a level
+        can be run at the same time.  Within a level the models keep the
+        order given by ``_dependency_order``.
+        """
+        order = self._dependency_order()
+        depth = {}
+        cyclic = []
+        for item in order:
+            parents = [prop for prop in set(self[item]._inputs())
+                       if (prop in self.keys()) and (prop != item)]
+            if any(prop not in depth for prop in parents):
+                cyclic.append(item)
+                continue
+            depth[item] = 1 + max([depth[prop] for prop in parents] + [-1])
+        levels = [[] for i in range(max(list(depth.values()) + [-1]) + 1)]
+        for item in order:
+            if item in depth:
+                levels[depth[item]].append(item)
+        # Models in dependency cycles are run one at a time, at the end
+        levels.extend([[item] for item in cyclic])
+        return levels
+
+    def _signature(self, master, propname):
+        r"""
+        Collects the write tokens of the output and input properties of a
+        model on all the objects it can read, along with its arguments.
+        """
+        model = self[propname]
+        inputs = model._inputs()
+        tokens = self._tokens(master, [propname] + inputs)
+        args = dict(model)
+        return {'tokens': tokens, 'args': args, 'inputs': len(inputs)}
+
+    def _tokens(self, master, props):
+        r"""
+        Returns the write tokens of the given properties on all the objects
+        that the models of the master object can read.
+        """
+        # The objects whose data the models can read
+        objs = [master, master._net] + master._net._geometries
+        if master._isa('phys'):
+            objs += master._phases
+        for phase in [obj for obj in objs if obj._isa('phase')]:
+            objs += phase._physics
+        tokens = []
+        for obj in OrderedDict((id(obj), obj) for obj in objs).values():
+            for prop in props:
+                if prop in obj.keys():
+                    tokens.append((obj.name, prop,
+                                   obj._write_tokens.get(prop),
+                                   id(dict.get(obj, prop))))
+        return tokens
+
+    def _changed(self, old, new):
+        r"""
+        Compares two model signatures, returning True if the model must be
+        run again.
+        """
+        if (old is None) or (new['inputs'] == 0):
+            return True
+        if len(old['tokens']) != len(new['tokens']):
+            return True
+        for a, b in zip(old['tokens'], new['tokens']):
+            if (a[0:2] != b[0:2]) or (a[2] is not b[2]) or (a[3] != b[3]):
+                return True
+        if old['args'].keys() != new['args'].keys():
+            return True
+        for key in new['args'].keys():
+            a = old['args'][key]
+            b = new['args'][key]
+            if a is b:
+                continue
+            try:
+                if not (sp.shape(a) == sp.shape(b) and sp.all(a == b)):
+                    return True
+            except Exception:
+                return True
+        return False
 
     def add(self, propname, model, regen_mode='normal', **kwargs):
         r"""
@@ -304,9 +752,74 @@ class ModelsDict(OrderedDict):
         # Now generate data as necessary
         if regen_mode in ['normal', 'constant']:
             master[propname] = self[propname].run()
+            self[propname]._signature = self._signature(master, propname)
         if regen_mode in ['deferred', 'on_demand']:
             pass
 
+    def enable_cache(self, props=None, max_bytes=2**28, cache=None):
+        r"""
+        Stores the results of the models in a cache, so running a model
+        again with the same arguments and input properties returns the
+        stored result instead of calculating it.
+
+        Parameters
+        ----------
+        props : string or list of strings, optional
+            The models that should use the cache.  The default is all models.
+
+        max_bytes : int
+            The size limit of the cache in bytes, when a new cache is created.
+
+        cache : ModelCache, optional
+            An existing cache to use, which can be shared by the models of
+            several objects.
+
+        Returns
+        -------
+        The ModelCache, whose ``hits`` and ``misses`` attributes count how
+        often results are found in it.
+
+        Notes
+        -----
+        The input properties are identified by their write tokens, as in
+        ``regenerate``, so arrays changed in place are not detected.  Array
+        arguments are identified by a hash of their contents.  Models with
+        a ``seed`` argument of None, which produce new random values each
+        time, are never cached.
+
+        Examples
+        --------
+        >>> import OpenPNM
+        >>> pn = OpenPNM.Network.TestNet()
+        >>> geom = OpenPNM.Geometry.TestGeometry(network=pn, pores=pn.Ps,
+        ...                                      throats=pn.Ts)
+        >>> cache = geom.models.enable_cache(props='throat.length')
+        >>> a = geom.models['throat.length'].run()
+        >>> a = geom.models['throat.length'].run()
+        >>> (cache.hits, cache.misses)
+        (1, 1)
+        """
+        if cache is None:
+            cache = ModelCache(max_bytes=max_bytes)
+        if props is None:
+            props = self.keys()
+        elif type(props) == str:
+            props = [props]
+        for item in props:
+            self[item].cache = cache
+        return cache
+
+    def disable_cache(self, props=None):
+        r"""
+        Stops the given models, or all models by default, from using a cache.
+        """
+        if props is None:
+            props = self.keys()
+        elif type(props) == str:
+            props = [props]
+        for item in props:
+            self[item].cache = None
+
     def remove(self, propname):
         r"""
         Removes selected model from the dictionary, as well as removing its
@@ -359,8 +872,26 @@ class ModelsDict(OrderedDict):
         for item in order:
             self.move_to_end(item)
 
+    def _attach(self, master):
+        r"""
+        Records the object that owns the dictionary, which is called whenever
+        the dictionary is assigned to the ``models`` attribute of an object.
+        """
+        owner = self._master() if self._master is not None else None
+        if (owner is not None) and (owner is not master) and \
+                (owner.__dict__.get('models') is self):
+            # The dictionary is shared, so let _find_master check all objects
+            self._master = None
+        else:
+            self._master = weakref.ref(master)
+
     def _find_master(self):
         mgr = Workspace()
+        master = self._master() if self._master is not None else None
+        if (master is not None) and (master.__dict__.get('models') is self) \
+                and (mgr.get(master.name) is master):
+            return master
+        # The owner is unknown or no longer valid, so scan all objects
         master = []
         for item in list(mgr.keys()):
             if mgr[item].models is self:
@@ -371,5 +902,5 @@ class ModelsDict(OrderedDict):
                             'same dictionary multiple times use the copy method.')
         elif len(master) == 0:
             raise Exception('ModelsDict has no master.')
-
+        self._master = weakref.ref(master[0])
         return master[0]
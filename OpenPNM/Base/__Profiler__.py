@@ -0,0 +1,199 @@
+"""
+###############################################################################
+Profiler:  Opt-in timing of models, matrix assembly, solvers and percolation
+###############################################################################
+
+The functions and methods that do most of the work in a simulation are
+wrapped with ``timed``, or contain a ``measure`` block, which record the
+number of calls, the wall time and optionally the bytes allocated of each.
+Nothing is recorded until profiling is enabled, which is done through
+``Workspace.enable_profiling``, and the results are returned by
+``Workspace.perf_report``.
+
+"""
+import functools
+import json
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+# The records, or None when profiling is disabled
+_records = None
+_memory = False
+_started_tracemalloc = False
+_lock = threading.Lock()
+
+
+def enable(memory=False):
+    r"""
+    Starts recording, discarding any previous records.  If ``memory`` is
+    True the bytes allocated are also recorded, using ``tracemalloc``.
+    """
+    global _records, _memory, _started_tracemalloc
+    _records = OrderedDict()
+    _memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracemalloc = True
+
+
+def disable():
+    r"""
+    Stops recording, keeping the records until profiling is enabled again.
+    """
+    global _records, _memory, _started_tracemalloc
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+    _memory = False
+    report.last = _records
+    _records = None
+
+
+def enabled():
+    return _records is not None
+
+
+class measure():
+    r"""
+    A context manager recording the time spent in a block of code under the
+    given category and name.  The ``start`` and ``stop`` methods can be used
+    instead of a ``with`` block.
+    """
+    __slots__ = ['key', 't0', 'mem']
+
+    def __init__(self, category, name):
+        self.key = (category, name)
+
+    def start(self):
+        if _records is not None:
+            self.mem = tracemalloc.get_traced_memory()[0] if _memory else 0
+            self.t0 = time.perf_counter()
+        else:
+            self.t0 = None
+        return self
+
+    def stop(self):
+        if (_records is not None) and (self.t0 is not None):
+            elapsed = time.perf_counter() - self.t0
+            mem = tracemalloc.get_traced_memory()[0] - self.mem if _memory \
+                else 0
+            _record(self.key, elapsed, mem)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+        return False
+
+
+def timed(category, name=None):
+    r"""
+    A decorator recording the time spent in each call of a function under
+    the given category, and under its qualified name unless ``name`` is
+    given.
+    """
+    def decorator(f):
+        key = (category, name or f.__qualname__)
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if _records is None:
+                return f(*args, **kwargs)
+            mem = tracemalloc.get_traced_memory()[0] if _memory else 0
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                mem = tracemalloc.get_traced_memory()[0] - mem if _memory \
+                    else 0
+                _record(key, elapsed, mem)
+        return wrapper
+    return decorator
+
+
+def _record(key, elapsed, mem):
+    records = _records
+    if records is None:
+        return
+    with _lock:
+        entry = records.get(key)
+        if entry is None:
+            entry = records[key] = [0, 0.0, 0]
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] += mem
+
+
+def report():
+    r"""
+    Returns a PerfReport of the current records, or of the last records if
+    profiling has been disabled.
+    """
+    records = _records if _records is not None else report.last
+    result = PerfReport()
+    with _lock:
+        for (category, name), (calls, elapsed, mem) in (records or {}).items():
+            result[(category, name)] = {'calls': calls, 'time': elapsed,
+                                        'bytes': mem}
+    return result
+
+
+report.last = None
+
+
+class PerfReport(OrderedDict):
+    r"""
+    The records of the profiler, with tuples of (category, name) as keys,
+    and dictionaries containing the number of 'calls', the total wall 'time'
+    in seconds and the net 'bytes' allocated as values.
+
+    Notes
+    -----
+    The times are inclusive, so the time of a ``regenerate`` includes the
+    time of the models it runs.  The bytes are the net change of the memory
+    traced by ``tracemalloc`` during the calls, which is 0 unless memory
+    profiling was enabled.
+    """
+
+    def categories(self):
+        r"""
+        Returns the total time of each category.
+        """
+        totals = OrderedDict()
+        for (category, name), entry in self.items():
+            totals[category] = totals.get(category, 0.0) + entry['time']
+        return totals
+
+    def to_json(self, filename=None):
+        r"""
+        Returns the records as a JSON string, containing a list with one
+        entry per category and name, and writes it to a file if a filename
+        is given.
+        """
+        rows = [OrderedDict([('category', category), ('name', name)] +
+                            list(entry.items()))
+                for (category, name), entry in self.items()]
+        text = json.dumps(rows, indent=1)
+        if filename is not None:
+            with open(filename, 'w') as f:
+                f.write(text)
+        return text
+
+    def __str__(self):
+        horizontal_rule = '-' * 78
+        lines = [horizontal_rule]
+        lines.append('{0:<12s} {1:<36s} {2:>7s} {3:>9s} {4:>10s}'.format(
+            'Category', 'Name', 'Calls', 'Time (s)', 'Bytes'))
+        lines.append(horizontal_rule)
+        keys = sorted(self.keys(), key=lambda k: -self[k]['time'])
+        for category, name in keys:
+            entry = self[(category, name)]
+            lines.append('{0:<12s} {1:<36s} {2:>7d} {3:>9.4f} {4:>10d}'.format(
+                category, name[-36:], entry['calls'], entry['time'],
+                entry['bytes']))
+        lines.append(horizontal_rule)
+        return '\n'.join(lines)
@@ -3,7 +3,9 @@
 Tools:  Useful classes for use throughout the project
 ###############################################################################
 """
+import sys as _sys
 import scipy as _sp
+import scipy.sparse as _sprs
 from collections import OrderedDict as _odict
 
 
@@ -97,6 +99,266 @@ class HealthDict(PrintableDict):
     health = property(fget=_get_health)
 
 
+class MemoryReport(_odict):
+    r"""
+    The memory used by the objects of a Workspace, as returned by
+    ``Workspace.memory_report``.  The keys are the names of the Networks,
+    and each value is a dictionary containing the ``memory_usage`` of each
+    object of the simulation.  The arrays that could be stored in less memory
+    are listed in the ``compressible`` attribute.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.compressible = []
+
+    def total(self, simulation=None):
+        r"""
+        Returns the number of bytes used by the given simulation, or by all
+        simulations if not given.
+        """
+        sims = list(self.keys()) if simulation is None else [simulation]
+        return sum(sum(usage.values()) for sim in sims
+                   for usage in self[sim].values())
+
+    def __str__(self):
+        horizontal_rule = '-' * 60
+        lines = [horizontal_rule]
+        lines.append('{0:<40s} {1:>19s}'.format('Simulation / Object',
+                                                'Bytes'))
+        lines.append(horizontal_rule)
+        for sim in self.keys():
+            lines.append('{0:<40s} {1:>19d}'.format(sim, self.total(sim)))
+            for name, usage in self[sim].items():
+                lines.append('  {0:<38s} {1:>19d}'.format(
+                    name, sum(usage.values())))
+        lines.append(horizontal_rule)
+        if self.compressible:
+            lines.append('Compressible arrays:')
+            for name, prop, note in self.compressible:
+                lines.append('  ' + name + ' ' + prop + ': ' + note)
+            lines.append(horizontal_rule)
+        return '\n'.join(lines)
+
+
+class RaggedArray():
+    r"""
+    A 1D array whose elements are arrays of different lengths, such as the
+    vertices of each pore or throat.  All elements are stored in a single
+    flat array, and element ``i`` is the slice ``data[offsets[i]:offsets[i+1]]``
+    of it, as in the CSR sparse format.
+
+    Parameters
+    ----------
+    values : list, optional
+        The elements, each an array_like of rows, a dict or None.  The keys of
+        dicts (such as the vertex numbers of a Voronoi diagram) are stored in
+        ``ids`` and their values in ``data``, and None gives an empty element.
+
+    offsets, data and ids : array_like, optional
+        The flat storage, used instead of ``values``.  ``offsets`` holds the
+        start of each element and the total length at the end, ``data`` the
+        rows of all the elements, and ``ids`` an optional integer for each row.
+
+    Notes
+    -----
+    Indexing with an integer returns a view of the rows of that element, and
+    indexing with a slice, a boolean mask or a list of indices returns a new
+    RaggedArray, so the array can be trimmed and extended like any other
+    property.  Core objects accept RaggedArrays as property values.
+
+    Examples
+    --------
+    >>> import OpenPNM
+    >>> verts = OpenPNM.Base.Tools.RaggedArray([[[0, 0, 0], [1, 0, 0]],
+    ...                                         None,
+    ...                                         [[0, 1, 0]]])
+    >>> len(verts)
+    3
+    >>> verts.lengths.tolist()
+    [2, 0, 1]
+    >>> verts[2].tolist()
+    [[0.0, 1.0, 0.0]]
+    >>> verts[[0, 2]].data.shape
+    (3, 3)
+    """
+    ndim = 1
+    dtype = _sp.dtype(object)
+
+    def __init__(self, values=None, offsets=None, data=None, ids=None):
+        if values is not None:
+            offsets, data, ids = self._flatten(values)
+        if offsets is None:
+            offsets = [0]
+        self.offsets = _sp.array(offsets, dtype=_sp.int64, ndmin=1)
+        if data is None:
+            data = _sp.zeros((0, 3))
+        self.data = _sp.asarray(data)
+        self.ids = None if ids is None else _sp.asarray(ids, dtype=_sp.int64)
+        if _sp.size(self.data, 0) != self.offsets[-1]:
+            raise Exception('The offsets do not match the length of data')
+
+    @staticmethod
+    def _flatten(values):
+        rows = []
+        ids = []
+        has_ids = False
+        for item in values:
+            if item is None:
+                item = []
+            if isinstance(item, dict):
+                has_ids = True
+                ids.append(_sp.array(list(item.keys()), dtype=_sp.int64))
+                item = list(item.values())
+            else:
+                ids.append(_sp.zeros((len(item), ), dtype=_sp.int64))
+            rows.append(_sp.array(item, dtype=float, ndmin=2)
+                        if len(item) else _sp.zeros((0, 3)))
+        lengths = [len(item) for item in rows]
+        offsets = _sp.concatenate(([0], _sp.cumsum(lengths)))
+        data = _sp.concatenate(rows + [_sp.zeros((0, 3))]) \
+            if any(lengths) else _sp.zeros((0, 3))
+        if not has_ids:
+            return offsets, data, None
+        return offsets, data, _sp.concatenate(ids + [_sp.zeros((0, ),
+                                                               dtype=int)])
+
+    @classmethod
+    def scatter(cls, N, parts):
+        r"""
+        Builds a RaggedArray of length ``N`` from a list of (locations,
+        RaggedArray) pairs, placing the elements of each RaggedArray at the
+        given locations.  Locations not given are left empty.
+        """
+        parts = [(_sp.array(locs, dtype=_sp.int64, ndmin=1), arr)
+                 for locs, arr in parts if arr is not None]
+        lengths = _sp.zeros((N, ), dtype=_sp.int64)
+        for locs, arr in parts:
+            lengths[locs] = arr.lengths
+        offsets = _sp.concatenate(([0], _sp.cumsum(lengths)))
+        template = parts[0][1].data if parts else _sp.zeros((0, 3))
+        data = _sp.zeros((offsets[-1], ) + template.shape[1:],
+                         dtype=template.dtype)
+        use_ids = any(arr.ids is not None for locs, arr in parts)
+        ids = _sp.zeros((offsets[-1], ), dtype=_sp.int64) if use_ids else None
+        for locs, arr in parts:
+            pos = _ragged_positions(offsets[locs], arr.lengths)
+            data[pos] = arr.data
+            if use_ids and arr.ids is not None:
+                ids[pos] = arr.ids
+        return cls(offsets=offsets, data=data, ids=ids)
+
+    @property
+    def lengths(self):
+        r"""
+        The number of rows of each element
+        """
+        return _sp.diff(self.offsets)
+
+    @property
+    def shape(self):
+        return (len(self), )
+
+    @property
+    def size(self):
+        return len(self)
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.data.nbytes + \
+            (0 if self.ids is None else self.ids.nbytes)
+
+    def __len__(self):
+        return _sp.size(self.offsets) - 1
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, _sp.integer)):
+            if key < 0:
+                key += len(self)
+            return self.data[self.offsets[key]:self.offsets[key + 1]]
+        return self.take(_sp.arange(len(self))[key])
+
+    def take(self, locations):
+        r"""
+        Returns a new RaggedArray holding the elements at the given locations
+        """
+        locations = _sp.array(locations, dtype=_sp.int64, ndmin=1)
+        lengths = self.lengths[locations]
+        pos = _ragged_positions(self.offsets[locations], lengths)
+        ids = None if self.ids is None else self.ids[pos]
+        return RaggedArray(offsets=_sp.concatenate(([0], _sp.cumsum(lengths))),
+                           data=self.data[pos], ids=ids)
+
+    def __setitem__(self, key, value):
+        locs = _sp.array(_sp.arange(len(self))[key], dtype=_sp.int64, ndmin=1)
+        if not isinstance(value, RaggedArray):
+            if isinstance(key, (int, _sp.integer)):
+                value = [value]
+            value = RaggedArray(value)
+        keep = _sp.ones((len(self), ), dtype=bool)
+        keep[locs] = False
+        keep = _sp.where(keep)[0]
+        new = RaggedArray.scatter(len(self), [(keep, self.take(keep)),
+                                              (locs, value)])
+        self.offsets, self.data, self.ids = new.offsets, new.data, new.ids
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __array__(self, dtype=None):
+        temp = _sp.empty((len(self), ), dtype=object)
+        for i in range(len(self)):
+            temp[i] = self[i]
+        return temp
+
+    def copy(self):
+        ids = None if self.ids is None else self.ids.copy()
+        return RaggedArray(offsets=self.offsets.copy(), data=self.data.copy(),
+                           ids=ids)
+
+    def __repr__(self):
+        return 'RaggedArray(' + str(len(self)) + ' elements, ' + \
+            str(_sp.size(self.data, 0)) + ' rows)'
+
+
+def _ragged_positions(starts, counts):
+    r"""
+    Returns the positions ``starts[i] + 0, ..., starts[i] + counts[i] - 1``
+    of every segment, concatenated in a single array.
+    """
+    starts = _sp.asarray(starts, dtype=_sp.int64)
+    counts = _sp.asarray(counts, dtype=_sp.int64)
+    offsets = _sp.cumsum(counts) - counts
+    return _sp.arange(_sp.sum(counts), dtype=_sp.int64) + \
+        _sp.repeat(starts - offsets, counts)
+
+
+def _sizeof(value, deep=True):
+    r"""
+    Returns the number of bytes used by an array, a sparse matrix, or a
+    container of them.  If ``deep`` is True the elements of object arrays
+    and containers are included.
+    """
+    if isinstance(value, RaggedArray):
+        return value.nbytes
+    if isinstance(value, _sp.ndarray):
+        size = value.nbytes
+        if deep and value.dtype == object:
+            size += sum(_sizeof(item) for item in value.flat)
+        return size
+    if _sprs.issparse(value):
+        return sum(_sizeof(item, deep) for item in vars(value).values()
+                   if isinstance(item, _sp.ndarray))
+    if not deep:
+        return _sys.getsizeof(value)
+    if isinstance(value, dict):
+        return _sys.getsizeof(value) + \
+            sum(_sizeof(item) for item in value.values())
+    if type(value) in [list, tuple, set]:
+        return _sys.getsizeof(value) + sum(_sizeof(item) for item in value)
+    return _sys.getsizeof(value)
+
+
 class SetLocations():
 
     @staticmethod
@@ -5,14 +5,30 @@ Workspace:  A class for managing the workspace of all objects
 """
 import dill as _pickle
 import copy as _copy
+import os
 import time
 import random
 import string
+import scipy as sp
 import OpenPNM
 from OpenPNM.Base import logging
+from OpenPNM.Base import __Tools__ as Tools
+from OpenPNM.Base import __Columnar__ as _columnar
+from OpenPNM.Base import __Profiler__ as Profiler
 logger = logging.getLogger()
 
 
+class _Pickler(_pickle.Pickler):
+    # Arrays mapped from a columnar file are stored as plain arrays, since
+    # the mapped file cannot be pickled
+    dispatch = _pickle.Pickler.dispatch.copy()
+
+    def _save_memmap(self, obj):
+        self.save_reduce(sp.array, (sp.asarray(obj), ), obj=obj)
+
+    dispatch[sp.memmap] = _save_memmap
+
+
 class Workspace(dict):
     # The following __instance__ class variable and subclassed __new__ method
     # makes the Workspace class a 'Singleton'.  This way, any instantiation
@@ -256,7 +272,7 @@ class Workspace(dict):
         self.update({obj.name: obj})
         return obj_new
 
-    def save_simulation(self, network, filename=''):
+    def save_simulation(self, network, filename='', fileformat='columnar'):
         r"""
         Save a single Network simulation to a 'net' file, including all of its
         associated objects, but not Algorithms
@@ -267,14 +283,24 @@ class Workspace(dict):
             The Network to save
         filename : string, optional
             If no filename is given the name of the Network is used
+        fileformat : string
+            Either 'columnar' (default), which stores each array as a separate
+            binary file that is memory mapped when loaded, or 'pickle' for
+            the format used by previous versions.
+
+        Notes
+        -----
+        Both formats are recognized automatically by ``load_simulation``.
+        The 'columnar' file is a zip container holding one npy file per
+        array and a JSON manifest of the objects, which can be inspected
+        with ``OpenPNM.Base.__Columnar__.read_manifest``.
         """
         if filename == '':
             filename = network.name
         else:
             filename = filename.rsplit('.net', 1)[0]
-
-        # Save nested dictionary pickle
-        _pickle.dump(network, open(filename + '.net', 'wb'))
+        self._save(network, network._simulation(), filename + '.net',
+                   fileformat)
 
     def load_simulation(self, filename):
         r"""
@@ -285,9 +311,14 @@ class Workspace(dict):
         ----------
         filename : string
             The name of the file containing the Network simulation to load
+
+        Notes
+        -----
+        The arrays of files in the 'columnar' format are memory mapped, so
+        their data is only read from disk when they are first used.
         """
         filename = filename.rsplit('.net', 1)[0]
-        net = _pickle.load(open(filename + '.net', 'rb'))
+        net = self._load(filename + '.net')
         temp_dict = {}  # Store objects temporarily to ensure no exceptions
         if net.name not in self.keys():
             temp_dict[net.name] = net
@@ -302,7 +333,7 @@ class Workspace(dict):
         for item in temp_dict.values():
             item.workspace = self
 
-    def save_workspace(self, filename=''):
+    def save_workspace(self, filename='', fileformat='columnar'):
         r"""
         Save the entire state of the Workspace to a 'pnm' file.
 
@@ -311,6 +342,9 @@ class Workspace(dict):
         filename : string, optional
             The file name to save as. If no filename is provided the current
             date and time is used.
+        fileformat : string
+            Either 'columnar' (default) or 'pickle', as in
+            ``save_simulation``.
 
         Examples
         --------
@@ -338,9 +372,26 @@ class Workspace(dict):
             filename = i.strftime('%Y-%m-%d_%H-%M-%S')
         else:
             filename = filename.rstrip('.pnm')
+        self._save(self, list(self.values()), filename + '.pnm', fileformat)
+
+    def _save(self, root, objects, filename, fileformat):
+        if fileformat == 'columnar':
+            _columnar.save(root, objects, filename)
+        elif fileformat == 'pickle':
+            # Save nested dictionary pickle
+            with _columnar.replacing(filename) as temp, \
+                    open(temp, 'wb') as f:
+                _Pickler(f).dump(root)
+        else:
+            raise Exception('Unrecognized file format: ' + fileformat)
 
-        # Save nested dictionary pickle
-        _pickle.dump(self, open(filename + '.pnm', 'wb'))
+    def _load(self, filename):
+        if not os.path.isfile(filename):
+            raise Exception('File not found: ' + filename)
+        if _columnar.is_columnar(filename):
+            return _columnar.load(filename)
+        with open(filename, 'rb') as f:
+            return _pickle.load(f)
 
     def save(self, **kwargs):
         r"""
@@ -369,7 +420,7 @@ class Workspace(dict):
                         ' existing data will be lost')
             self.clear()
 
-        self = _pickle.load(open(filename+'.pnm', 'rb'))
+        self = self._load(filename + '.pnm')
         for item in self._comments.values():
             if 'Using OpenPNM' in item:
                 version = item.lstrip('Using OpenPNM ')
@@ -508,7 +559,7 @@ class Workspace(dict):
 
     comments = property(fget=_get_comments, fset=_set_comments)
 
-    def clone_simulation(self, network, name=None):
+    def clone_simulation(self, network, name=None, copy_on_write=False):
         r"""
         Accepts a Network object and creates a complete clone including all
         associated objects.  All objects in the cloned simulation are
@@ -524,6 +575,12 @@ class Workspace(dict):
         name : string
             This string will be appended to the name of all cloned objects.
 
+        copy_on_write : boolean
+            If False (default) all the arrays are copied.  If True the arrays
+            are shared by the original objects and the clone, and are made
+            read-only on both, so no memory is used until an array is written
+            on either side, which stores a new array on that side only.
+
         Returns
         -------
         A handle to the new Network object, which will include handles to
@@ -539,6 +596,15 @@ class Workspace(dict):
         that can be trimmed to a smaller size.  This smaller simulation will
         result in much faster Algorithms calculations.
 
+        With ``copy_on_write`` the shared arrays cannot be changed in place
+        on the clone or on the original objects (i.e.
+        ``geom['pore.diameter'][0] = 1``), but they can be replaced (i.e.
+        ``geom['pore.diameter'] = 1``), so changing one side never changes
+        the other.  To change an array in place, first replace it with a
+        copy of itself (i.e. ``geom['pore.diameter'] =
+        geom['pore.diameter']``).  Use ``clone_memory`` to see how much
+        memory the clone shares.
+
         Examples
         --------
         >>> import OpenPNM
@@ -559,7 +625,16 @@ class Workspace(dict):
             logger.error('The provided name is already in use')
             return
 
-        net = _copy.deepcopy(network)  # Make clone
+        memo = {}
+        if copy_on_write:
+            # Share each array through a view, and prevent both sides from
+            # writing to it in place, so __setitem__ must store a new array
+            for item in network._simulation():
+                for value in dict.values(item):
+                    if isinstance(value, sp.ndarray) and id(value) not in memo:
+                        value.flags.writeable = False
+                        memo[id(value)] = value.view()
+        net = _copy.deepcopy(network, memo)  # Make clone
         # Add supplied name suffix to all cloned objects
         for item in net._simulation():
             item._parent = network
@@ -570,6 +645,156 @@ class Workspace(dict):
         net['throat.' + network.name] = network.Ts
         return net
 
+    def clone_memory(self, network):
+        r"""
+        Reports the memory used by the arrays of a simulation created by
+        ``clone_simulation``.
+
+        Parameters
+        ----------
+        network : OpenPNM Network Object
+            The Network of the cloned simulation
+
+        Returns
+        -------
+        A dictionary containing the number of bytes of the arrays that are
+        still shared with the original simulation under 'shared', and of the
+        arrays that belong to the clone under 'owned'.
+
+        Examples
+        --------
+        >>> import OpenPNM
+        >>> mgr = OpenPNM.Base.Workspace()
+        >>> pn = OpenPNM.Network.TestNet()
+        >>> pn2 = mgr.clone_simulation(pn, name='cow', copy_on_write=True)
+        >>> mgr.clone_memory(pn2)['owned'] < mgr.clone_memory(pn2)['shared']
+        True
+        """
+        parent = []
+        if network._parent is not None:
+            for item in network._parent._simulation():
+                parent.extend(dict.values(item))
+        parent = set(id(value) for value in parent)
+        report = {'shared': 0, 'owned': 0}
+        for item in network._simulation():
+            for value in dict.values(item):
+                if not isinstance(value, sp.ndarray):
+                    continue
+                if (value.base is not None) and (id(value.base) in parent):
+                    report['shared'] += value.nbytes
+                else:
+                    report['owned'] += value.nbytes
+        return report
+
+    def memory_report(self, deep=True):
+        r"""
+        Reports the memory used by every object in the Workspace.
+
+        Parameters
+        ----------
+        deep : boolean
+            Passed to the ``memory_usage`` method of each object.  If True
+            (default) the elements of object arrays and the cached matrices
+            of the Networks are included.
+
+        Returns
+        -------
+        A MemoryReport, which is a dictionary with the name of each Network
+        as keys, and a dictionary of the ``memory_usage`` of each object of
+        its simulation (including Algorithms) as values.  Its ``total``
+        method gives the total bytes of a simulation or of the Workspace,
+        and its ``compressible`` attribute lists the arrays that could be
+        stored in less memory, as found by ``check_memory``.  Printing the
+        report shows the totals of each simulation and object.
+
+        Notes
+        -----
+        Arrays that are shared between objects, such as the arrays of a
+        clone created with ``copy_on_write``, are counted on each object.
+
+        Examples
+        --------
+        >>> import OpenPNM
+        >>> mgr = OpenPNM.Base.Workspace()
+        >>> pn = OpenPNM.Network.TestNet()
+        >>> report = mgr.memory_report()
+        >>> report.total(pn.name) > pn.Np*3*8
+        True
+        """
+        report = Tools.MemoryReport()
+        for net in self.networks():
+            report[net.name] = Tools.PrintableDict(header='bytes')
+        for obj in self.values():
+            net = obj._net.name
+            if net not in report.keys():
+                report[net] = Tools.PrintableDict(header='bytes')
+            report[net][obj.name] = obj.memory_usage(deep=deep)
+            for prop, note in obj.check_memory().items():
+                report.compressible.append((obj.name, prop, note))
+        return report
+
+    def enable_profiling(self, memory=False):
+        r"""
+        Starts recording the number of calls and the wall time of each model
+        run, each regeneration of models, the assembly of matrices, the
+        solver calls and the percolation steps.
+
+        Parameters
+        ----------
+        memory : boolean
+            If True the bytes allocated during each call are also recorded,
+            using ``tracemalloc``.  This slows down the simulation noticeably,
+            so the default is False.
+
+        Notes
+        -----
+        Any previous records are discarded.  Profiling applies to every
+        object, and costs nothing more than a flag check while disabled.
+        """
+        Profiler.enable(memory=memory)
+
+    def disable_profiling(self):
+        r"""
+        Stops recording, keeping the records for ``perf_report``.
+        """
+        Profiler.disable()
+
+    def perf_report(self, filename=None):
+        r"""
+        Returns the records gathered since ``enable_profiling`` was called.
+
+        Parameters
+        ----------
+        filename : string, optional
+            If given, the records are also written to this file as JSON.
+
+        Returns
+        -------
+        A PerfReport, which is a dictionary with tuples of (category, name)
+        as keys and dictionaries of 'calls', 'time' and 'bytes' as values.
+        The categories are 'model', 'regenerate', 'assembly', 'solver' and
+        'percolation'.  Printing the report shows a table sorted by time, and
+        its ``to_json`` method returns the records as a JSON string.
+
+        Examples
+        --------
+        >>> import OpenPNM
+        >>> mgr = OpenPNM.Base.Workspace()
+        >>> mgr.enable_profiling()
+        >>> pn = OpenPNM.Network.TestNet()
+        >>> geom = OpenPNM.Geometry.Stick_and_Ball(network=pn,
+        ...                                        pores=pn.Ps,
+        ...                                        throats=pn.Ts)
+        >>> mgr.disable_profiling()
+        >>> report = mgr.perf_report()
+        >>> report[('regenerate', geom.name)]['calls']
+        1
+        """
+        report = Profiler.report()
+        if filename is not None:
+            report.to_json(filename)
+        return report
+
     def _validate_name(self, name):
         valid_name = True
         for item_name in list(self.keys()):
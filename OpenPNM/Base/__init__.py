@@ -24,6 +24,7 @@ from .__Workspace__ import Workspace
 from .__Controller__ import Controller
 from .__ModelsDict__ import ModelsDict
 from . import __Tools__ as Tools
+from . import __Profiler__ as Profiler
 from .__Core__ import Core
 
 
@@ -100,7 +100,8 @@ class Voronoi(GenericGeometry):
         self.models.add(propname='throat.c2c',
                         model=gm.throat_length.c2c)
 
-    def make_fibre_image(self, fibre_rad=None, vox_len=1e-6):
+    def make_fibre_image(self, fibre_rad=None, vox_len=1e-6, memmap=None,
+                         parallel=False, max_workers=None):
         r"""
         If the voronoi voxel method was implemented to calculate pore volumes
         an image of the fibre space has already been calculated and stored on
@@ -114,6 +115,15 @@ class Voronoi(GenericGeometry):
 
         vox_len : float
         Length of voxel edge when dividing domain
+
+        memmap : boolean or string
+        If True, or the name of a directory, the image is memory mapped from a
+        file so domains larger than the memory can be used.  By default this
+        is only done when the image does not fit in memory.
+
+        parallel : boolean or string
+        If True or 'thread' the image is processed in chunks on a pool of
+        threads, and if 'process' on a pool of processes.
         """
 
         if hasattr(self, '_fibre_image'):
@@ -123,10 +133,9 @@ class Voronoi(GenericGeometry):
             if fibre_rad is None:
                 fibre_rad = self._fibre_rad
             fibre_rad /= vox_len
-            self._fibre_image = gm.pore_volume._get_fibre_image(self._net,
-                                                                self.pores(),
-                                                                vox_len,
-                                                                fibre_rad)
+            self._fibre_image = gm.pore_volume._get_fibre_image(
+                self._net, self.pores(), vox_len, fibre_rad, memmap=memmap,
+                parallel=parallel, max_workers=max_workers)
 
     def _export_fibre_image(self, mat_file='OpenPNMFibres'):
         r"""
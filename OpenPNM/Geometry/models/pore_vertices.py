@@ -4,7 +4,7 @@ pore_vertices -- update pore vertices from Vornoi object
 ===============================================================================
 
 """
-import scipy as _sp
+from OpenPNM.Base import Tools as _tools
 
 
 def voronoi(network, geometry, **kwargs):
@@ -12,7 +12,5 @@ def voronoi(network, geometry, **kwargs):
     Update the pore vertices from the voronoi vertices
     """
     pores = geometry.map_pores(network, geometry.pores())
-    value = _sp.ndarray(len(pores), dtype=object)
-    for i in range(len(pores)):
-        value[i] = _sp.asarray(list(network['pore.vert_index'][pores[i]].values()))
-    return value
+    value = network['pore.vert_index'][pores]
+    return _tools.RaggedArray(offsets=value.offsets, data=value.data)
@@ -4,6 +4,11 @@ pore_volume --
 ===============================================================================
 
 """
+import os
+import shutil
+import tempfile
+from concurrent import futures
+from itertools import product as _product
 import scipy as _sp
 import numpy as np
 from scipy.spatial import Delaunay
@@ -67,16 +72,16 @@ def inhull(geometry, xyz, pore, tol=1e-7):
     dom[dom < len(a)] = 0
     dom[dom == len(a)] = 1
     ds = np.shape(dom)
-    temp_arr = np.zeros_like(geometry._hull_image, dtype=bool)
-    temp_arr[si[0]:si[0]+ds[0], si[1]:si[1]+ds[1], si[2]:si[2]+ds[2]] = dom
-    geometry._hull_image[temp_arr] = pore
+    # Only the block around the hull is read and written, so the images can
+    # be memory mapped
+    block = (slice(si[0], si[0]+ds[0]), slice(si[1], si[1]+ds[1]),
+             slice(si[2], si[2]+ds[2]))
+    geometry._hull_image[block][dom == 1] = pore
     hull_num = np.sum(dom)
-    dom = dom * geometry._fibre_image[si[0]:si[0]+ds[0], si[1]:si[1]+ds[1],
-                                      si[2]:si[2]+ds[2]]
+    dom = dom * geometry._fibre_image[block]
     pore_num = np.sum(dom)
     fibre_num = hull_num - pore_num
 
-    del temp_arr
     return pore_num, fibre_num
 
 
@@ -121,108 +126,185 @@ def _get_vertex_range(verts):
     return [vxmin, vxmax, vymin, vymax, vzmin, vzmax]
 
 
-def _get_fibre_image(network, cpores, vox_len, fibre_rad):
+def _get_fibre_image(network, cpores, vox_len, fibre_rad, chunk_len=100,
+                     memmap=None, parallel=False, max_workers=None):
     r"""
     Produce image by filling in voxels along throat edges using Bresenham line
     Then performing distance transform on fibre voxels to erode the pore space
-    """
 
+    Parameters
+    ----------
+    chunk_len : int
+        The length in voxels of the chunks in which the distance transform is
+        performed.  Each chunk is padded with enough voxels of its neighbors
+        to give the same image as a transform of the whole domain.
+
+    memmap : boolean or string
+        If None (default) the image is held in memory, unless the domain is
+        too large in which case it is memory mapped from a temporary file.
+        If True it is always memory mapped, and if a directory is given the
+        file is written in that directory and kept.  If False it is always
+        held in memory.
+
+    parallel : boolean or string
+        If False (default) the chunks are processed one at a time.  If True
+        or 'thread' they are processed on a pool of threads, and if 'process'
+        on a pool of processes which map the image from its file.
+
+    max_workers : int, optional
+        The number of threads or processes used when ``parallel`` is given.
+    """
+    if parallel not in [False, True, 'thread', 'process']:
+        raise Exception('Unrecognized parallel mode: ' + str(parallel))
     cthroats = network.find_neighbor_throats(pores=cpores)
 
-    # Below method copied from geometry model throat.vertices
-    # Needed now as network may not have all throats assigned to geometry
-    # i.e network['throat.vertices'] could return garbage
-    verts = _sp.ndarray(network.num_throats(), dtype=object)
-    for i in range(len(verts)):
-        verts[i] = _sp.asarray(list(network["throat.vert_index"][i].values()))
-    cverts = verts[cthroats]
+    # Use the vertices stored on the network, as it may not have all throats
+    # assigned to geometry i.e network['throat.vertices'] could return garbage
+    cverts = network["throat.vert_index"][cthroats]
     [vxmin, vxmax, vymin, vymax, vzmin, vzmax] = _get_vertex_range(cverts)
     # Translate vertices so that minimum occurs at the origin
-    for index in range(len(cverts)):
-        cverts[index] -= np.array([vxmin, vymin, vzmin])
+    cverts.data -= np.array([vxmin, vymin, vzmin])
     # Find new size of image array
     cdomain = np.around(np.array([(vxmax-vxmin),
                                   (vymax-vymin),
                                   (vzmax-vzmin)]), 6)
     logger.info("Creating fibre domain range: " + str(np.around(cdomain, 5)))
-    lx = np.int(np.around(cdomain[0]/vox_len)+1)
-    ly = np.int(np.around(cdomain[1]/vox_len)+1)
-    lz = np.int(np.around(cdomain[2]/vox_len)+1)
-    # Try to create all the arrays we will need at total domain size
+    shape = tuple(np.around(cdomain/vox_len).astype(int) + 1)
+    # Create the image of the lines and the fibre image, in files if needed
+    temp_folder = None
+    if isinstance(memmap, str):
+        folder = memmap
+    elif memmap or (parallel == 'process'):
+        folder = temp_folder = tempfile.mkdtemp()
+    else:
+        folder = None
     try:
-        pore_space = np.ones([lx, ly, lz], dtype=np.uint8)
-        fibre_space = np.zeros(shape=[lx, ly, lz], dtype=np.uint8)
-        dt = np.zeros([lx, ly, lz], dtype=float)
-        # Only need one chunk
-        cx = cy = cz = 1
-        chunk_len = np.max(np.shape(pore_space))
-    except:
-        logger.info("Domain too large to fit into memory so chunking domain"
-                    "to process image, this may take some time")
-        # Do chunking
-        chunk_len = 100
-        if (lx > chunk_len):
-            cx = np.ceil(lx/chunk_len).astype(int)
-        else:
-            cx = 1
-        if (ly > chunk_len):
-            cy = np.ceil(ly/chunk_len).astype(int)
-        else:
-            cy = 1
-        if (lz > chunk_len):
-            cz = np.ceil(lz/chunk_len).astype(int)
-        else:
-            cz = 1
+        lines = _new_volume(shape, np.uint8, folder)
+        fibre_space = _new_volume(shape, np.uint8, folder)
+    except MemoryError:
+        if memmap is not None:
+            raise
+        logger.info("Domain too large to fit into memory so memory mapping " +
+                    "the image, this may take some time")
+        folder = temp_folder = tempfile.mkdtemp()
+        lines = _new_volume(shape, np.uint8, folder)
+        fibre_space = _new_volume(shape, np.uint8, folder)
 
     # Get image of the fibres
     line_points = bresenham(cverts, vox_len/2)
     line_ints = (np.around((line_points/vox_len), 0)).astype(int)
-    for x, y, z in line_ints:
-        try:
-            pore_space[x][y][z] = 0
-        except IndexError:
-            logger.warning("Some elements in image processing are out" +
-                           "of bounds")
-
-    num_chunks = np.int(cx*cy*cz)
-    cnum = 1
-    for ci in range(cx):
-        for cj in range(cy):
-            for ck in range(cz):
-                # Work out chunk range
-                logger.info("Processing Fibre Chunk: "+str(cnum)+" of " +
-                            str(num_chunks))
-                cxmin = ci*chunk_len
-                cxmax = np.int(np.ceil((ci+1)*chunk_len + 5*fibre_rad))
-                cymin = cj*chunk_len
-                cymax = np.int(np.ceil((cj+1)*chunk_len + 5*fibre_rad))
-                czmin = ck*chunk_len
-                czmax = np.int(np.ceil((ck+1)*chunk_len + 5*fibre_rad))
-                # Don't overshoot
-                if cxmax > lx:
-                    cxmax = lx
-                if cymax > ly:
-                    cymax = ly
-                if czmax > lz:
-                    czmax = lz
-                dt = ndimage.distance_transform_edt(pore_space[cxmin:cxmax,
-                                                               cymin:cymax,
-                                                               czmin:czmax])
-                fibre_space[cxmin:cxmax,
-                            cymin:cymax,
-                            czmin:czmax][dt <= fibre_rad] = 0
-                fibre_space[cxmin:cxmax,
-                            cymin:cymax,
-                            czmin:czmax][dt > fibre_rad] = 1
-                del dt
-                cnum += 1
-    del pore_space
+    inside = np.all((line_ints >= 0) & (line_ints < shape), axis=1)
+    if not np.all(inside):
+        logger.warning("Some elements in image processing are out" +
+                       "of bounds")
+    line_ints = line_ints[inside]
+    lines[line_ints[:, 0], line_ints[:, 1], line_ints[:, 2]] = 1
+
+    # Split the domain into chunks, each padded with the voxels that can be
+    # within the fibre radius of it
+    halo = int(np.ceil(fibre_rad)) + 1
+    ranges = [[(i, min(i + chunk_len, n)) for i in range(0, n, chunk_len)]
+              for n in shape]
+    chunks = list(_product(*ranges))
+    args = (halo, fibre_rad)
+    try:
+        if parallel == 'process':
+            lines.flush()
+            with futures.ProcessPoolExecutor(max_workers=max_workers) as pool:
+                jobs = [pool.submit(_mapped_fibre_chunk, lines.filename,
+                                    fibre_space.filename, shape, bounds,
+                                    *args)
+                        for bounds in chunks]
+                [job.result() for job in jobs]
+        elif parallel:
+            with futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+                jobs = [pool.submit(_fibre_chunk, lines, fibre_space, bounds,
+                                    *args)
+                        for bounds in chunks]
+                [job.result() for job in jobs]
+        else:
+            for cnum, bounds in enumerate(chunks):
+                logger.debug('Processing Fibre Chunk: %d of %d', cnum + 1,
+                             len(chunks))
+                _fibre_chunk(lines, fibre_space, bounds, *args)
+    finally:
+        # The files are removed once mapped, so temporary images are freed
+        # when they are deleted
+        if isinstance(lines, np.memmap):
+            filename = lines.filename
+            del lines
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+        if temp_folder is not None:
+            shutil.rmtree(temp_folder, ignore_errors=True)
     return fibre_space
 
 
+def _new_volume(shape, dtype, folder=None):
+    r"""
+    Returns a volume of zeros, held in memory if ``folder`` is None and
+    otherwise memory mapped from a new file in ``folder``
+    """
+    if folder is None:
+        return np.zeros(shape, dtype=dtype)
+    fd, filename = tempfile.mkstemp(suffix='.raw', dir=folder)
+    os.close(fd)
+    return np.memmap(filename, dtype=dtype, mode='w+', shape=shape)
+
+
+def _fibre_chunk(lines, fibre_space, bounds, halo, fibre_rad):
+    r"""
+    Sets the voxels of one chunk of the fibre image that are further than the
+    fibre radius from the lines, using a distance transform of the chunk
+    padded by ``halo`` voxels on each side
+    """
+    inner = tuple(slice(a, b) for a, b in bounds)
+    outer = tuple(slice(max(a - halo, 0), min(b + halo, n))
+                  for (a, b), n in zip(bounds, lines.shape))
+    pore_space = lines[outer] == 0
+    if np.all(pore_space):
+        fibre_space[inner] = 1
+        return
+    dt = ndimage.distance_transform_edt(pore_space)
+    core = tuple(slice(a - s.start, b - s.start)
+                 for (a, b), s in zip(bounds, outer))
+    fibre_space[inner] = dt[core] > fibre_rad
+
+
+def _mapped_fibre_chunk(lines_file, fibre_file, shape, bounds, halo,
+                        fibre_rad):
+    r"""
+    Processes one chunk of the fibre image in a worker process, mapping the
+    images from their files
+    """
+    lines = np.memmap(lines_file, dtype=np.uint8, mode='r', shape=shape)
+    fibre_space = np.memmap(fibre_file, dtype=np.uint8, mode='r+',
+                            shape=shape)
+    _fibre_chunk(lines, fibre_space, bounds, halo, fibre_rad)
+    fibre_space.flush()
+
+
 def bresenham(faces, dx):
-    line_points = []
+    r"""
+    Returns points spaced at most ``dx`` apart along the edges of each face,
+    where the edges join the vertices of the face in convex hull order.  The
+    points of all edges are generated at once.
+
+    Notes
+    -----
+    As in the original loop over the points of each edge, a point is
+    skipped when the sum of its coordinate differences from the previous
+    point kept on the edge is exactly 0, which drops the points after the
+    first on edges whose direction components sum to 0.
+    """
+    starts = []
+    ends = []
+    lengths = []
     for face in faces:
+        if len(face) < 3:
+            continue
         # Get in hull order
         fx = face[:, 0]
         fy = face[:, 1]
@@ -236,17 +318,40 @@ def bresenham(faces, dx):
             f2d = np.vstack((fx, fy)).T
         hull = ConvexHull(f2d, qhull_options='QJ Pp')
         face = np.around(face[hull.vertices], 6)
-        for i in range(len(face)):
-            vec = face[i]-face[i-1]
-            vec_length = np.linalg.norm(vec)
-            increments = np.ceil(vec_length/dx)
-            check_p_old = np.array([-1, -1, -1])
-            for x in np.linspace(0, 1, increments):
-                check_p_new = face[i-1]+(vec*x)
-                if np.sum(check_p_new - check_p_old) != 0:
-                    line_points.append(check_p_new)
-                    check_p_old = check_p_new
-    return np.asarray(line_points)
+        starts.append(np.roll(face, 1, axis=0))
+        ends.append(face)
+        lengths.extend([np.linalg.norm(face[i] - face[i-1])
+                        for i in range(len(face))])
+    if len(starts) == 0:
+        return np.zeros((0, 3))
+    starts = np.concatenate(starts)
+    vecs = np.concatenate(ends) - starts
+    # Each edge is divided into as many equally spaced points as needed; the
+    # lengths are found one edge at a time as the norm of rows of vecs can
+    # round differently, which changes the count when it is near an integer
+    counts = np.ceil(np.array(lengths)/dx).astype(int)
+    edge = np.repeat(np.arange(len(counts)), counts)
+    step = np.arange(len(edge)) - np.repeat(np.cumsum(counts) - counts, counts)
+    # Spaced as by linspace, which ends each edge exactly on its vertex
+    t = step*(1.0/np.maximum(counts - 1, 1))[edge]
+    t[(step == (counts - 1)[edge]) & (counts > 1)[edge]] = 1.0
+    points = starts[edge] + vecs[edge]*t[:, np.newaxis]
+    # Compare each point with the previous one on its edge, or with the
+    # point (-1, -1, -1) for the first point
+    prev = np.roll(points, 1, axis=0)
+    prev[step == 0] = -1
+    diff = points - prev
+    keep = ((diff[:, 0] + diff[:, 1]) + diff[:, 2]) != 0
+    # After a skipped point the next one is compared with the last point
+    # kept, so those edges are checked again one point at a time
+    for e in np.unique(edge[~keep]):
+        inds = np.where(edge == e)[0]
+        last = np.array([-1.0, -1.0, -1.0])
+        for i in inds:
+            keep[i] = np.sum(points[i] - last) != 0
+            if keep[i]:
+                last = points[i]
+    return points[keep]
 
 
 def sphere(geometry, pore_diameter='pore.diameter', **kwargs):
@@ -407,10 +512,18 @@ def voronoi(network, geometry, **kwargs):
     return volume
 
 
-def in_hull_volume(network, geometry, fibre_rad, vox_len=1e-6, **kwargs):
+def in_hull_volume(network, geometry, fibre_rad, vox_len=1e-6, memmap=None,
+                   parallel=False, max_workers=None, **kwargs):
     r"""
     Work out the voxels inside the convex hull of the voronoi vertices of each
     pore
+
+    Parameters
+    ----------
+    memmap, parallel and max_workers : optional
+        Control how the fibre image is made, as described in
+        ``_get_fibre_image``.  If the fibre image is memory mapped the image
+        of the hulls is also memory mapped.
     """
     Np = network.num_pores()
     geom_pores = geometry.map_pores(network, geometry.pores())
@@ -427,14 +540,22 @@ def in_hull_volume(network, geometry, fibre_rad, vox_len=1e-6, **kwargs):
     fibre_rad = np.around((fibre_rad-(vox_len/2))/vox_len, 0).astype(int)
 
     # Get the fibre image
-    fibre_image = _get_fibre_image(network, geom_pores, vox_len, fibre_rad)
+    fibre_image = _get_fibre_image(network, geom_pores, vox_len, fibre_rad,
+                                   memmap=memmap, parallel=parallel,
+                                   max_workers=max_workers)
     # Save as private variables
     geometry._fibre_image = fibre_image
-    hull_image = np.ones_like(fibre_image, dtype=np.uint16)*-1
+    if isinstance(fibre_image, np.memmap):
+        folder = tempfile.mkdtemp()
+        hull_image = _new_volume(fibre_image.shape, np.int32, folder)
+        shutil.rmtree(folder, ignore_errors=True)
+    else:
+        hull_image = _new_volume(fibre_image.shape, np.int32)
+    hull_image[:] = -1
     geometry._hull_image = hull_image
     for pore in nbps:
         logger.info("Processing Pore: "+str(pore+1)+" of "+str(len(nbps)))
-        verts = np.asarray([i for i in network["pore.vert_index"][pore].values()])
+        verts = network["pore.vert_index"][pore]
         verts = np.asarray(misc.unique_list(np.around(verts, 6)))
         verts /= vox_len
         pore_vox[pore], fibre_vox[pore] = inhull(geometry, verts, pore)
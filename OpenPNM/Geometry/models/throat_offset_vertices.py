@@ -4,178 +4,350 @@ throat_offset_vertices -- Offeset throat vertices using a fibre radius parameter
 ===============================================================================
 
 """
+import math
+import os
+import shutil
+import tempfile
+from concurrent import futures
+from itertools import combinations as _combinations
 import scipy as sp
+import numpy as np
+from scipy.spatial import ConvexHull
 from transforms3d import _gohlketransforms as tr
-from OpenPNM.Base import logging
+from OpenPNM.Base import logging, Tools
 logger = logging.getLogger(__name__)
 
+# The vertices and normals of all throats, memory mapped in each worker
+_shared = {}
 
-def distance_transform(network, geometry, offset, **kwargs):
+
+def distance_transform(network, geometry, offset, resolution=200,
+                       method='image', chunk_size=1000, parallel=False,
+                       max_workers=None, **kwargs):
     r"""
     Use the Voronoi vertices and perform image analysis to obtain throat properties
-    """
 
-    import math
-    import numpy as np
-    from skimage.morphology import convex_hull_image
-    from skimage.measure import regionprops
-    from scipy import ndimage
+    Parameters
+    ----------
+    offset : float
+        The distance by which the edges of each throat are moved inwards,
+        such as the fibre radius
+
+    resolution : int
+        The number of pixels across the largest span of each throat image.
+        Lower values are faster but less accurate.  The default is 200.
 
+    method : string
+        Either 'image' (default), which rasterizes each throat and erodes it
+        with a distance transform, or 'analytic', which moves each edge of
+        the throat polygon inwards and intersects them, without rasterizing.
+
+    chunk_size : int
+        The number of throats processed together in each task
+
+    parallel : boolean
+        If True the chunks are processed on a pool of processes, which read
+        the vertices from a memory mapped file instead of receiving a copy of
+        them.  The default is False.
+
+    max_workers : int, optional
+        The number of processes used when ``parallel`` is True.  The default
+        is chosen by ``concurrent.futures``.
+
+    Notes
+    -----
+    If ``set_dependent`` is True the area, perimeter, centroid, diameter,
+    indiameter and incentre of the throats are also written to the geometry.
+    """
+    if method not in ['image', 'analytic']:
+        raise Exception('Unrecognized method: ' + str(method))
     Nt = geometry.num_throats()
-    area = sp.zeros(Nt)
-    perimeter = sp.zeros(Nt)
-    centroid = sp.zeros([Nt, 3])
-    incentre = sp.zeros([Nt, 3])
-    inradius = sp.zeros(Nt)
-    equiv_diameter = sp.zeros(Nt)
-    eroded_verts = sp.ndarray(Nt, dtype=object)
-
-    res = 200
     vertices = geometry['throat.vertices']
-    normals = geometry['throat.normal']
-    z_axis = [0, 0, 1]
+    if not isinstance(vertices, Tools.RaggedArray):
+        vertices = Tools.RaggedArray(list(vertices))
+    normals = sp.array(geometry['throat.normal'], dtype=float)
+    bounds = list(range(0, Nt, chunk_size)) + [Nt]
+    chunks = list(zip(bounds[:-1], bounds[1:]))
+    args = (offset, resolution, method)
 
-    for i in range(Nt):
-        logger.info("Processing throat " + str(i+1)+" of "+str(Nt))
+    if parallel and len(chunks) > 1:
+        # Write the vertices once, for all the workers to map
+        folder = tempfile.mkdtemp()
+        try:
+            for name, array in [('offsets', vertices.offsets),
+                                ('data', vertices.data),
+                                ('normals', normals)]:
+                sp.save(os.path.join(folder, name + '.npy'), array)
+            with futures.ProcessPoolExecutor(max_workers=max_workers,
+                                             initializer=_map_shared,
+                                             initargs=(folder, )) as pool:
+                jobs = [pool.submit(_shared_chunk, start, stop, *args)
+                        for start, stop in chunks]
+                results = [job.result() for job in jobs]
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+    else:
+        results = []
+        for start, stop in chunks:
+            logger.debug('Processing throats %d to %d of %d', start + 1, stop,
+                         Nt)
+            results.append(_offset_chunk(vertices[start:stop],
+                                         normals[start:stop], *args))
+
+    values = {'area': sp.zeros(Nt),
+              'perimeter': sp.zeros(Nt),
+              'diameter': sp.zeros(Nt),
+              'inradius': sp.zeros(Nt),
+              'centroid': sp.zeros([Nt, 3]),
+              'incentre': sp.zeros([Nt, 3])}
+    parts = []
+    for (start, stop), (chunk_values, chunk_verts) in zip(chunks, results):
+        for key in values.keys():
+            values[key][start:stop] = chunk_values[key]
+        parts.append((sp.arange(start, stop), chunk_verts))
+
+    if kwargs['set_dependent'] is True:
+        geometry['throat.area'] = values['area']
+        geometry['throat.perimeter'] = values['perimeter']
+        geometry['throat.centroid'] = values['centroid']
+        geometry['throat.diameter'] = values['diameter']
+        geometry['throat.indiameter'] = values['inradius']*2
+        geometry['throat.incentre'] = values['incentre']
+
+    return Tools.RaggedArray.scatter(Nt, parts)
+
+
+def _map_shared(folder):
+    r"""
+    Memory maps the vertices and normals of all throats in a worker process
+    """
+    for name in ['offsets', 'data', 'normals']:
+        _shared[name] = sp.load(os.path.join(folder, name + '.npy'),
+                                mmap_mode='r')
+
+
+def _shared_chunk(start, stop, offset, resolution, method):
+    r"""
+    Offsets the throats from ``start`` to ``stop``, reading their vertices
+    from the memory mapped arrays
+    """
+    offsets = _shared['offsets'][start:stop + 1]
+    vertices = Tools.RaggedArray(offsets=offsets - offsets[0],
+                                 data=_shared['data'][offsets[0]:offsets[-1]])
+    return _offset_chunk(vertices, _shared['normals'][start:stop], offset,
+                         resolution, method)
+
+
+def _offset_chunk(vertices, normals, offset, resolution, method):
+    r"""
+    Offsets a chunk of throats, returning a dictionary of their properties
+    and a RaggedArray of their offset vertices.  Throats that are fully
+    occluded are given zero properties and no vertices.
+    """
+    N = len(vertices)
+    values = {'area': sp.zeros(N),
+              'perimeter': sp.zeros(N),
+              'diameter': sp.zeros(N),
+              'inradius': sp.zeros(N),
+              'centroid': sp.zeros([N, 3]),
+              'incentre': sp.zeros([N, 3])}
+    eroded_verts = sp.ndarray(N, dtype=object)
+    offset_throat = _offset_image if method == 'image' else _offset_polygon
+    z_axis = [0, 0, 1]
+    for i in range(N):
+        if len(vertices[i]) < 3:
+            continue
         # For boundaries some facets will already be aligned with the axis - if this
         # is the case a rotation is unnecessary and could also cause problems
         angle = tr.angle_between_vectors(normals[i], z_axis)
         if angle == 0.0 or angle == np.pi:
             # We are already aligned
-            rotate_facet = False
+            M = None
             facet = vertices[i]
         else:
-            rotate_facet = True
-            M = tr.rotation_matrix(tr.angle_between_vectors(normals[i], z_axis),
-                                   tr.vector_product(normals[i], z_axis))
+            M = tr.rotation_matrix(angle, tr.vector_product(normals[i], z_axis))
             facet = np.dot(vertices[i], M[:3, :3].T)
-        x = facet[:, 0]
-        y = facet[:, 1]
-        z = facet[:, 2]
-        # Get points in 2d for image analysis
-        pts = np.column_stack((x, y))
-        # Translate points so min sits at the origin
-        translation = [pts[:, 0].min(), pts[:, 1].min()]
-        pts -= translation
-        order = np.int(math.ceil(-np.log10(np.max(pts))))
-        # Normalise and scale the points so that largest span equals the resolution
-        # to save on memory and create clear image"
-        max_factor = np.max([pts[:, 0].max(), pts[:, 1].max()])
-        f = res/max_factor
-        # Scale the offset and define a circular structuring element with radius
-        r = f*offset
-        # Only proceed if r is less than half the span of the image"
-        if r <= res/2:
-            pts *= f
-            minp1 = pts[:, 0].min()
-            minp2 = pts[:, 1].min()
-            maxp1 = pts[:, 0].max()
-            maxp2 = pts[:, 1].max()
-            img = np.zeros([np.int(math.ceil(maxp1-minp1)+1),
-                            np.int(math.ceil(maxp2-minp2)+1)])
-            int_pts = np.around(pts, 0).astype(int)
-            for pt in int_pts:
-                img[pt[0]][pt[1]] = 1
-            # Pad with zeros all the way around the edges
-            img_pad = np.zeros([np.shape(img)[0] + 2, np.shape(img)[1] + 2])
-            img_pad[1:np.shape(img)[0]+1, 1:np.shape(img)[1]+1] = img
-
-            # All points should lie on this plane but could be some rounding errors
-            # so use the order parameter
-            z_plane = sp.unique(np.around(z, order+2))
-            if len(z_plane) > 1:
-                logger.error('Rotation for image analysis failed')
-                temp_arr = np.ones(1)
-                temp_arr.fill(np.mean(z_plane))
-                z_plane = temp_arr
-            "Fill in the convex hull polygon"
-            convhullimg = convex_hull_image(img_pad)
-            # Perform a Distance Transform and black out points less than r to create
-            # binary erosion. This is faster than performing an erosion and dt can
-            # also be used later to find incircle"
-            eroded = ndimage.distance_transform_edt(convhullimg)
-            eroded[eroded <= r] = 0
-            eroded[eroded > r] = 1
-            # If we are left with less than 3 non-zero points then the throat is
-            # fully occluded
-            if np.sum(eroded) >= 3:
-                # Do some image analysis to extract the key properties
-                regions = regionprops(eroded[1:np.shape(img)[0]+1,
-                                             1:np.shape(img)[1]+1].astype(int))
-                # Change this to cope with genuine multi-region throats
-                if len(regions) == 1:
-                    for props in regions:
-                        x0, y0 = props.centroid
-                        equiv_diameter[i] = props.equivalent_diameter
-                        area[i] = props.area
-                        perimeter[i] = props.perimeter
-                        coords = props.coords
-                    # Undo the translation, scaling and truncation on the centroid
-                    centroid2d = [x0, y0]/f
-                    centroid2d += (translation)
-                    centroid3d = np.concatenate((centroid2d, z_plane))
-                    # Distance transform the eroded facet to find the incentre and
-                    # inradius
-                    dt = ndimage.distance_transform_edt(eroded)
-                    inx0, iny0 = \
-                        np.asarray(np.unravel_index(dt.argmax(), dt.shape)) \
-                          .astype(float)
-                    incentre2d = [inx0, iny0]
-                    # Undo the translation, scaling and truncation on the incentre
-                    incentre2d /= f
-                    incentre2d += (translation)
-                    incentre3d = np.concatenate((incentre2d, z_plane))
-                    # The offset vertices will be those in the coords that are
-                    # closest to the originals"
-                    offset_verts = []
-                    for pt in int_pts:
-                        vert = np.argmin(np.sum(np.square(coords-pt), axis=1))
-                        if vert not in offset_verts:
-                            offset_verts.append(vert)
-                    # If we are left with less than 3 different vertices then the
-                    # throat is fully occluded as we can't make a shape with
-                    # non-zero area
-                    if len(offset_verts) >= 3:
-                        offset_coords = coords[offset_verts].astype(float)
-                        # Undo the translation, scaling and truncation on the
-                        # offset_verts
-                        offset_coords /= f
-                        offset_coords_3d = \
-                            np.vstack((offset_coords[:, 0]+translation[0],
-                                       offset_coords[:, 1]+translation[1],
-                                       np.ones(len(offset_verts))*z_plane)).T
-
-                        # Get matrix to un-rotate the co-ordinates back to the
-                        # original orientation if we rotated in the first place
-                        if rotate_facet:
-                            MI = tr.inverse_matrix(M)
-                            # Unrotate the offset coordinates
-                            incentre[i] = np.dot(incentre3d, MI[:3, :3].T)
-                            centroid[i] = np.dot(centroid3d, MI[:3, :3].T)
-                            eroded_verts[i] = np.dot(offset_coords_3d, MI[:3, :3].T)
-
-                        else:
-                            incentre[i] = incentre3d
-                            centroid[i] = centroid3d
-                            eroded_verts[i] = offset_coords_3d
-
-                        inradius[i] = dt.max()
-                        # Undo scaling on other parameters
-                        area[i] /= f*f
-                        perimeter[i] /= f
-                        equiv_diameter[i] /= f
-                        inradius[i] /= f
-                    else:
-                        area[i] = 0
-                        perimeter[i] = 0
-                        equiv_diameter[i] = 0
+        # Get points in 2d for the offset
+        pts = facet[:, 0:2]
+        span = np.max(pts - pts.min(axis=0))
+        if span <= 0:
+            continue
+        # All points should lie on this plane but could be some rounding errors
+        # so use the order parameter
+        order = int(math.ceil(-np.log10(span)))
+        z_plane = sp.unique(np.around(facet[:, 2], order+2))
+        if len(z_plane) > 1:
+            logger.error('Rotation for image analysis failed')
+        z = np.mean(z_plane)
+        result = offset_throat(pts, offset, resolution)
+        if result is None:
+            continue
+        area, perimeter, diameter, centroid, incentre, inradius, coords = result
+        values['area'][i] = area
+        values['perimeter'][i] = perimeter
+        values['diameter'][i] = diameter
+        values['inradius'][i] = inradius
+        # Undo the rotation on the 2D results, if we rotated in the first place
+        values['centroid'][i] = _unrotate([centroid], z, M)[0]
+        values['incentre'][i] = _unrotate([incentre], z, M)[0]
+        eroded_verts[i] = _unrotate(coords, z, M)
+    return values, Tools.RaggedArray(eroded_verts)
 
-    if kwargs['set_dependent'] is True:
-        geometry['throat.area'] = area
-        geometry['throat.perimeter'] = perimeter
-        geometry['throat.centroid'] = centroid
-        geometry['throat.diameter'] = equiv_diameter
-        geometry['throat.indiameter'] = inradius*2
-        geometry['throat.incentre'] = incentre
-
-    return eroded_verts
+
+def _unrotate(points, z, M):
+    r"""
+    Returns 2D points on the plane ``z`` in 3D, rotated back by the inverse
+    of the rotation matrix ``M`` unless it is None
+    """
+    points = np.column_stack((points, np.ones(len(points))*z))
+    if M is not None:
+        MI = tr.inverse_matrix(M)
+        points = np.dot(points, MI[:3, :3].T)
+    return points
+
+
+def _offset_image(pts, offset, resolution):
+    r"""
+    Offsets a throat by rasterizing its polygon and eroding it with a
+    distance transform.  Returns None if the throat is fully occluded.
+    """
+    from skimage.morphology import convex_hull_image
+    from skimage.measure import regionprops
+    from scipy import ndimage
+
+    # Translate points so min sits at the origin
+    translation = pts.min(axis=0)
+    pts = pts - translation
+    # Normalise and scale the points so that largest span equals the resolution
+    # to save on memory and create clear image
+    f = resolution/np.max(pts)
+    # Scale the offset and define a circular structuring element with radius
+    r = f*offset
+    # Only proceed if r is less than half the span of the image
+    if r > resolution/2:
+        return None
+    pts = pts*f
+    img = np.zeros([int(math.ceil(pts[:, 0].max())+1),
+                    int(math.ceil(pts[:, 1].max())+1)])
+    int_pts = np.around(pts, 0).astype(int)
+    img[int_pts[:, 0], int_pts[:, 1]] = 1
+    # Pad with zeros all the way around the edges
+    img_pad = np.zeros([np.shape(img)[0] + 2, np.shape(img)[1] + 2])
+    img_pad[1:np.shape(img)[0]+1, 1:np.shape(img)[1]+1] = img
+    # Fill in the convex hull polygon
+    convhullimg = convex_hull_image(img_pad)
+    # Perform a Distance Transform and black out points less than r to create
+    # binary erosion. This is faster than performing an erosion and dt can
+    # also be used later to find incircle
+    eroded = ndimage.distance_transform_edt(convhullimg)
+    eroded[eroded <= r] = 0
+    eroded[eroded > r] = 1
+    # If we are left with less than 3 non-zero points then the throat is
+    # fully occluded
+    if np.sum(eroded) < 3:
+        return None
+    # Do some image analysis to extract the key properties
+    regions = regionprops(eroded[1:np.shape(img)[0]+1,
+                                 1:np.shape(img)[1]+1].astype(int))
+    # Change this to cope with genuine multi-region throats
+    if len(regions) != 1:
+        return None
+    props = regions[0]
+    coords = props.coords
+    # The offset vertices will be those in the coords that are closest to the
+    # originals
+    dist = np.sum(np.square(coords[np.newaxis, :, :] -
+                            int_pts[:, np.newaxis, :]), axis=2)
+    nearest = np.argmin(dist, axis=1)
+    first = np.unique(nearest, return_index=True)[1]
+    offset_verts = nearest[np.sort(first)]
+    # If we are left with less than 3 different vertices then the throat is
+    # fully occluded as we can't make a shape with non-zero area
+    if len(offset_verts) < 3:
+        return None
+    # Distance transform the eroded facet to find the incentre and inradius
+    dt = ndimage.distance_transform_edt(eroded)
+    incentre = np.asarray(np.unravel_index(dt.argmax(), dt.shape)).astype(float)
+    # Undo the translation and scaling
+    return (props.area/(f*f),
+            props.perimeter/f,
+            props.equivalent_diameter/f,
+            np.asarray(props.centroid)/f + translation,
+            incentre/f + translation,
+            dt.max()/f,
+            coords[offset_verts].astype(float)/f + translation)
+
+
+def _offset_polygon(pts, offset, resolution=None):
+    r"""
+    Offsets a throat exactly, by moving each edge of its convex polygon
+    inwards and clipping the polygon with the moved edges.  The incircle is
+    the largest circle touching three of the moved edges.  Returns None if
+    the throat is fully occluded.
+    """
+    hull = ConvexHull(pts, qhull_options='QJ Pp')
+    poly = pts[hull.vertices]
+    span = np.max(pts - pts.min(axis=0))
+    tol = 1e-9*span
+    # The inward normal of each edge of the anticlockwise polygon, and the
+    # distance of the moved edge along it
+    edges = np.roll(poly, -1, axis=0) - poly
+    lengths = np.sqrt(np.sum(np.square(edges), axis=1))
+    keep = lengths > tol
+    normals = np.column_stack((-edges[keep, 1], edges[keep, 0])) / \
+        lengths[keep, np.newaxis]
+    limits = np.sum(normals*poly[keep], axis=1) + offset
+    clipped = poly
+    for normal, limit in zip(normals, limits):
+        dist = np.dot(clipped, normal) - limit
+        inside = dist >= 0
+        if not np.any(inside):
+            return None
+        if np.all(inside):
+            continue
+        new = []
+        for j in range(len(clipped)):
+            k = (j + 1) % len(clipped)
+            if inside[j]:
+                new.append(clipped[j])
+            if inside[j] != inside[k]:
+                t = dist[j]/(dist[j] - dist[k])
+                new.append(clipped[j] + t*(clipped[k] - clipped[j]))
+        clipped = np.array(new)
+    # Remove the repeated vertices left where several edges meet
+    steps = np.sqrt(np.sum(np.square(np.roll(clipped, -1, axis=0) - clipped),
+                           axis=1))
+    clipped = clipped[steps > tol]
+    if len(clipped) < 3:
+        return None
+    x, y = clipped.T
+    x1, y1 = np.roll(clipped, -1, axis=0).T
+    cross = x*y1 - x1*y
+    area = np.sum(cross)/2
+    if area <= tol*tol:
+        return None
+    perimeter = np.sum(np.sqrt(np.square(x1 - x) + np.square(y1 - y)))
+    centroid = np.array([np.sum((x + x1)*cross),
+                         np.sum((y + y1)*cross)])/(6*area)
+    # Solve for the centre and radius of the circle touching each triple of
+    # moved edges, and keep the largest one lying inside all of them
+    triples = np.array(list(_combinations(range(len(normals)), 3)))
+    A = np.concatenate((normals[triples],
+                        -np.ones(triples.shape + (1, ))), axis=2)
+    b = limits[triples]
+    ok = np.abs(np.linalg.det(A)) > 1e-12
+    sols = np.linalg.solve(A[ok], b[ok])
+    feasible = np.all(np.dot(sols[:, 0:2], normals.T) - sols[:, 2:3] >=
+                      limits - tol, axis=1)
+    if np.any(feasible):
+        best = sols[feasible][np.argmax(sols[feasible][:, 2])]
+        incentre, inradius = best[0:2], max(best[2], 0.0)
+    else:
+        incentre, inradius = centroid, 0.0
+    return (area,
+            perimeter,
+            np.sqrt(4*area/np.pi),
+            centroid,
+            incentre,
+            inradius,
+            clipped)
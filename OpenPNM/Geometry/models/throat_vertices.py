@@ -4,7 +4,7 @@ throat_vertices -- update throat vertices from Vornoi object
 ===============================================================================
 
 """
-import scipy as _sp
+from OpenPNM.Base import Tools as _tools
 
 
 def voronoi(network, geometry, **kwargs):
@@ -12,8 +12,5 @@ def voronoi(network, geometry, **kwargs):
     Update the pore vertices from the voronoi vertices
     """
     throats = geometry.map_throats(network, geometry. throats())
-    value = _sp.ndarray(len(throats), dtype=object)
-    for i in range(len(throats)):
-        value[i] = \
-            _sp.asarray(list(network['throat.vert_index'][throats[i]].values()))
-    return value
+    value = network['throat.vert_index'][throats]
+    return _tools.RaggedArray(offsets=value.offsets, data=value.data)
@@ -5,11 +5,12 @@ Voronoi networks, including connectings between them
 ===============================================================================
 
 """
+from itertools import chain as _chain
 from OpenPNM.Network import tools
 import scipy as sp
 import scipy.spatial as sptl
 from OpenPNM.Network import GenericNetwork
-from OpenPNM.Base import logging
+from OpenPNM.Base import logging, Tools
 logger = logging.getLogger(__name__)
 
 
@@ -117,35 +118,13 @@ class DelaunayVoronoiDual(GenericNetwork):
         pts_vor = vor.vertices
         pts_all = sp.vstack((points, pts_vor))
         Npts = sp.size(points, 0)
-        Nvor = sp.size(pts_vor, 0)
-        Nall = Nvor + Npts
-
-        # Create adjacency matrix in lil format for quick matrix construction
-        am = sp.sparse.lil_matrix((Nall, Nall))
-        for ridge in vor.ridge_dict.keys():
-            # Make Delaunay-to-Delauny connections
-            [am.rows[i].extend([ridge[0], ridge[1]]) for i in ridge]
-            row = vor.ridge_dict[ridge]
-            if -1 not in row:
-                # Index Voronoi vertex numbers by Npts
-                row = [i + Npts for i in row]
-                # Make Voronoi-to-Delaunay connections
-                [am.rows[i].extend(row) for i in ridge]
-                # Make Voronoi-to-Voronoi connections
-                row.append(row[0])
-                [am.rows[row[i]].append(row[i+1]) for i in range(len(row)-1)]
-                # Ensure connections are made symmetrically
-                [am.rows[row[i+1]].append(row[i]) for i in range(len(row)-1)]
-        # Finalize adjacency matrix by assigning data values to each location
-        am.data = am.rows  # Values don't matter, only shape, so use 'rows'
-        # Retrieve upper triangle and convert to csr to remove duplicates
-        am = sp.sparse.triu(A=am, k=1, format='csr')
-        # Convert to COO format for OpenPNM compatibility
-        am = am.tocoo()
+
+        # Find the connections of all ridges at once, from their ragged lists
+        # of vertices
+        conns = _ridge_connections(vor)
 
         # Translate adjacency matrix and points to OpenPNM format
         coords = pts_all
-        conns = sp.vstack((am.row, am.col)).T
         Np = sp.size(coords, axis=0)
         Nt = sp.size(conns, axis=0)
         self.update({'pore.all': sp.ones((Np, ), dtype=bool)})
@@ -302,23 +281,32 @@ class DelaunayVoronoiDual(GenericNetwork):
 
         Notes
         -----
-        The method is not well optimized as it scans through each given throat
-        inside a for-loop, so it could be slow for large networks.
+        The facet of a throat is made of the Voronoi pores that are
+        interconnected with both of its Delaunay pores.  These are found for
+        all throats at once by testing each Voronoi neighbor of one pore
+        against the sorted interconnections of the other.
 
         """
         if throats is None:
             throats = self.throats('delaunay')
         else:
             throats = self.filter_by_label(throats, labels='delaunay')
-        if 'throat.facet_coords' not in self.keys():
-            self['throat.facet_coords'] = sp.ndarray((self.Nt, ), dtype=object)
-        tvals = self['throat.interconnect'].astype(int)
-        am = self.create_adjacency_matrix(data=tvals, sprsfmt='lil')
-        for t in throats:
-            P12 = self['throat.conns'][t]
-            Ps = list(set(am.rows[P12][0]).intersection(am.rows[P12][1]))
-            if sp.size(Ps) > 0:
-                self['throat.facet_coords'][t] = self['pore.coords'][Ps]
+        am = self._interconnect_matrix()
+        P1, P2 = self['throat.conns'][throats].T
+        # Every Voronoi neighbor of the first pore of each throat
+        counts = am.indptr[P1 + 1] - am.indptr[P1]
+        ind = sp.repeat(throats, counts)
+        Ps = am.indices[Tools._ragged_positions(am.indptr[P1], counts)]
+        # Keep those that are also neighbors of the second pore
+        keys = sp.int64(self.Np)*sp.repeat(P2, counts) + Ps
+        row = sp.repeat(sp.arange(self.Np, dtype=sp.int64),
+                        sp.diff(am.indptr))
+        all_keys = row*self.Np + am.indices
+        loc = sp.searchsorted(all_keys, keys)
+        loc[loc == sp.size(all_keys)] = 0
+        keep = all_keys[loc] == keys
+        self._assign_ragged('throat.facet_coords', throats, ind[keep],
+                            Ps[keep])
 
     def find_pore_hulls(self, pores=None):
         r"""
@@ -334,18 +322,83 @@ class DelaunayVoronoiDual(GenericNetwork):
 
         Notes
         -----
-        This metod is not fully optimized as it scans through each pore in a
-        for-loop, so could be slow for large networks.
+        The hull of a pore is made of the Voronoi pores it is interconnected
+        with, which are read for all pores at once from the rows of the
+        interconnection matrix.
         """
         if pores is None:
             pores = self.pores('delaunay')
         else:
             pores = self.filter_by_label(pores, labels='delaunay')
-        if 'pore.hull_coords' not in self.keys():
-            self['pore.hull_coords'] = sp.ndarray((self.Np, ), dtype=object)
+        am = self._interconnect_matrix()
+        counts = am.indptr[pores + 1] - am.indptr[pores]
+        ind = sp.repeat(pores, counts)
+        Ps = am.indices[Tools._ragged_positions(am.indptr[pores], counts)]
+        self._assign_ragged('pore.hull_coords', pores, ind, Ps)
+
+    def _interconnect_matrix(self):
+        r"""
+        Returns the symmetric adjacency matrix of the interconnect throats in
+        CSR format, with the neighbors of each pore sorted.
+        """
         tvals = self['throat.interconnect'].astype(int)
-        am = self.create_adjacency_matrix(data=tvals, sprsfmt='lil')
-        for p in pores:
-            Ps = am.rows[p]
-            if sp.size(Ps) > 0:
-                self['pore.hull_coords'][p] = self['pore.coords'][Ps]
+        am = self.create_adjacency_matrix(data=tvals, sprsfmt='csr')
+        am.sort_indices()
+        return am
+
+    def _assign_ragged(self, propname, locs, ind, Ps):
+        r"""
+        Stores the coordinates of the pores ``Ps`` as the elements ``locs`` of
+        the RaggedArray ``propname``, where ``ind`` gives the element of each
+        pore in the same order as ``locs``.
+        """
+        N = self._count(propname.split('.')[0])
+        lengths = sp.bincount(ind, minlength=N)[locs]
+        value = Tools.RaggedArray(offsets=sp.concatenate(([0],
+                                                          sp.cumsum(lengths))),
+                                  data=self['pore.coords'][Ps])
+        if propname not in self.keys():
+            self[propname] = Tools.RaggedArray.scatter(N, [(locs, value)])
+        else:
+            self[propname][locs] = value
+
+
+def _ridge_connections(vor):
+    r"""
+    Returns the unique, sorted connections of the dual network made from a
+    Voronoi diagram, with the Voronoi vertices numbered after the points.
+
+    Notes
+    -----
+    The vertices of all ridges are flattened into one ragged array with an
+    index pointer, as in the CSR format.  Each ridge connects its two points
+    (Delaunay-to-Delaunay), and each bounded ridge also connects its vertices
+    to both points (Voronoi-to-Delaunay) and each vertex to the next one
+    around the ridge (Voronoi-to-Voronoi).  The duplicates are removed with a
+    single sort of keys packing each pair into one integer.
+    """
+    Npts = sp.int64(sp.size(vor.points, 0))
+    Nall = Npts + sp.size(vor.vertices, 0)
+    points = sp.asarray(vor.ridge_points, dtype=sp.int64)
+    counts = sp.fromiter(map(len, vor.ridge_vertices), dtype=sp.int64,
+                         count=len(vor.ridge_vertices))
+    indptr = sp.concatenate(([0], sp.cumsum(counts)))
+    verts = sp.fromiter(_chain.from_iterable(vor.ridge_vertices),
+                        dtype=sp.int64, count=indptr[-1])
+    ridge = sp.repeat(sp.arange(sp.size(counts)), counts)
+    # Ridges with a vertex at infinity (-1) are unbounded
+    bounded = sp.bincount(ridge[verts < 0], minlength=sp.size(counts)) == 0
+    # The next vertex around each ridge, wrapping back to its first vertex
+    nxt = sp.arange(1, sp.size(verts) + 1)
+    nxt[indptr[1:][counts > 0] - 1] = indptr[:-1][counts > 0]
+    mask = bounded[ridge]
+    V = verts[mask] + Npts
+    P = points[ridge[mask]]
+    conns = sp.vstack((points,
+                       sp.vstack((P[:, 0], V)).T,
+                       sp.vstack((P[:, 1], V)).T,
+                       sp.vstack((V, verts[nxt[mask]] + Npts)).T))
+    conns = sp.sort(conns, axis=1)
+    conns = conns[conns[:, 0] != conns[:, 1]]
+    keys = sp.unique(conns[:, 0]*Nall + conns[:, 1])
+    return sp.vstack((keys // Nall, keys % Nall)).T
@@ -6,6 +6,8 @@ Delaunay: Generate random networks based on Delaunay Tessellations
 
 """
 import sys
+from itertools import chain as _chain
+from itertools import combinations as _combinations
 import scipy as sp
 import numpy as np
 import OpenPNM.Utilities.vertexops as vo
@@ -14,7 +16,7 @@ import scipy.spatial as sptl
 import scipy.ndimage as spim
 from scipy.spatial import Voronoi
 from OpenPNM.Network import GenericNetwork
-from OpenPNM.Base import logging
+from OpenPNM.Base import logging, Tools
 logger = logging.getLogger(__name__)
 
 
@@ -168,50 +170,59 @@ class Delaunay(GenericNetwork):
         logger.debug('Beginning tessellation')
         Tri = sptl.Delaunay(pts)
         logger.debug('Converting tessellation to adjacency matrix')
-        adjmat = sprs.lil_matrix((Np, Np), dtype=int)
-        for i in sp.arange(0, sp.shape(Tri.simplices)[0]):
-            # Keep only simplices that are fully in real domain
-            # this used to be vectorize, but it stopped working...change in scipy?
-            for j in Tri.simplices[i]:
-                if j < Np:
-                    adjmat[j, Tri.simplices[i][Tri.simplices[i] < Np]] = 1
-        # Remove duplicate (lower triangle) and self connections (diagonal)
-        # and convert to coo
-        adjmat = sprs.triu(adjmat, k=1, format="coo")
+        # Take every edge of every simplex, keeping those between real pores
+        edges = Tri.simplices[:, sp.array(list(_combinations(range(4), 2)))]
+        edges = sp.sort(edges.reshape(-1, 2), axis=1)
+        edges = edges[sp.all(edges < Np, axis=1)]
+        # Remove the duplicates by packing each pair into a single integer,
+        # which also sorts the throats by their first then second pore
+        keys = sp.unique(edges[:, 0].astype(sp.int64)*Np + edges[:, 1])
         logger.debug('Conversion to adjacency matrix complete')
-        self['throat.conns'] = sp.vstack((adjmat.row, adjmat.col)).T
+        self['throat.conns'] = sp.vstack((keys // Np, keys % Np)).T
         self['pore.all'] = np.ones(len(self['pore.coords']), dtype=bool)
         self['throat.all'] = np.ones(len(self['throat.conns']), dtype=bool)
 
         # Do Voronoi diagram - creating voronoi polyhedra around each pore and save
         # vertex information
         self._vor = Voronoi(pts)
-        all_vert_index = sp.ndarray(Np, dtype=object)
-        for i, polygon in enumerate(self._vor.point_region[0:Np]):
-            if -1 not in self._vor.regions[polygon]:
-                all_vert_index[i] = \
-                    dict(zip(self._vor.regions[polygon],
-                             self._vor.vertices[self._vor.regions[polygon]]))
+        # Store the vertices of each pore and throat as ragged arrays, with
+        # the vertex numbers as ids
+        regions = [self._vor.regions[polygon]
+                   for polygon in self._vor.point_region[0:Np]]
+        regions = [region if -1 not in region else [] for region in regions]
+        self['pore.vert_index'] = _ragged_vertices(regions,
+                                                   self._vor.vertices)
 
-        # Add throat vertices by looking up vor.ridge_dict
-        throat_verts = sp.ndarray(len(self['throat.conns']), dtype=object)
-        for i, (p1, p2) in enumerate(self['throat.conns']):
-            try:
-                throat_verts[i] = \
-                    dict(zip(self._vor.ridge_dict[(p1, p2)],
-                             self._vor.vertices[self._vor.ridge_dict[(p1, p2)]]))
-            except KeyError:
-                try:
-                    throat_verts[i] = \
-                        dict(zip(self._vor.ridge_dict[(p2, p1)],
-                                 self._vor.vertices[self._vor.ridge_dict[(p2, p1)]]))
-                except KeyError:
-                    logger.error('Throat Pair Not Found in Voronoi Ridge Dictionary')
+        # Add throat vertices by looking up the ridge of each pair of pores
+        ridges = self._find_ridges(self['throat.conns'])
+        if sp.any(ridges < 0):
+            logger.error('Throat Pair Not Found in Voronoi Ridge Dictionary')
+        ridge_vertices = [self._vor.ridge_vertices[r] if r >= 0 else []
+                          for r in ridges]
+        self['throat.vert_index'] = _ragged_vertices(ridge_vertices,
+                                                     self._vor.vertices)
 
-        self['pore.vert_index'] = all_vert_index
-        self['throat.vert_index'] = throat_verts
         logger.debug(sys._getframe().f_code.co_name + ': End of method')
 
+    def _find_ridges(self, conns):
+        r"""
+        Returns the index of the Voronoi ridge separating each pair of points
+        in ``conns``, or -1 for pairs that do not share a ridge.  All pairs
+        are looked up at once by sorting the ridges on a packed key, instead
+        of querying ``ridge_dict`` one pair at a time.
+        """
+        N = sp.int64(len(self._vor.points))
+        ridge_points = sp.sort(self._vor.ridge_points, axis=1).astype(sp.int64)
+        ridge_keys = ridge_points[:, 0]*N + ridge_points[:, 1]
+        order = sp.argsort(ridge_keys)
+        ridge_keys = ridge_keys[order]
+        conns = sp.sort(sp.asarray(conns), axis=1).astype(sp.int64)
+        keys = conns[:, 0]*N + conns[:, 1]
+        ind = sp.searchsorted(ridge_keys, keys)
+        ind[ind == len(ridge_keys)] = 0
+        found = ridge_keys[ind] == keys
+        return sp.where(found, order[ind], -1)
+
     def add_boundaries(self):
 
         r"""
@@ -358,8 +369,10 @@ class Delaunay(GenericNetwork):
         """
         import pickle as pickle
         Indices = []
+        vert_index = self["throat.vert_index"]
         for t in self.throats():
-            indices = list(self["throat.vert_index"][t].keys())
+            indices = vert_index.ids[vert_index.offsets[t]:
+                                     vert_index.offsets[t + 1]]
             verts = self._vor.vertices[indices]
             # Need to order the indices in convex hull order
             # Compute the standard deviation in all coordinates and eliminate
@@ -380,3 +393,16 @@ class Delaunay(GenericNetwork):
         data["Verts"] = self._vor.vertices
         data["Indices"] = Indices
         pickle.dump(data, open("fibres.p", "wb"))
+
+
+def _ragged_vertices(index_lists, vertices):
+    r"""
+    Returns a RaggedArray of the coordinates of the vertices in each list,
+    with the vertex numbers as ids.
+    """
+    counts = sp.fromiter(map(len, index_lists), dtype=sp.int64,
+                         count=len(index_lists))
+    ids = sp.fromiter(_chain.from_iterable(index_lists), dtype=sp.int64,
+                      count=sp.sum(counts))
+    return Tools.RaggedArray(offsets=sp.concatenate(([0], sp.cumsum(counts))),
+                             data=vertices[ids], ids=ids)
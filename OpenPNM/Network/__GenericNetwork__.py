@@ -5,7 +5,6 @@ GenericNetwork: Abstract class to construct pore networks
 ===============================================================================
 
 """
-import itertools
 import scipy as sp
 import scipy.sparse as sprs
 import scipy.spatial as sptl
@@ -35,6 +34,7 @@ class GenericNetwork(Core):
         # Initialize adjacency and incidence matrix dictionaries
         self._incidence_matrix = {}
         self._adjacency_matrix = {}
+        self._neighbor_index = {}
 
     def __setitem__(self, prop, value):
         if prop == 'throat.conns':
@@ -61,7 +61,8 @@ class GenericNetwork(Core):
             element = key.split('.')[0]
             return self[element+'.all']
         if key not in self.keys():
-            logger.debug(key + ' not on Network, constructing data from Geometries')
+            logger.debug('%s not on Network, constructing data from Geometries',
+                         key)
             return self._interleave_data(key, self.geometries())
         else:
             return super().__getitem__(key)
@@ -306,23 +307,61 @@ class GenericNetwork(Core):
         >>> pn.find_connecting_throat([0, 1, 2], [2, 2, 2])
         [[], [3], []]
 
-        TODO: This now works on 'vector' inputs, but is not actually vectorized
-        in the Numpy sense, so could be slow with large P1,P2 inputs
+        Notes
+        -----
+        The throats are found for all pairs at once with a binary search of
+        the sorted pore pairs of all throats, see ``_find_connecting_throats``.
         """
         P1 = self._parse_locations(P1)
         P2 = self._parse_locations(P2)
-        Ts1 = self.find_neighbor_throats(P1, flatten=False)
-        Ts2 = self.find_neighbor_throats(P2, flatten=False)
-        Ts = []
+        Ts, counts = self._find_connecting_throats(P1, P2)
+        if sp.size(counts) == 0:
+            return []
+        Ts = sp.split(Ts, sp.cumsum(counts)[:-1])
+        return [item.tolist() for item in Ts]
 
-        for row in range(0, len(P1)):
-            if P1[row] == P2[row]:
-                throat = []
-            else:
-                throat = sp.intersect1d(Ts1[row], Ts2[row]).tolist()
-            Ts.insert(0, throat)
-        Ts.reverse()
-        return Ts
+    def _find_connecting_throats(self, P1, P2):
+        r"""
+        Finds the throats connecting each pair of pores in a single
+        vectorized call.
+
+        Parameters
+        ----------
+        P1 , P2 : array_like
+            The pore numbers of each pair, of the same length
+
+        Returns
+        -------
+        A tuple containing an array of the throats connecting each pair, in
+        the order of the pairs, and an array with the number of throats found
+        for each pair.  A pore is never connected to itself.
+
+        Notes
+        -----
+        Each throat is stored in a sorted array under the key
+        ``min(P1, P2)*Np + max(P1, P2)``, so the throats of any number of pairs
+        are found with ``searchsorted``.  The sorted keys are kept with the
+        neighbor index, so they are rebuilt when the topology changes.
+        """
+        P1 = sp.array(P1, ndmin=1, dtype=sp.int64)
+        P2 = sp.array(P2, ndmin=1, dtype=sp.int64)
+        self._get_neighbor_index('pore')
+        index = self._neighbor_index.get('pairs')
+        if index is None:
+            conns = self['throat.conns'].astype(sp.int64)
+            keys = sp.amin(conns, axis=1)*self.Np + sp.amax(conns, axis=1)
+            order = sp.argsort(keys, kind='mergesort')
+            index = (keys[order], order)
+            self._neighbor_index['pairs'] = index
+        keys, order = index
+        query = sp.minimum(P1, P2)*self.Np + sp.maximum(P1, P2)
+        start = sp.searchsorted(keys, query, side='left')
+        counts = sp.searchsorted(keys, query, side='right') - start
+        counts[P1 == P2] = 0
+        offsets = sp.arange(sp.sum(counts)) - sp.repeat(sp.cumsum(counts) -
+                                                        counts, counts)
+        Ts = order[sp.repeat(start, counts) + offsets]
+        return (Ts, counts)
 
     def find_neighbor_pores(self, pores, mode='union', flatten=True, excl_self=True):
         r"""
@@ -466,43 +505,70 @@ class GenericNetwork(Core):
         if sp.size(pores) == 0:
             return sp.array([], ndmin=1, dtype=int)
 
-        # Test for existence of incidence or adjacency matrix
-        if element == 'pore':
-            try:
-                neighbors = self._adjacency_matrix['lil'].rows[[pores]]
-            except:
-                temp = self.create_adjacency_matrix(sprsfmt='lil')
-                self._adjacency_matrix['lil'] = temp
-                neighbors = self._adjacency_matrix['lil'].rows[[pores]]
-        elif element == 'throat':
-            try:
-                neighbors = self._incidence_matrix['lil'].rows[[pores]]
-            except:
-                temp = self.create_incidence_matrix(sprsfmt='lil')
-                self._incidence_matrix['lil'] = temp
-                neighbors = self._incidence_matrix['lil'].rows[[pores]]
+        indptr, indices = self._get_neighbor_index(element)
+        # Gather the rows of all the input pores into a single array
+        starts = indptr[pores]
+        counts = indptr[pores + 1] - starts
+        offsets = sp.arange(sp.sum(counts)) - sp.repeat(sp.cumsum(counts) -
+                                                        counts, counts)
+        neighbors = indices[sp.repeat(starts, counts) + offsets].astype(int)
 
         if flatten:
-            # Convert rows of lil into single flat list
-            neighbors = itertools.chain.from_iterable(neighbors)
             if element == 'pore':  # Add input pores to list
-                neighbors = itertools.chain.from_iterable([neighbors, pores])
-            # Convert list to numpy array
-            neighbors = sp.fromiter(neighbors, dtype=int)
+                neighbors = sp.concatenate((neighbors, pores))
             if mode == 'not_intersection':
-                neighbors = sp.unique(sp.where(sp.bincount(neighbors) == 1)[0])
+                neighbors = sp.where(sp.bincount(neighbors) == 1)[0]
             elif mode == 'union':
                 neighbors = sp.unique(neighbors)
             elif mode == 'intersection':
-                neighbors = sp.unique(sp.where(sp.bincount(neighbors) > 1)[0])
+                neighbors = sp.where(sp.bincount(neighbors) > 1)[0]
             if excl_self and element == 'pore':  # Remove input pores from list
                 neighbors = neighbors[~sp.in1d(neighbors, pores)]
             return sp.array(neighbors, ndmin=1, dtype=int)
         else:
-            # Convert lists in array to numpy arrays
-            neighbors = [sp.array(neighbors[i]) for i in range(0, len(pores))]
+            # Split the gathered array into one array per input pore
+            neighbors = sp.split(neighbors, sp.cumsum(counts)[:-1])
             return sp.array(neighbors, ndmin=1)
 
+    def _get_neighbor_index(self, element):
+        r"""
+        Returns the compressed row arrays listing the neighboring pores or
+        throats of each pore, building them if necessary.
+
+        Parameters
+        ----------
+        element : string, either 'pore' or 'throat'
+            Whether to return the neighboring pores or throats
+
+        Returns
+        -------
+        A tuple containing the ``indptr`` and ``indices`` arrays, so that the
+        neighbors of pore ``i`` are ``indices[indptr[i]:indptr[i+1]]``, sorted
+        in increasing order.
+
+        Notes
+        -----
+        These are the same arrays as in the 'csr' adjacency and incidence
+        matrices, without the data, so a pore connected to another by several
+        throats lists it only once.  The index is stored on the network and is
+        removed by ``_update_network`` when the topology changes, or rebuilt
+        when the number of pores or throats no longer matches.
+        """
+        if getattr(self, '_neighbor_index', {}).get('size') != \
+                (self.Np, self.Nt):
+            self._neighbor_index = {'size': (self.Np, self.Nt)}
+        index = self._neighbor_index.get(element)
+        if index is None:
+            if element == 'pore':
+                temp = self.create_adjacency_matrix(sprsfmt='csr')
+            else:
+                temp = self.create_incidence_matrix(sprsfmt='csr')
+            temp.sum_duplicates()
+            dtype = sp.int32 if max(self.Np, self.Nt) < 2**31 else sp.int64
+            index = (temp.indptr.astype(dtype), temp.indices.astype(dtype))
+            self._neighbor_index[element] = index
+        return index
+
     def num_neighbors(self, pores, element='pore', flatten=False,
                       mode='union'):
         r"""
@@ -568,12 +634,13 @@ class GenericNetwork(Core):
         """
         pores = self._parse_locations(pores)
         # Count number of neighbors
-        num = self._find_neighbors(pores, element=element, flatten=flatten,
-                                   mode=mode, excl_self=True)
-        num = sp.array([sp.size(i) for i in num], dtype=int)
         if flatten:
-            num = sp.sum(num)
-            num = int(num)
+            num = self._find_neighbors(pores, element=element, flatten=True,
+                                       mode=mode, excl_self=True)
+            return int(sp.size(num))
+        element = self._parse_element(element=element, single=True)
+        indptr = self._get_neighbor_index(element)[0]
+        num = sp.array(indptr[pores + 1] - indptr[pores], ndmin=1, dtype=int)
         return num
 
     def find_interface_throats(self, labels=[]):
@@ -968,14 +1035,10 @@ class GenericNetwork(Core):
                     health['trim_pores'].extend(temp[c[i]])
 
         # Check for duplicate throats
-        am = self.create_adjacency_matrix(sprsfmt='lil')
-        mergeTs = []
-        for i in range(0, self.Np):
-            for j in sp.where(sp.array(am.data[i]) > 1)[0]:
-                k = am.rows[i][j]
-                mergeTs.extend(self.find_connecting_throat(i, k))
-        # Remove duplicates
-        mergeTs = [list(i) for i in set(tuple(i) for i in mergeTs)]
+        P12 = sp.sort(self['throat.conns'], axis=1).astype(sp.int64)
+        counts = self._find_connecting_throats(P12[:, 0], P12[:, 1])[1]
+        keys = sp.unique(P12[counts > 1, 0]*self.Np + P12[counts > 1, 1])
+        mergeTs = self.find_connecting_throat(keys // self.Np, keys % self.Np)
         health['duplicate_throats'] = mergeTs
 
         # Check for bidirectional throats
@@ -1011,7 +1074,8 @@ class GenericNetwork(Core):
 
     def _update_network(self, mode='clear'):
         r"""
-        Regenerates the adjacency and incidence matrices
+        Regenerates the adjacency and incidence matrices, and the neighbor
+        index used by ``find_neighbor_pores`` and ``find_neighbor_throats``
 
         Parameters
         ----------
@@ -1032,24 +1096,21 @@ class GenericNetwork(Core):
         logger.debug('Resetting adjacency and incidence matrices')
         self._adjacency_matrix['coo'] = {}
         self._adjacency_matrix['csr'] = {}
-        self._adjacency_matrix['lil'] = {}
         self._incidence_matrix['coo'] = {}
         self._incidence_matrix['csr'] = {}
-        self._incidence_matrix['lil'] = {}
+        self._neighbor_index = {}
 
         if mode == 'regenerate':
             self._adjacency_matrix['coo'] = \
                 self.create_adjacency_matrix(sprsfmt='coo')
             self._adjacency_matrix['csr'] = \
                 self.create_adjacency_matrix(sprsfmt='csr')
-            self._adjacency_matrix['lil'] = \
-                self.create_adjacency_matrix(sprsfmt='lil')
             self._incidence_matrix['coo'] = \
                 self.create_incidence_matrix(sprsfmt='coo')
             self._incidence_matrix['csr'] = \
                 self.create_incidence_matrix(sprsfmt='csr')
-            self._incidence_matrix['lil'] = \
-                self.create_incidence_matrix(sprsfmt='lil')
+            self._get_neighbor_index('pore')
+            self._get_neighbor_index('throat')
 
     def domain_bulk_volume(self):
         raise NotImplementedError()
@@ -10,6 +10,7 @@ import numpy as _np
 import scipy.ndimage as _spim
 from OpenPNM.Base import logging as _logging
 from OpenPNM.Base import Workspace as _workspace
+from OpenPNM.Base import Tools as _tools
 logger = _logging.getLogger(__name__)
 _mgr = _workspace()
 
@@ -68,6 +69,10 @@ def extend(network, pore_coords=[], throat_conns=[], labels=[]):
                 temp = _sp.where(network[item])[0]
                 network[item] = _sp.zeros((N,), dtype=bool)
                 network[item][temp] = True
+            elif isinstance(network[item], _tools.RaggedArray):
+                temp = network[item]
+                network[item] = _tools.RaggedArray.scatter(
+                    N, [(_sp.arange(0, len(temp)), temp)])
             elif network[item].dtype == object:
                 temp = network[item]
                 network[item] = _sp.ndarray((N,), dtype=object)
@@ -74,7 +74,7 @@ class GenericPhase(Core):
             element = key.split('.')[0]
             return self[element+'.all']
         if key not in self.keys():
-            logger.debug(key+' not on Phase, constructing data from Physics')
+            logger.debug('%s not on Phase, constructing data from Physics', key)
             return self._interleave_data(key, sources=self._physics)
         else:
             return super().__getitem__(key)
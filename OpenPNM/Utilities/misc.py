@@ -34,8 +34,7 @@ def find_path(network, pore_pairs, weights=None):
     The shortest path is found using Dijkstra's algorithm included in the
     scipy.sparse.csgraph module
 
-    TODO: The returned throat path contains the correct values, but not
-    necessarily in the true order
+    The throats of each path are listed in the order they are traversed.
 
     Examples
     --------
@@ -68,8 +67,8 @@ def find_path(network, pore_pairs, weights=None):
         ans.append(Ps[row][0])
         ans.reverse()
         pores.append(_sp.array(ans))
-        throats.append(network.find_neighbor_throats(pores=ans,
-                                                     mode='intersection'))
+        Ts = network._find_connecting_throats(ans[:-1], ans[1:])[0]
+        throats.append(Ts)
     pdict = _op.Base.Tools.PrintableDict
     dict_ = pdict({'pores': pores, 'throats': throats})
     return dict_
@@ -225,7 +224,8 @@ def amalgamate_data(objs=[], delimiter='_'):
                             keys.append(key)
         keys.sort()
         for key in keys:
-            if key not in exclusion_list:
+            if key not in exclusion_list and \
+                    not isinstance(item[key], _op.Base.Tools.RaggedArray):
                 try:
                     if _sp.amax(item[key]) < _sp.inf:
                         element = key.split('.')[0]
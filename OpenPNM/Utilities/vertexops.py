@@ -102,19 +102,12 @@ def scale(network, scale_factor=[1, 1, 1], preserve_vol=False,
                                      scale_factor, linear_scaling)
 
     network["pore.coords"] = network["pore.coords"]*lin_scale
-    # Cycle through all vertices of all pores updating vertex values
-    for pore in network.pores():
-        for i, vert in network['pore.vert_index'][pore].items():
-            vert_scale = _linear_scale_factor(vert, minmax,
-                                              scale_factor, linear_scaling)
-            network["pore.vert_index"][pore][i] = vert*vert_scale
-    # Cycle through all vertices of all throats updating vertex values
-    for throat in network.throats():
-        for i, vert in network['throat.vert_index'][throat].items():
-
-            vert_scale = _linear_scale_factor(vert, minmax,
-                                              scale_factor, linear_scaling)
-            network["throat.vert_index"][throat][i] = vert*vert_scale
+    # Update the vertices of all pores and throats at once
+    for item in ['pore.vert_index', 'throat.vert_index']:
+        vert = network[item].data
+        vert_scale = _linear_scale_factor(vert, minmax, scale_factor,
+                                          linear_scaling)
+        network[item].data = vert*vert_scale
     # Scale the vertices on the voronoi diagram stored on the network
     # These are used for adding boundaries on the Delaunay network class
     vert = network._vor.vertices
@@ -217,11 +210,7 @@ def vertex_dimension(network, face1=[], face2=[], parm='volume'):
         return 0
 
     if 'pore.vert_index' in network.props():
-        verts = []
-        for pore in pores:
-            for vert in np.asarray(list(network['pore.vert_index'][pore].values())):
-                verts.append(vert)
-        verts = np.asarray(verts)
+        verts = network['pore.vert_index'][pores].data
     else:
         verts = network['pore.coords'][pores]
 
@@ -1,3 +1,4 @@
+import pytest
 import scipy as sp
 import OpenPNM
 mgr = OpenPNM.Base.Workspace()
@@ -224,3 +225,33 @@ class DrainageTest:
         data = self.alg.get_drainage_data()
         assert 'capillary_pressure' in data.keys()
         assert 'invading_phase_saturation' in data.keys()
+
+    def test_single_pass_matches_each_pressure(self):
+        self.alg.setup(invading_phase=self.water, defending_phase=self.air)
+        self.alg.set_inlets(pores=self.net.pores('top'), mode='overwrite')
+        Ts = self.net.find_neighbor_throats(pores=self.net.pores('left'))
+        self.alg.set_residual(throats=Ts, mode='overwrite')
+        for npts in [5, 50, 500]:
+            self.alg['pore.inv_Pc'] = sp.inf
+            self.alg['throat.inv_Pc'] = sp.inf
+            self.alg.run(npts=npts)
+            p_inv = sp.copy(self.alg['pore.inv_Pc'])
+            t_inv = sp.copy(self.alg['throat.inv_Pc'])
+            self.alg['pore.inv_Pc'] = sp.inf
+            self.alg['throat.inv_Pc'] = sp.inf
+            for inv_val in self.alg._inv_points:
+                self.alg._apply_percolation(inv_val)
+            assert sp.all(p_inv == self.alg['pore.inv_Pc'])
+            assert sp.all(t_inv == self.alg['throat.inv_Pc'])
+        self.alg.set_residual(mode='clear')
+
+    def test_union_find_trapping_not_offered(self):
+        # Trapping found after the invasion would not block the invasion
+        with pytest.raises(Exception):
+            self.alg.setup(invading_phase=self.water,
+                           defending_phase=self.air, trapping=True,
+                           trapping_method='union_find')
+        with pytest.raises(Exception):
+            self.alg.setup(invading_phase=self.water,
+                           defending_phase=self.air, trapping=True,
+                           trapping_method='blah')
@@ -282,3 +282,79 @@ class GenericLinearTransportTest:
                                  mode='remove')
         assert ('pore.source_B' not in self.alg.labels())
         assert ('pore.source_A' not in self.alg.labels())
+
+    def test_coefficient_matrix_reuses_sparsity_pattern(self):
+        alg = OpenPNM.Algorithms.GenericLinearTransport(network=self.net,
+                                                        phase=self.phase)
+        alg.set_boundary_conditions(bctype='Dirichlet', bcvalue=1.0,
+                                    pores=self.net.pores('top'))
+        alg.set_boundary_conditions(bctype='Dirichlet', bcvalue=0.0,
+                                    pores=self.net.pores('bottom'))
+        alg.setup(conductance='throat.cond', quantity='pore.mole_fraction',
+                  super_pore_conductance=None)
+        A1 = alg.A
+        pattern = alg._coeff_pattern
+        # Off-diagonal entries hold the conductances, rows sum to zero
+        inner = self.net.pores(['top', 'bottom'], mode='not')
+        row_sums = np.array(A1.sum(axis=1)).flatten()
+        assert np.allclose(row_sums[inner], 0)
+        assert np.allclose(A1.diagonal()[self.net.pores('top')], 1)
+        # Changing the conductance only rewrites the data array
+        self.phys['throat.cond'] = 1e-7
+        alg.setup(conductance='throat.cond', quantity='pore.mole_fraction',
+                  super_pore_conductance=None)
+        A2 = alg.A
+        assert alg._coeff_pattern is pattern
+        assert np.all(A2.indices == A1.indices)
+        assert np.allclose(A2.data[A1.data != 1], 2*A1.data[A1.data != 1])
+        # Modifying the diagonal only touches the diagonal entries
+        A3 = alg._build_coefficient_matrix(modified_diag_pores=inner,
+                                           diag_added_data=-np.ones_like(inner),
+                                           mode='modify_diagonal')
+        diff = (A3 - A2).tocoo()
+        assert np.all(diff.row == diff.col)
+        assert np.allclose(diff.data, -1)
+        self.phys['throat.cond'] = 5e-8
+
+    def test_newton_source_term(self):
+        phase = OpenPNM.Phases.GenericPhase(network=self.net)
+        phys = OpenPNM.Physics.GenericPhysics(network=self.net, phase=phase,
+                                              pores=self.net.Ps,
+                                              throats=self.net.Ts)
+        phys['throat.cond'] = 5e-8
+        phys['pore.k'] = -2e-7
+        phys['pore.n'] = 2
+        phys.models.add(propname='pore.reaction',
+                        model=pm.generic_source_term.power_law,
+                        A1='pore.k', A2='pore.n', x='mole_fraction',
+                        return_rate=False, regen_mode='on_demand')
+        alg = OpenPNM.Algorithms.GenericLinearTransport(network=self.net,
+                                                        phase=phase)
+        alg.set_boundary_conditions(bctype='Dirichlet', bcvalue=1.0,
+                                    pores=self.net.pores('top'))
+        Ps = self.net.pores('top', mode='not')
+        alg.set_source_term(source_name='pore.reaction', pores=Ps,
+                            tol=1e-12)
+        alg.run(conductance='throat.cond', quantity='pore.mole_fraction',
+                super_pore_conductance=None)
+        X = alg['pore.mole_fraction']
+        assert alg._tol_reached < 1e-12
+        assert alg._steps < 10
+        # The flow leaving the boundary pores is consumed by the reaction
+        rate = alg.rate(pores=self.net.pores('top'))[0]
+        reaction = np.sum(-2e-7*X[Ps]**2)
+        assert np.absolute(rate - reaction) < 1e-10*np.absolute(rate)
+        # A warm start from the previous solution converges immediately
+        alg.set_source_term(source_name='pore.reaction', pores=Ps,
+                            tol=1e-12, mode='update')
+        alg.run(conductance='throat.cond', quantity='pore.mole_fraction',
+                super_pore_conductance=None, warm_start=True)
+        assert alg._steps == 1
+        assert np.allclose(alg['pore.mole_fraction'], X)
+        # Damping and iterative solvers reach the same solution
+        alg.set_source_term(source_name='pore.reaction', pores=Ps,
+                            x0=0, tol=1e-8, mode='update')
+        alg.run(conductance='throat.cond', quantity='pore.mole_fraction',
+                super_pore_conductance=None, damping=0.5,
+                iterative_solver='cg')
+        assert np.allclose(alg['pore.mole_fraction'], X)
@@ -1,3 +1,72 @@
+import OpenPNM
+import scipy as sp
+import scipy.sparse.csgraph as csgraph
+
+
 class InvasionPercolationTest:
+    def setup_class(self):
+        self.net = OpenPNM.Network.Cubic(shape=[8, 8, 1])
+        self.phase = OpenPNM.Phases.GenericPhase(network=self.net)
+        sp.random.seed(0)
+        self.phase['throat.capillary_pressure'] = sp.rand(self.net.Nt)
+        self.inlets = self.net.pores('left')
+        self.outlets = self.net.pores('right')
+
+    def _run(self):
+        ip = OpenPNM.Algorithms.InvasionPercolation(network=self.net)
+        ip.setup(phase=self.phase)
+        ip.set_inlets(pores=self.inlets)
+        ip.run()
+        return ip
+
     def test_return_results(self):
-        pass
+        ip = self._run()
+        ip.return_results()
+        assert sp.all(self.phase['pore.invasion_sequence'] ==
+                      ip['pore.invasion_sequence'])
+
+    def test_each_throat_invaded_once(self):
+        ip = self._run()
+        t_seq = ip['throat.invasion_sequence']
+        assert sp.all(sp.sort(t_seq) == sp.arange(self.net.Nt))
+        assert sp.all(ip['pore.invasion_sequence'] >= 0)
+        # The heap never holds more than one entry per throat
+        assert len(ip.queue) == 0
+        assert sp.all(ip._queued)
+
+    def test_run_in_steps(self):
+        ip = self._run()
+        ip2 = OpenPNM.Algorithms.InvasionPercolation(network=self.net)
+        ip2.setup(phase=self.phase)
+        ip2.set_inlets(pores=self.inlets)
+        ip2.run(n_steps=20)
+        assert sp.sum(ip2['throat.invasion_sequence'] >= 0) == 20
+        ip2.run()
+        assert sp.all(ip2['throat.invasion_sequence'] ==
+                      ip['throat.invasion_sequence'])
+
+    def test_apply_trapping(self):
+        ip = self._run()
+        p_seq = sp.copy(ip['pore.invasion_sequence'])
+        t_seq = sp.copy(ip['throat.invasion_sequence'])
+        ip.apply_trapping(outlets=self.outlets)
+        # Check each pore against the defending clusters at its invasion
+        conns = self.net['throat.conns']
+        for p in self.net.pores():
+            if p in self.inlets:
+                assert not ip['pore.trapped'][p]
+                continue
+            s = p_seq[p]
+            Ts = (t_seq >= s)*sp.all(p_seq[conns] >= s, axis=1)
+            am = self.net.create_adjacency_matrix(data=Ts.astype(float))
+            labels = csgraph.connected_components(am, directed=False)[1]
+            outlets = self.outlets[p_seq[self.outlets] >= s]
+            escaped = labels[p] in labels[outlets]
+            assert ip['pore.trapped'][p] == (not escaped)
+        assert sp.any(ip['pore.trapped'])
+        assert sp.all(ip['pore.invasion_sequence'][ip['pore.trapped']] == -1)
+        kept = ~ip['throat.trapped']
+        assert sp.all(ip['throat.invasion_sequence'][kept] == t_seq[kept])
+        # Throats filled after both of their pores are always trapped
+        both = sp.amax(p_seq[conns], axis=1) < t_seq
+        assert sp.all(ip['throat.trapped'][both])
@@ -1,15 +1,80 @@
 import OpenPNM
+import scipy as sp
 mgr = OpenPNM.Base.Workspace()
 mgr.loglevel = 60
 
 
 class OrdinaryPercolationTest:
-    def setup_test(self):
+    def setup_class(self):
         self.net = OpenPNM.Network.Cubic(shape=[5, 5, 5])
         self.geo = OpenPNM.Geometry.Toray090(network=self.net,
                                              pores=self.net.Ps,
                                              throats=self.net.Ts)
         self.phase = OpenPNM.Phases.Water(network=self.net)
         self.phys = OpenPNM.Physics.Standard(network=self.net,
+                                             phase=self.phase,
                                              pores=self.net.Ps,
                                              throats=self.net.Ts)
+
+    def _compare_with_each_pressure(self, inv_points, access_limited):
+        OP = OpenPNM.Algorithms.OrdinaryPercolation(network=self.net,
+                                                    invading_phase=self.phase)
+        OP.run(inlets=self.net.pores('top'), inv_points=inv_points,
+               access_limited=access_limited)
+        ref = OpenPNM.Algorithms.OrdinaryPercolation(network=self.net,
+                                                     invading_phase=self.phase)
+        ref.set_inlets(pores=self.net.pores('top'))
+        ref._AL = access_limited
+        for inv_val in inv_points:
+            ref._do_one_inner_iteration(inv_val)
+        for item in ['pore', 'throat']:
+            assert sp.all(OP[item + '.inv_Pc'] == ref[item + '.inv_Pc'])
+            assert sp.allclose(OP[item + '.inv_sat'], ref[item + '.inv_sat'])
+
+    def test_single_pass_matches_each_pressure(self):
+        Pc = self.phase['throat.capillary_pressure']
+        for npts in [5, 50, 500]:
+            inv_points = sp.linspace(sp.amin(Pc)*0.9, sp.amax(Pc), npts)
+            self._compare_with_each_pressure(inv_points, True)
+        self._compare_with_each_pressure(inv_points, False)
+        # Points that are not in increasing order are also handled
+        self._compare_with_each_pressure(sp.array([5000., 1000., 9000.,
+                                                   7000., 12000.]), True)
+
+    def test_invasion_pressures_exact(self):
+        OP = OpenPNM.Algorithms.OrdinaryPercolation(network=self.net,
+                                                    invading_phase=self.phase)
+        # Applying every entry pressure gives the exact invasion pressures
+        Pc = self.phase['throat.capillary_pressure']
+        OP.run(inlets=self.net.pores('top'), inv_points=sp.unique(Pc))
+        p_Pc, t_Pc = OpenPNM.Algorithms.percolation.invasion_pressures(
+            network=self.net, entry_pressure=Pc,
+            inlets=self.net.pores('top'))
+        assert sp.all(OP['pore.inv_Pc'] == p_Pc)
+        assert sp.all(OP['throat.inv_Pc'] == t_Pc)
+        assert sp.all(t_Pc >= Pc)
+
+    def test_union_find_trapping_matches_clusters(self):
+        Pc = self.phase['throat.capillary_pressure']
+        inv_points = sp.linspace(sp.amin(Pc)*0.9, sp.amax(Pc), 30)
+        results = {}
+        for method in ['clusters', 'union_find']:
+            OP = OpenPNM.Algorithms.OrdinaryPercolation(
+                network=self.net, invading_phase=self.phase,
+                trapping_method=method)
+            OP.run(inlets=self.net.pores('top'),
+                   outlets=self.net.pores('bottom'), inv_points=inv_points)
+            results[method] = OP
+        ref = results['clusters']
+        OP = results['union_find']
+        assert sp.any(OP['pore.trapped'] > 0)
+        assert sp.all(OP['pore.trapped'] == ref['pore.trapped'])
+        assert sp.all(OP['pore.inv_Pc'] == ref['pore.inv_Pc'])
+        # The only throats that differ are defending throats between two
+        # invaded pores, which the clusters method can miss
+        diff = OP['throat.trapped'] != ref['throat.trapped']
+        conns = self.net['throat.conns'][diff]
+        assert sp.all(OP['throat.trapped'][diff] > 0)
+        assert sp.all(OP['pore.inv_Pc'][conns] < sp.inf)
+        same_Pc = OP['throat.inv_Pc'] == ref['throat.inv_Pc']
+        assert sp.all(same_Pc[~diff])
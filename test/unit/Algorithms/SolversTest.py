@@ -0,0 +1,152 @@
+import OpenPNM
+import pytest
+import scipy as sp
+from OpenPNM.Algorithms import solvers
+
+
+class SolversTest:
+    def setup_class(self):
+        self.net = OpenPNM.Network.Cubic(shape=[8, 8, 8])
+        self.phase = OpenPNM.Phases.GenericPhase(network=self.net)
+        self.phys = OpenPNM.Physics.GenericPhysics(network=self.net,
+                                                   phase=self.phase,
+                                                   pores=self.net.Ps,
+                                                   throats=self.net.Ts)
+        sp.random.seed(0)
+        self.phys['throat.diffusive_conductance'] = \
+            sp.random.rand(self.net.Nt)*1e-8 + 1e-9
+        self.alg = OpenPNM.Algorithms.FickianDiffusion(network=self.net,
+                                                       phase=self.phase)
+        self.alg.set_boundary_conditions(bctype='Dirichlet', bcvalue=0.6,
+                                         pores=self.net.pores('top'))
+        self.alg.set_boundary_conditions(bctype='Dirichlet', bcvalue=0.2,
+                                         pores=self.net.pores('bottom'))
+        self.alg.run()
+        self.X = sp.copy(self.alg.X)
+
+    def test_available(self):
+        names = solvers.available()
+        assert set(['spsolve', 'cg', 'bicgstab', 'gmres']).issubset(names)
+        assert solvers.available('preconditioners') == ['ilu', 'jacobi']
+        assert solvers.defaults('gmres')['restart'] == 50
+
+    def test_iterative_solvers_match_direct_solver(self):
+        for name in solvers.available():
+            pcs = [None] + solvers._solvers[name]['preconditioners']
+            for pc in pcs:
+                self.alg.run(iterative_solver=name, preconditioner=pc)
+                assert self.alg.solver_report['solver'] == name
+                assert sp.allclose(self.alg.X, self.X, rtol=0, atol=1e-6)
+
+    def test_solve_returns_report(self):
+        X, report = solvers.solve(self.alg.A, self.alg.b, solver='cg',
+                                  preconditioner='jacobi', tol=1e-12)
+        assert sp.allclose(X, self.X, rtol=0, atol=1e-8)
+        assert report['iterations'] > 0
+        assert report['tol'] == 1e-12
+        assert report['residual'] < 1e-8
+
+    def test_amg(self):
+        if 'amg' not in solvers.available():
+            pytest.skip('pyamg is not installed')
+        X, report = solvers.solve(self.alg.A, self.alg.b, solver='amg')
+        assert report['converged']
+        assert sp.allclose(X, self.X, rtol=0, atol=1e-8)
+
+    def test_register_custom_solver(self):
+        def jacobi_iteration(A, b, x0=None, callback=None, maxiter=2000):
+            d = A.diagonal()
+            X = sp.zeros_like(b) if x0 is None else x0
+            for i in range(maxiter):
+                X = X + (b - A*X)/d
+            return (X, {'info': 0, 'iterations': maxiter})
+        solvers.register('jacobi_iteration', jacobi_iteration,
+                         defaults={'maxiter': 2000})
+        try:
+            X, report = solvers.solve(self.alg.A, self.alg.b,
+                                      solver='jacobi_iteration')
+            assert report['iterations'] == 2000
+            assert sp.allclose(X, self.X, rtol=0, atol=1e-4)
+        finally:
+            solvers._solvers.pop('jacobi_iteration')
+
+    def test_unsupported_combinations(self):
+        with pytest.raises(Exception):
+            self.alg.run(iterative_solver='cg', preconditioner='ilu')
+        with pytest.raises(Exception):
+            self.alg.run(iterative_solver='blah')
+        with pytest.raises(Exception):
+            self.alg.run(iterative_solver='gmres', preconditioner='blah')
+
+    def test_factorization_is_reused(self):
+        solvers.clear_cache()
+        self.alg._factorizations.clear()
+        # By default the factorization is released after solving
+        self.alg.run()
+        assert len(self.alg._factorizations) == 0
+        self.alg.run(keep_factorization=True)
+        self.alg.run(keep_factorization=True)
+        info = solvers.cache_info()
+        assert info['misses'] == 2
+        assert info['hits'] == 1
+        assert self.alg.solver_report['solver'] == 'splu'
+        # The factorization is kept by the algorithm, not the module
+        assert len(self.alg._factorizations) == 1
+        assert info['size'] == 0
+        # Changing the conductance requires a new factorization
+        g = self.phys['throat.diffusive_conductance']
+        self.phys['throat.diffusive_conductance'] = g*2
+        self.alg.run(keep_factorization=True)
+        self.phys['throat.diffusive_conductance'] = g
+        assert solvers.cache_info()['misses'] == 3
+        self.alg.run()
+        assert len(self.alg._factorizations) == 0
+        assert sp.allclose(self.alg.X, self.X)
+
+    def test_cache_size(self):
+        solvers.clear_cache()
+        assert solvers.cache_info()['maxsize'] == 0
+        solvers.solve(self.alg.A, self.alg.b, solver='splu')
+        assert solvers.cache_info()['size'] == 0
+        solvers.set_cache_size(4)
+        try:
+            solvers.solve(self.alg.A, self.alg.b, solver='splu')
+            solvers.solve(self.alg.A, self.alg.b, solver='splu')
+            info = solvers.cache_info()
+            assert info['size'] == 1
+            assert info['hits'] == 1
+        finally:
+            solvers.set_cache_size(0)
+
+    def test_factorization_key(self):
+        key = self.alg._factorization_key(self.alg.A)
+        # Super pore conductances can mix scalars and arrays
+        g_super = self.alg.super_pore_conductance
+        self.alg.super_pore_conductance = [2e-12, sp.ones(3)]
+        try:
+            assert self.alg._factorization_key(self.alg.A) != key
+        finally:
+            self.alg.super_pore_conductance = g_super
+        # The key depends on the sparsity pattern, not only the values
+        A = self.alg.A.tocsr()
+        B = A.copy()
+        B.indices = B.indices.copy()
+        row = sp.where(sp.diff(B.indptr) > 2)[0][0]
+        cols = B.indices[B.indptr[row]:B.indptr[row + 1]]
+        B.indices[B.indptr[row]:B.indptr[row + 1]] = cols[::-1]
+        assert self.alg._factorization_key(B) != \
+            self.alg._factorization_key(A)
+
+    def test_solve_batch(self):
+        Ps = self.alg.pores('Dirichlet')
+        vals = self.alg['pore.bcval_Dirichlet'][Ps]
+        X = self.alg.solve_batch(bcvalues=[vals, vals*2, 0.5])
+        assert X.shape == (self.net.Np, 3)
+        assert sp.allclose(X[:, 0], self.X)
+        assert sp.allclose(X[:, 1], 2*self.X)
+        assert sp.allclose(X[:, 2], 0.5)
+        assert len(self.alg._factorizations) == 0
+        self.alg.solve_batch(bcvalues=[vals], keep_factorization=True)
+        assert len(self.alg._factorizations) == 1
+        self.alg.solve_batch(bcvalues=[vals], keep_factorization=False)
+        assert len(self.alg._factorizations) == 0
@@ -0,0 +1,120 @@
+import OpenPNM
+import pytest
+import scipy as sp
+
+
+class TransientLinearTransportTest:
+    def setup_class(self):
+        self.net = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+        self.phase = OpenPNM.Phases.GenericPhase(network=self.net)
+        self.phys = OpenPNM.Physics.GenericPhysics(network=self.net,
+                                                   phase=self.phase,
+                                                   pores=self.net.Ps,
+                                                   throats=self.net.Ts)
+        self.phys['throat.cond'] = 1.0
+        self.phys['pore.vol'] = 1.0
+
+    def _new_alg(self):
+        alg = OpenPNM.Algorithms.TransientLinearTransport(network=self.net,
+                                                          phase=self.phase)
+        alg.set_boundary_conditions(bctype='Dirichlet', bcvalue=1.0,
+                                    pores=self.net.pores('top'))
+        alg.set_boundary_conditions(bctype='Dirichlet', bcvalue=0.0,
+                                    pores=self.net.pores('bottom'))
+        return alg
+
+    def test_reaches_steady_state(self):
+        steady = OpenPNM.Algorithms.GenericLinearTransport(network=self.net,
+                                                           phase=self.phase)
+        steady.set_boundary_conditions(bctype='Dirichlet', bcvalue=1.0,
+                                       pores=self.net.pores('top'))
+        steady.set_boundary_conditions(bctype='Dirichlet', bcvalue=0.0,
+                                       pores=self.net.pores('bottom'))
+        steady.run(conductance='throat.cond', quantity='pore.concentration',
+                   super_pore_conductance=None)
+        alg = self._new_alg()
+        alg.run(conductance='throat.cond', quantity='pore.concentration',
+                accumulation='pore.vol', t_final=200, dt=5, x0=0)
+        assert alg.time == 200
+        assert alg._steps == 40
+        assert sp.allclose(alg['pore.concentration'],
+                           steady['pore.concentration'])
+
+    def test_crank_nicolson_is_more_accurate(self):
+        alg = self._new_alg()
+        alg.run(conductance='throat.cond', quantity='pore.concentration',
+                accumulation='pore.vol', t_final=5, dt=0.005, x0=0,
+                scheme='cranknicolson')
+        ref = sp.copy(alg['pore.concentration'])
+        err = {}
+        for scheme in ['implicit', 'cranknicolson']:
+            alg = self._new_alg()
+            alg.run(conductance='throat.cond', quantity='pore.concentration',
+                    accumulation='pore.vol', t_final=5, dt=0.5, x0=0,
+                    scheme=scheme)
+            err[scheme] = sp.amax(sp.absolute(alg['pore.concentration'] -
+                                              ref))
+        assert err['cranknicolson'] < err['implicit']/5
+
+    def test_step_factorizations_not_cached(self):
+        solvers = OpenPNM.Algorithms.solvers
+        solvers.clear_cache()
+        solvers.set_cache_size(4)
+        try:
+            alg = self._new_alg()
+            alg.run(conductance='throat.cond', quantity='pore.concentration',
+                    accumulation='pore.vol', t_final=10, dt=5, x0=0)
+            assert solvers.cache_info()['size'] == 0
+            assert not hasattr(alg, '_step_matrices')
+        finally:
+            solvers.set_cache_size(0)
+
+    def test_continues_from_previous_run(self):
+        alg = self._new_alg()
+        alg.run(conductance='throat.cond', quantity='pore.concentration',
+                accumulation='pore.vol', t_final=4, dt=0.5, x0=0)
+        X = sp.copy(alg['pore.concentration'])
+        alg = self._new_alg()
+        alg.run(conductance='throat.cond', quantity='pore.concentration',
+                accumulation='pore.vol', t_final=2, dt=0.5, x0=0)
+        alg.run(conductance='throat.cond', quantity='pore.concentration',
+                accumulation='pore.vol', t_final=4, dt=0.5)
+        assert alg.time == 4
+        assert sp.allclose(alg['pore.concentration'], X)
+
+    def test_adaptive_time_steps(self):
+        alg = self._new_alg()
+        alg.run(conductance='throat.cond', quantity='pore.concentration',
+                accumulation='pore.vol', t_final=50, dt=0.01, x0=0,
+                adaptive=True, max_change=0.05)
+        assert alg.time == 50
+        # Far fewer steps than with the initial time step
+        assert alg._steps < 200
+        with pytest.raises(Exception):
+            alg.run(conductance='throat.cond',
+                    quantity='pore.concentration', accumulation='pore.vol',
+                    t_final=60, dt=0.01, adaptive=True)
+
+    def test_iterative_solver(self):
+        alg = self._new_alg()
+        alg.run(conductance='throat.cond', quantity='pore.concentration',
+                accumulation='pore.vol', t_final=5, dt=0.5, x0=0)
+        X = sp.copy(alg['pore.concentration'])
+        alg = self._new_alg()
+        alg.run(conductance='throat.cond', quantity='pore.concentration',
+                accumulation='pore.vol', t_final=5, dt=0.5, x0=0,
+                iterative_solver='cg', preconditioner='jacobi')
+        assert alg.solver_report['converged']
+        assert sp.allclose(alg['pore.concentration'], X)
+
+    def test_output_written_to_file(self, tmpdir):
+        filename = str(tmpdir.join('transient.npy'))
+        alg = self._new_alg()
+        alg.run(conductance='throat.cond', quantity='pore.concentration',
+                accumulation='pore.vol', t_final=2, dt=0.5, x0=0,
+                output_times=[1, 0.25, 2], filename=filename)
+        read = OpenPNM.Algorithms.TransientLinearTransport.read_output
+        output = list(read(filename))
+        assert [t for t, X in output] == [0.25, 1.0, 2.0]
+        assert sp.allclose(output[-1][1], alg['pore.concentration'])
+        assert sp.shape(output[0][1]) == (self.net.Np,)
@@ -1,7 +1,9 @@
 import OpenPNM
+import json
 import os
 from os.path import join
 import pytest
+import scipy as sp
 
 
 class WorkspaceTest:
@@ -103,6 +105,104 @@ class WorkspaceTest:
         net2 = self.workspace[net.name]
         assert 'pore.blah' in net2.keys()
 
+    def test_save_and_load_simulation_columnar(self):
+        from OpenPNM.Base import __Columnar__ as columnar
+        net = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+        geo = OpenPNM.Geometry.TestGeometry(network=net, pores=net.Ps,
+                                            throats=net.Ts)
+        verts = [sp.rand(i % 3, 3) for i in range(net.Np)]
+        net['pore.verts'] = OpenPNM.Base.Tools.RaggedArray(verts)
+        filename = join(TEMP_DIR, 'test_columnar')
+        self.workspace.save_simulation(net, filename)
+        manifest = columnar.read_manifest(filename + '.net')
+        names = [item['name'] for item in manifest['objects']]
+        assert sorted(names) == sorted([net.name, geo.name])
+        arrays = [item['arrays'] for item in manifest['objects']
+                  if item['name'] == net.name][0]
+        assert sorted(arrays['pore.verts']['ragged']) == ['data', 'offsets']
+        coords = sp.copy(net['pore.coords'])
+        self.workspace.clear()
+        self.workspace.load_simulation(filename)
+        net2 = self.workspace[net.name]
+        geo2 = self.workspace[geo.name]
+        # Arrays are memory mapped, but can still be changed in place
+        assert isinstance(net2['pore.coords'], sp.memmap)
+        assert sp.all(net2['pore.coords'] == coords)
+        assert geo2.models._find_master() is geo2
+        assert isinstance(net2['pore.verts'].data, sp.memmap)
+        assert all(sp.all(a == b) for a, b in zip(net2['pore.verts'], verts))
+        geo2.regenerate()
+        assert sp.all(geo2['throat.length'] == geo['throat.length'])
+        net2['pore.coords'][0] = 0
+        assert sp.all(columnar.load(filename + '.net')['pore.coords'] ==
+                      coords)
+        with pytest.raises(Exception):
+            self.workspace.save_simulation(net2, filename, fileformat='blah')
+
+    def test_save_simulation_over_loaded_file(self):
+        net = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+        filename = join(TEMP_DIR, 'test_overwrite')
+        self.workspace.save_simulation(net, filename)
+        self.workspace.clear()
+        self.workspace.load_simulation(filename)
+        net2 = self.workspace[net.name]
+        assert isinstance(net2['pore.coords'], sp.memmap)
+        coords = sp.copy(net2['pore.coords'])
+        net2['pore.coords'][0] = -1
+        net2['pore.blah'] = 1.0
+        # The arrays being saved are mapped from the file being replaced
+        self.workspace.save_simulation(net2, filename)
+        assert sp.all(net2['pore.coords'][1:] == coords[1:])
+        self.workspace.save_simulation(net2, filename, fileformat='pickle')
+        self.workspace.save_simulation(net2, filename)
+        self.workspace.clear()
+        self.workspace.load_simulation(filename)
+        net3 = self.workspace[net.name]
+        assert sp.all(net3['pore.coords'][0] == -1)
+        assert sp.all(net3['pore.coords'][1:] == coords[1:])
+        assert sp.all(net3['pore.blah'] == 1.0)
+        files = [item for item in os.listdir(TEMP_DIR)
+                 if item.endswith('.tmp')]
+        assert files == []
+
+    def test_load_legacy_vertex_data(self):
+        net = OpenPNM.Network.Delaunay(num_pores=30, domain_size=[1, 1, 1])
+        geo = OpenPNM.Geometry.GenericGeometry(network=net, pores=net.Ps,
+                                               throats=net.Ts)
+        geo.models.add(propname='throat.vertices',
+                       model=OpenPNM.Geometry.models.throat_vertices.voronoi)
+        verts = geo['throat.vertices']
+        # Older versions stored the vertices as object arrays of dicts
+        for prop in ['pore.vert_index', 'throat.vert_index']:
+            ragged = net[prop]
+            legacy = sp.ndarray((len(ragged), ), dtype=object)
+            for i in range(len(ragged)):
+                pos = slice(ragged.offsets[i], ragged.offsets[i+1])
+                legacy[i] = dict(zip(ragged.ids[pos], ragged.data[pos]))
+            dict.__setitem__(net, prop, legacy)
+        geo.models.remove('throat.vertices')
+        filename = join(TEMP_DIR, 'test_legacy')
+        self.workspace.save_simulation(net, filename, fileformat='pickle')
+        self.workspace.clear()
+        self.workspace.load_simulation(filename)
+        net2 = self.workspace[net.name]
+        geo2 = self.workspace[geo.name]
+        for prop in ['pore.vert_index', 'throat.vert_index']:
+            assert isinstance(net2[prop], OpenPNM.Base.Tools.RaggedArray)
+        geo2.models.add(propname='throat.vertices',
+                        model=OpenPNM.Geometry.models.throat_vertices.voronoi)
+        assert sp.all(geo2['throat.vertices'].offsets == verts.offsets)
+        assert sp.all(geo2['throat.vertices'].data == verts.data)
+
+    def test_save_and_load_simulation_pickle(self):
+        net = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+        filename = join(TEMP_DIR, 'test_pickle')
+        self.workspace.save_simulation(net, filename, fileformat='pickle')
+        self.workspace.clear()
+        self.workspace.load_simulation(filename)
+        assert not isinstance(self.workspace[net.name]['pore.coords'],
+                              sp.memmap)
+
     def test_ghost_object(self):
         a = self.workspace.ghost_object(self.net)
         # Different objects...
@@ -139,6 +239,75 @@ class WorkspaceTest:
         assert a in self.workspace.values()
         assert a.name in self.workspace.keys()
 
+    def test_clone_simulation_copy_on_write(self):
+        net = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+        geo = OpenPNM.Geometry.TestGeometry(network=net, pores=net.Ps,
+                                            throats=net.Ts)
+        a = self.workspace.clone_simulation(net, copy_on_write=True)
+        geo2 = a._geometries[0]
+        assert sp.shares_memory(geo2['pore.diameter'], geo['pore.diameter'])
+        with pytest.raises(ValueError):
+            geo2['pore.diameter'][0] = 1.0
+        report = self.workspace.clone_memory(a)
+        # Writing to the clone stores a new array on the clone only
+        d = sp.copy(geo['pore.diameter'])
+        geo2['pore.diameter'] = 1.0
+        assert sp.all(geo['pore.diameter'] == d)
+        assert not sp.shares_memory(geo2['pore.diameter'],
+                                    geo['pore.diameter'])
+        new_report = self.workspace.clone_memory(a)
+        nbytes = geo2['pore.diameter'].nbytes
+        assert new_report['shared'] == report['shared'] - nbytes
+        assert new_report['owned'] == report['owned'] + nbytes
+        geo2.regenerate()
+        a.trim(pores=a.pores('top'))
+        assert net.Np == 125
+
+    def test_clone_simulation_copy_on_write_isolated(self):
+        net = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+        geo = OpenPNM.Geometry.TestGeometry(network=net, pores=net.Ps,
+                                            throats=net.Ts)
+        d = sp.copy(geo['pore.diameter'])
+        a = self.workspace.clone_simulation(net, copy_on_write=True)
+        geo2 = a._geometries[0]
+        # The shared arrays cannot be changed in place on either side
+        with pytest.raises(ValueError):
+            geo['pore.diameter'][0] = 123
+        with pytest.raises(ValueError):
+            geo2['pore.diameter'][0] = 123
+        assert sp.all(geo['pore.diameter'] == d)
+        assert sp.all(geo2['pore.diameter'] == d)
+        # Writing on the original leaves the clone unchanged
+        geo['pore.diameter'] = geo['pore.diameter']
+        geo['pore.diameter'][0] = 123
+        assert geo['pore.diameter'][0] == 123
+        assert sp.all(geo2['pore.diameter'] == d)
+        # Writing on the clone leaves the original unchanged
+        geo2['pore.diameter'] = geo2['pore.diameter']
+        geo2['pore.diameter'][1] = 456
+        assert geo['pore.diameter'][1] == d[1]
+        assert geo2['pore.diameter'][0] == d[0]
+        # The models of the original can still be run
+        geo.regenerate()
+        assert sp.all(geo2['pore.diameter'][2:] == d[2:])
+
+    def test_memory_report(self):
+        net = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+        geo = OpenPNM.Geometry.TestGeometry(network=net, pores=net.Ps,
+                                            throats=net.Ts)
+        geo['pore.flag'] = 1.0
+        report = self.workspace.memory_report()
+        assert sorted(report[net.name].keys()) == sorted([net.name, geo.name])
+        usage = report[net.name][geo.name]
+        assert usage['pore.diameter'] == geo['pore.diameter'].nbytes
+        assert report.total(net.name) == \
+            sum(net.memory_usage().values()) + sum(usage.values())
+        assert report.total() >= report.total(net.name)
+        assert (geo.name, 'pore.flag',
+                'float64 with only 0 and 1, could be bool') in \
+            report.compressible
+        assert net.name in str(report)
+
     def test_geometries(self):
         a = self.workspace.geometries()
         assert type(a) is list
@@ -221,6 +390,49 @@ class WorkspaceTest:
             flag = False
         assert flag
 
+    def test_perf_report(self):
+        net = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+        geo = OpenPNM.Geometry.Stick_and_Ball(network=net, pores=net.Ps,
+                                              throats=net.Ts)
+        water = OpenPNM.Phases.Water(network=net)
+        phys = OpenPNM.Physics.Standard(network=net, phase=water,
+                                        pores=net.Ps, throats=net.Ts)
+        self.workspace.enable_profiling(memory=True)
+        geo.models.regenerate()
+        alg = OpenPNM.Algorithms.FickianDiffusion(network=net, phase=water)
+        alg.set_boundary_conditions(bctype='Dirichlet', bcvalue=1,
+                                    pores=net.pores('top'))
+        alg.set_boundary_conditions(bctype='Dirichlet', bcvalue=0,
+                                    pores=net.pores('bottom'))
+        alg.run()
+        drainage = OpenPNM.Algorithms.Drainage(network=net)
+        air = OpenPNM.Phases.Air(network=net)
+        drainage.setup(invading_phase=water, defending_phase=air)
+        drainage.set_inlets(pores=net.pores('top'))
+        drainage.run(npts=5)
+        self.workspace.disable_profiling()
+        report = self.workspace.perf_report()
+        assert report[('regenerate', geo.name)]['calls'] == 1
+        n_models = len(geo.models)
+        assert sum(report[key]['calls'] for key in report.keys()
+                   if key[0] == 'model') >= n_models
+        assert set(report.categories().keys()) == \
+            {'model', 'regenerate', 'assembly', 'solver', 'percolation'}
+        assert all(entry['time'] >= 0 for entry in report.values())
+        assert type(str(report)) is str
+        # Nothing is recorded once profiling is disabled
+        geo.models.regenerate()
+        assert self.workspace.perf_report() == report
+        fname = join(TEMP_DIR, 'perf_report.json')
+        self.workspace.perf_report(filename=fname)
+        with open(fname) as f:
+            rows = json.load(f)
+        assert len(rows) == len(report)
+        assert set(rows[0].keys()) == {'category', 'name', 'calls', 'time',
+                                       'bytes'}
+        os.remove(fname)
+        self.workspace.purge_object(net, mode='complete')
+
     def teardown_class(self):
         del(self.workspace)
         del(self.net)
@@ -243,6 +243,31 @@ class CoreTest:
         a = self.net.pores(labels=['top', 'front'], mode='difference')
         assert sp.all(a == [9, 10, 12, 13, 15, 16, 18, 19, 21, 22, 24, 25])
 
+    def test_pores_label_index_updates_after_writes(self):
+        net = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+        net['pore.label_a'] = sp.rand(net.Np) < 0.3
+        net['pore.label_b'] = sp.rand(net.Np) < 0.3
+        net['pore.label_c'] = sp.rand(net.Np) < 0.3
+        for i in range(3):
+            A = net['pore.label_a']
+            B = net['pore.label_b']
+            C = net['pore.label_c']
+            Ls = ['label_a', 'label_b', 'label_c']
+            count = A*1 + B*1 + C*1
+            a = net.pores(labels='label_a')
+            assert sp.all(a == sp.where(A)[0])
+            a = net.pores(labels=Ls, mode='union')
+            assert sp.all(a == sp.where(count > 0)[0])
+            a = net.pores(labels=Ls, mode='intersection')
+            assert sp.all(a == sp.where(count == 3)[0])
+            a = net.pores(labels=Ls, mode='not_intersection')
+            assert sp.all(a == sp.where(count == 1)[0])
+            a = net.pores(labels='label_*', mode='not')
+            assert sp.all(a == sp.where(count == 0)[0])
+            # Change the labels in place and by replacing the arrays
+            net['pore.label_a'][net.pores('label_b')] = True
+            net['pore.label_c'] = sp.rand(net.Np) < 0.5
+
     def test_throats(self):
         a = self.net.throats()
         assert sp.all(a == sp.arange(0, self.net.Nt))
@@ -997,3 +1022,47 @@ class CoreTest:
         geom = OpenPNM.Geometry.GenericGeometry(network=net, pores=[0, 1, 2])
         geom['pore.blah'] = True
         assert sp.sum(net['pore.blah']) == geom.Np
+
+    def test_memory_usage(self):
+        net = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+        net.find_neighbor_pores(pores=0)
+        usage = net.memory_usage()
+        assert usage['pore.coords'] == net['pore.coords'].nbytes
+        assert usage['_neighbor_index'] > 0
+        assert '_neighbor_index' not in net.memory_usage(deep=False)
+        net['pore.objects'] = sp.array([[1, 2]] + [[1]]*(net.Np - 1))
+        assert net.memory_usage()['pore.objects'] > \
+            net.memory_usage(deep=False)['pore.objects']
+
+    def test_check_memory(self):
+        net = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+        net['pore.flag'] = sp.rand(net.Np) > 0.5
+        net['pore.float_flag'] = net['pore.flag'].astype(float)
+        net['pore.zeros'] = 0.0
+        net['throat.big'] = sp.ones(net.Nt, dtype=int)*2**40
+        notes = net.check_memory()
+        assert 'pore.float_flag' in notes
+        assert 'throat.conns' in notes
+        assert 'pore.flag' not in notes
+        assert 'pore.zeros' not in notes
+        assert 'throat.big' not in notes
+
+    def test_interleave_data_locations_cached(self):
+        net = OpenPNM.Network.Cubic(shape=[2, 2, 2])
+        Ps = net.pores('top')
+        geom1 = OpenPNM.Geometry.GenericGeometry(network=net, pores=Ps)
+        Ps = net.pores('bottom')
+        geom2 = OpenPNM.Geometry.GenericGeometry(network=net, pores=Ps)
+        geom1['pore.blah'] = 1.0
+        geom2['pore.blah'] = 2.0
+        a = net['pore.blah']
+        assert sp.all(a[net.pores('top')] == 1.0)
+        # Changing the returned array does not change the cached one
+        a[:] = 0
+        assert sp.all(net['pore.blah'][net.pores('bottom')] == 2.0)
+        # Writing on a source rebuilds the array
+        geom2['pore.blah'] = 3.0
+        assert sp.all(net['pore.blah'][net.pores('bottom')] == 3.0)
+        # Changing the array of a source in place is seen too
+        geom2['pore.blah'][:2] = 5.0
+        assert sp.all(net['pore.blah'][net.pores('bottom')[:2]] == 5.0)
@@ -1,3 +1,4 @@
+import pickle
 import pytest
 import OpenPNM
 import scipy as sp
@@ -83,8 +84,9 @@ class ModelsDictTest:
                             model=OpenPNM.Geometry.models.pore_misc.random,
                             seed=None,
                             regen_mode='deferred')
-            with pytest.raises(Exception):
-                geom.regenerate()
+            # The models are run after the models producing their inputs
+            geom.regenerate()
+            assert 'throat.seed' in geom
             geom.models.reorder({'pore.seed': 1, 'throat.seed': 2})
             geom.regenerate()
             assert 'throat.seed' in geom
@@ -114,6 +116,80 @@ class ModelsDictTest:
             assert 'pore.seed' not in geom
             assert 'pore.seed' not in geom.models
 
+        def test_regenerate_only_dirty_models(self):
+            pn = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+            geom = OpenPNM.Geometry.GenericGeometry(network=pn, pores=pn.Ps,
+                                                    throats=pn.Ts)
+            water = OpenPNM.Phases.GenericPhase(network=pn)
+            geom['pore.diameter'] = 1.0
+            geom.models.add(propname='pore.volume',
+                            model=OpenPNM.Geometry.models.pore_volume.sphere)
+            geom.models.add(propname='pore.area',
+                            model=OpenPNM.Geometry.models.pore_area.spherical)
+            water['pore.temperature'] = 300.0
+            water['pore.molecular_weight'] = 0.018
+            water['pore.pressure'] = 101325.0
+            water.models.add(propname='pore.density',
+                             model=OpenPNM.Phases.models.density.ideal_gas)
+            vol = geom['pore.volume']
+            rho = water['pore.density']
+            # Nothing was written, so the models with inputs are not run
+            geom.regenerate(only_dirty=True)
+            water.regenerate(only_dirty=True)
+            assert geom['pore.volume'] is vol
+            assert water['pore.density'] is rho
+            # Writing an input runs only the models downstream of it
+            water['pore.temperature'] = 350.0
+            geom.regenerate(only_dirty=True)
+            water.regenerate(only_dirty=True)
+            assert geom['pore.volume'] is vol
+            assert water['pore.density'] is not rho
+            assert sp.allclose(water['pore.density'], rho*300/350)
+            geom['pore.diameter'] = 2.0
+            geom.regenerate(only_dirty=True)
+            assert sp.allclose(geom['pore.volume'], vol*8)
+            # Named models always run
+            vol = geom['pore.volume']
+            geom.regenerate(props='pore.volume', only_dirty=True)
+            assert geom['pore.volume'] is not vol
+            # Changing an argument of the model also runs it
+            water.models['pore.density']['pore_pressure'] = 'pore.pressure2'
+            water['pore.pressure2'] = 2*101325.0
+            water.regenerate(only_dirty=True)
+            assert sp.allclose(water['pore.density'], rho*2*300/350)
+            # By default every model is run, so in place changes are seen
+            vol = geom['pore.volume']
+            geom['pore.diameter'][:] = 1.0
+            geom.regenerate(only_dirty=True)
+            assert geom['pore.volume'] is vol
+            geom.regenerate()
+            assert sp.allclose(geom['pore.volume'], vol/8)
+
+        def test_dependency_order(self):
+            pn = OpenPNM.Network.Cubic(shape=[3, 3, 3])
+            geom = OpenPNM.Geometry.GenericGeometry(network=pn, pores=pn.Ps,
+                                                    throats=pn.Ts)
+            gm = OpenPNM.Geometry.models
+            geom.models.add(propname='pore.area',
+                            model=gm.pore_area.spherical,
+                            regen_mode='deferred')
+            geom.models.add(propname='pore.diameter',
+                            model=gm.pore_misc.neighbor,
+                            throat_prop='throat.seed',
+                            regen_mode='deferred')
+            geom.models.add(propname='throat.seed',
+                            model=gm.throat_misc.neighbor,
+                            pore_prop='pore.seed',
+                            regen_mode='deferred')
+            geom.models.add(propname='pore.seed',
+                            model=gm.pore_misc.random,
+                            regen_mode='deferred')
+            order = geom.models._dependency_order()
+            assert order == ['pore.seed', 'throat.seed', 'pore.diameter',
+                             'pore.area']
+            geom.regenerate()
+            assert 'pore.area' in geom
+
         def test_changing_regen_mode(self):
             pn = OpenPNM.Network.Cubic(shape=[5, 5, 5])
             geom = OpenPNM.Geometry.GenericGeometry(network=pn, pores=pn.Ps,
@@ -128,3 +204,118 @@ class ModelsDictTest:
             geom.models['pore.seed']['regen_mode'] = 'normal'
             geom.regenerate()
             assert not sp.all(a == geom['pore.seed'])
+
+        def test_master_reference(self):
+            mgr = OpenPNM.Base.Workspace()
+            pn = OpenPNM.Network.Cubic(shape=[3, 3, 3])
+            geom = OpenPNM.Geometry.TestGeometry(network=pn, pores=pn.Ps,
+                                                 throats=pn.Ts)
+            assert geom.models._master() is geom
+            assert geom.models['pore.seed']._find_master() is geom
+            # Clones and pickled copies refer to their own objects
+            pn2 = mgr.clone_simulation(pn, name='clone')
+            geom2 = pn2._geometries[0]
+            assert geom2.models._master() is geom2
+            assert geom2.models['pore.seed']._find_master() is geom2
+            pn3 = pickle.loads(pickle.dumps(pn))
+            geom3 = pn3._geometries[0]
+            assert geom3.models._master() is geom3
+            # Purged objects are no longer found
+            mgr.purge_object(geom)
+            with pytest.raises(Exception):
+                geom.models._find_master()
+
+        def test_regenerate_parallel(self):
+            pn = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+            geom = OpenPNM.Geometry.Stick_and_Ball(network=pn, pores=pn.Ps,
+                                                   throats=pn.Ts)
+            levels = geom.models._dependency_levels()
+            order = geom.models._dependency_order()
+            assert sorted(sum(levels, [])) == sorted(order)
+            # Each model only reads models of the previous levels
+            for i, level in enumerate(levels):
+                for item in level:
+                    for prop in geom.models[item]._inputs():
+                        assert prop not in sum(levels[i:], [])
+            ref = {item: sp.copy(geom[item]) for item in geom.models.keys()}
+            for parallel in ['thread', 'process']:
+                geom.regenerate(parallel=parallel, max_workers=2)
+                for item in ref:
+                    assert sp.allclose(geom[item], ref[item])
+            # The pools use the cache and the timings of the models
+            mgr = OpenPNM.Base.Workspace()
+            props = ['pore.area', 'pore.volume']
+            cache = geom.models.enable_cache(props=props)
+            mgr.enable_profiling()
+            try:
+                for parallel in ['thread', 'process']:
+                    geom.regenerate(props=props, parallel=parallel,
+                                    max_workers=2)
+                report = mgr.perf_report()
+            finally:
+                mgr.disable_profiling()
+                geom.models.disable_cache()
+            assert (cache.hits, cache.misses) == (2, 2)
+            for item in props:
+                assert report[('model', item)]['calls'] == 2
+            with pytest.raises(Exception):
+                geom.regenerate(parallel='gpu')
+
+        def test_model_cache(self):
+            pn = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+            geom = OpenPNM.Geometry.TestGeometry(network=pn, pores=pn.Ps,
+                                                 throats=pn.Ts)
+            cache = geom.models.enable_cache(props='throat.seed')
+            a = geom.models['throat.seed'].run()
+            b = geom.models['throat.seed'].run()
+            assert (cache.hits, cache.misses) == (1, 1)
+            assert sp.all(a == b)
+            # Results returned by the cache are copies
+            b[0] = -1
+            assert geom.models['throat.seed'].run()[0] == a[0]
+            # Changing an argument or writing an input is a miss
+            geom.models['throat.seed']['mode'] = 'max'
+            c = geom.models['throat.seed'].run()
+            assert cache.misses == 2
+            assert sp.all(c >= a)
+            geom['pore.seed'] = sp.rand(geom.Np)
+            geom.models['throat.seed'].run()
+            assert cache.misses == 3
+            # Running again with the same inputs finds the stored result
+            geom.models['throat.seed']['mode'] = 'max'
+            geom.models['throat.seed'].run()
+            assert cache.hits == 3
+            # The least recently used results are removed to fit the limit
+            cache.max_bytes = 2*a.nbytes
+            geom.models['throat.seed']['mode'] = 'min'
+            geom.models['throat.seed'].run()
+            assert len(cache) == 2
+            assert cache.nbytes == 2*a.nbytes
+            geom.models.disable_cache()
+            geom.models['throat.seed'].run()
+            assert cache.misses == 4
+
+        def test_model_cache_shared_and_trimmed(self):
+            pn = OpenPNM.Network.Cubic(shape=[5, 5, 5])
+            Ps = pn.pores('top')
+            geo1 = OpenPNM.Geometry.GenericGeometry(network=pn, pores=Ps)
+            Ps = pn.pores('top', mode='not')
+            geo2 = OpenPNM.Geometry.GenericGeometry(network=pn, pores=Ps)
+            f = OpenPNM.Geometry.models.pore_misc.random
+            for geo in [geo1, geo2]:
+                geo.models.add(propname='pore.seed', model=f, seed=0,
+                               regen_mode='deferred')
+            cache = geo1.models.enable_cache()
+            geo2.models.enable_cache(cache=cache)
+            geo1.regenerate()
+            geo2.regenerate()
+            # The geometries do not share results through the cache
+            assert cache.misses == 2
+            assert sp.size(geo1['pore.seed']) == geo1.Np
+            assert sp.size(geo2['pore.seed']) == geo2.Np
+            # Trimming the network resizes the geometries
+            pn.trim(pores=geo2.Ps[0:3])
+            geo2.regenerate()
+            assert cache.misses == 3
+            assert sp.size(geo2['pore.seed']) == geo2.Np
+            assert geo2.Np == 125 - 25 - 3
@@ -1,3 +1,6 @@
+import OpenPNM
+import pytest
+import scipy as sp
 from OpenPNM.Base import Tools
 
 
@@ -42,3 +45,48 @@ class PrintableDictTest:
     def test_representation(self):
         a = self.dict.__repr__()
         assert type(a) is str
+
+
+class RaggedArrayTest:
+    def setup_class(self):
+        self.values = [sp.ones((2, 3)), None, {4: [0, 1, 2], 7: [3, 4, 5]}]
+        self.ragged = Tools.RaggedArray(self.values)
+
+    def test_init(self):
+        assert len(self.ragged) == 3
+        assert self.ragged.lengths.tolist() == [2, 0, 2]
+        assert self.ragged.ids.tolist() == [0, 0, 4, 7]
+        assert sp.all(self.ragged[2] == [[0, 1, 2], [3, 4, 5]])
+        with pytest.raises(Exception):
+            Tools.RaggedArray(offsets=[0, 3], data=sp.ones((2, 3)))
+
+    def test_getitem_and_setitem(self):
+        ragged = self.ragged.copy()
+        sub = ragged[[2, 0]]
+        assert sub.lengths.tolist() == [2, 2]
+        assert sub.ids.tolist() == [4, 7, 0, 0]
+        assert ragged[sp.array([False, True, False])].lengths.tolist() == [0]
+        ragged[1] = [[9, 9, 9]]
+        assert ragged.lengths.tolist() == [2, 1, 2]
+        assert sp.all(ragged[1] == 9)
+        ragged[[0, 2]] = [None, None]
+        assert ragged.lengths.tolist() == [0, 1, 0]
+        assert self.ragged.lengths.tolist() == [2, 0, 2]
+
+    def test_core_trim_extend_and_interleave(self):
+        net = OpenPNM.Network.Cubic(shape=[3, 1, 1])
+        Ps1 = net.Ps[:2]
+        geo1 = OpenPNM.Geometry.GenericGeometry(network=net, pores=Ps1)
+        geo2 = OpenPNM.Geometry.GenericGeometry(network=net, pores=[2])
+        geo1['pore.verts'] = Tools.RaggedArray([sp.ones((2, 3)),
+                                                sp.zeros((1, 3))])
+        geo2['pore.verts'] = Tools.RaggedArray([2*sp.ones((3, 3))])
+        verts = net['pore.verts']
+        assert isinstance(verts, Tools.RaggedArray)
+        assert verts.lengths.tolist() == [2, 1, 3]
+        assert sp.all(verts[2] == 2)
+        net['pore.verts'] = verts
+        OpenPNM.Network.tools.extend(network=net, pore_coords=[[4, 0, 0]])
+        assert net['pore.verts'].lengths.tolist() == [2, 1, 3, 0]
+        OpenPNM.Network.tools.trim(network=net, pores=[0])
+        assert net['pore.verts'].lengths.tolist() == [1, 3, 0]
@@ -1,3 +1,40 @@
+import OpenPNM
+import scipy as sp
+import OpenPNM.Geometry.models as gm
+
+
 class PoreVolumeTest:
+    def setup_class(self):
+        sp.random.seed(0)
+        scale = 1e-4
+        self.net = OpenPNM.Network.Delaunay(domain_size=[scale, scale, scale],
+                                            base_points=sp.rand(8, 3)*scale)
+        self.net.add_boundaries()
+
     def test_get_hull_volume(self):
         pass
+
+    def test_get_fibre_image(self):
+        f = gm.pore_volume._get_fibre_image
+        Ps = self.net.Ps
+        image = f(self.net, Ps, 1e-6, 3.0, chunk_len=200, memmap=False)
+        assert sp.shape(image) == (101, 101, 101)
+        assert 0 < sp.sum(image) < sp.size(image)
+        chunked = f(self.net, Ps, 1e-6, 3.0, chunk_len=30, memmap=True)
+        assert isinstance(chunked, sp.memmap)
+        assert sp.all(chunked == image)
+        threaded = f(self.net, Ps, 1e-6, 3.0, chunk_len=40, parallel=True)
+        assert sp.all(threaded == image)
+
+    def test_bresenham(self):
+        faces = OpenPNM.Base.Tools.RaggedArray([[[0, 0, 0], [2, 0, 0],
+                                                 [0, 2, 0]], None])
+        points = gm.pore_volume.bresenham(faces, 0.5)
+        assert sp.all(points[:, 2] == 0)
+        assert sp.all(sp.amin(points, axis=0) == [0, 0, 0])
+        assert sp.all(sp.amax(points, axis=0) == [2, 2, 0])
+        # Points whose coordinate differences from the last point kept sum
+        # to 0 are skipped, which thins out the diagonal edge
+        assert len(points) == 4 + 4 + 3
+        assert sp.allclose(points[-3:], [[2, 0, 0], [1.6, 0.4, 0],
+                                         [1.2, 0.8, 0]])
@@ -1,3 +1,48 @@
+import OpenPNM
+import pytest
+import scipy as sp
+import OpenPNM.Geometry.models as gm
+f = gm.throat_offset_vertices.distance_transform
+
+
 class ThroatOffsetVerticesTest:
+    def setup_class(self):
+        sp.random.seed(0)
+        scale = 1e-4
+        self.net = OpenPNM.Network.Delaunay(domain_size=[scale, scale, scale],
+                                            base_points=sp.rand(20, 3)*scale)
+        self.net.add_boundaries()
+        self.geo = OpenPNM.Geometry.GenericGeometry(network=self.net,
+                                                    pores=self.net.Ps,
+                                                    throats=self.net.Ts)
+        self.geo.models.add(propname='throat.vertices',
+                            model=gm.throat_vertices.voronoi)
+        self.geo.models.add(propname='throat.normal',
+                            model=gm.throat_normal.voronoi)
+
     def test_voronoi(self):
-        pass
+        verts = f(network=self.net, geometry=self.geo, offset=3e-6,
+                  set_dependent=True)
+        area = self.geo['throat.area'].copy()
+        assert len(verts) == self.geo.Nt
+        assert sp.all((verts.lengths == 0) == (area == 0))
+        assert sp.any(area > 0)
+        chunked = f(network=self.net, geometry=self.geo, offset=3e-6,
+                    chunk_size=7, parallel=True, max_workers=2,
+                    set_dependent=True)
+        assert sp.all(chunked.offsets == verts.offsets)
+        assert sp.allclose(chunked.data, verts.data)
+        assert sp.allclose(self.geo['throat.area'], area)
+
+    def test_analytic(self):
+        f(network=self.net, geometry=self.geo, offset=3e-6,
+          set_dependent=True)
+        area = self.geo['throat.area'].copy()
+        verts = f(network=self.net, geometry=self.geo, offset=3e-6,
+                  method='analytic', set_dependent=True)
+        Ts = (area > 0) & (self.geo['throat.area'] > 0)
+        assert sp.allclose(self.geo['throat.area'][Ts], area[Ts], rtol=0.1)
+        assert sp.all(verts.lengths[self.geo['throat.area'] > 0] >= 3)
+        with pytest.raises(Exception):
+            f(network=self.net, geometry=self.geo, offset=3e-6,
+              method='blah', set_dependent=False)
@@ -29,3 +29,24 @@ class DelaunayTest:
     def test_export_vor_fibres(self):
         self.net._export_vor_fibres()
         os.remove('fibres.p')
+
+    def test_throats_match_ridges(self):
+        bp = sp.rand(50, 3)
+        net = OpenPNM.Network.Delaunay(domain_size=[1, 1, 1], base_points=bp)
+        conns = net['throat.conns']
+        assert sp.all(conns[:, 0] < conns[:, 1])
+        keys = conns[:, 0]*net.Np + conns[:, 1]
+        assert sp.all(sp.diff(keys) > 0)
+        # Every pair of real pores sharing a simplex is connected
+        ridges = net._vor.ridge_dict
+        vert_index = net['throat.vert_index']
+        ids = vert_index.ids
+        offsets = vert_index.offsets
+        for (p1, p2), verts in ridges.items():
+            if max(p1, p2) < net.Np:
+                t = sp.where(keys == min(p1, p2)*net.Np + max(p1, p2))[0]
+                assert len(t) == 1
+                t = t[0]
+                assert sorted(ids[offsets[t]:offsets[t+1]]) == sorted(verts)
+                assert sp.all(vert_index[t] ==
+                              net._vor.vertices[ids[offsets[t]:offsets[t+1]]])
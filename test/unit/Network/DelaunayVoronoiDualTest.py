@@ -102,3 +102,21 @@ class DelaunayVoronoiDualTest:
         Nt_int = net.num_throats(labels=['interconnect', 'surface'],
                                  mode='intersection')
         assert (Nt_vor + Nt_del + Nt_int) == net.num_throats('surface')
+
+    def test_find_throat_facets_and_pore_hulls(self):
+        sp.random.seed(seed=0)
+        net = op.Network.DelaunayVoronoiDual(num_points=50)
+        net.find_throat_facets()
+        net.find_pore_hulls()
+        am = net.create_adjacency_matrix(data=net['throat.interconnect'],
+                                         sprsfmt='lil')
+        for t in net.throats('delaunay'):
+            P1, P2 = net['throat.conns'][t]
+            Ps = sorted(set(am.rows[P1]).intersection(am.rows[P2]))
+            facet = net['throat.facet_coords'][t]
+            assert len(facet) == len(Ps)
+            assert sp.all(facet == net['pore.coords'][Ps])
+        for p in net.pores('delaunay'):
+            hull = net['pore.hull_coords'][p]
+            assert sp.all(hull == net['pore.coords'][am.rows[p]])
+        assert len(net['pore.hull_coords'][net.pores('voronoi')[0]]) == 0
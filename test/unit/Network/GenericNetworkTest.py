@@ -170,6 +170,41 @@ class GenericNetworkTest:
         assert sp.all(a == [5, 5, 5, 4])
         self.net.trim(throats=self.net.Ts[-2:])
 
+    def test_neighbor_index_matches_matrices(self):
+        net = OpenPNM.Network.Cubic(shape=[4, 4, 4])
+        net.extend(throat_conns=[[0, 1], [5, 9]])
+        am = net.create_adjacency_matrix(sprsfmt='lil')
+        im = net.create_incidence_matrix(sprsfmt='lil')
+        Ps = [9, 0, 5, 63]
+        a = net.find_neighbor_pores(pores=Ps, flatten=False)
+        b = net.find_neighbor_throats(pores=Ps, flatten=False)
+        for i, p in enumerate(Ps):
+            assert a[i].tolist() == am.rows[p]
+            assert b[i].tolist() == im.rows[p]
+        assert sp.all(net.num_neighbors(pores=net.Ps) ==
+                      [len(row) for row in am.rows])
+        indptr, indices = net._get_neighbor_index('throat')
+        assert indptr.dtype == sp.int32
+        assert indices.dtype == sp.int32
+        # The index is rebuilt when the topology changes
+        net.trim(throats=net.Ts[-2:])
+        assert net.num_neighbors(pores=0, element='throat') == [3]
+        assert sp.all(net.find_neighbor_pores(pores=5) == [1, 4, 6, 9, 21])
+
+    def test_find_connecting_throat(self):
+        net = OpenPNM.Network.Cubic(shape=[4, 4, 4])
+        net.extend(throat_conns=[[0, 1]])
+        a = net.find_connecting_throat([0, 1, 1, 2, 5], [1, 0, 1, 0, 9])
+        assert a == [[0, 144], [0, 144], [], [], [53]]
+        # Compare every pair of pores with the neighbor lists
+        P1, P2 = sp.meshgrid(net.Ps, net.Ps)
+        a = net.find_connecting_throat(P1.flatten(), P2.flatten())
+        Ts = net.find_neighbor_throats(pores=net.Ps, flatten=False)
+        for i, (p1, p2) in enumerate(zip(P1.flatten(), P2.flatten())):
+            if p1 != p2:
+                assert a[i] == sp.intersect1d(Ts[p1], Ts[p2]).tolist()
+        assert net.find_connecting_throat([], []) == []
+
     def test_find_interface_throats(self):
         self.net['pore.domain1'] = False
         self.net['pore.domain2'] = False